@@ -3,8 +3,10 @@ from django.contrib.gis.admin import GISModelAdmin
 from django.contrib.auth.admin import UserAdmin
 from .models import *
 from django.contrib.gis.geos import Point
-from geopy.geocoders import Nominatim
-from django.db.models import Count
+from geopy.exc import GeopyError
+from .geocoding import enqueue_address_lookups, reverse_geocode
+from .rollups import rebuild_summaries_for
+from django.db.models import Count, Q
 from django.utils.html import format_html
 
 from django.contrib import admin
@@ -76,12 +78,21 @@ class OrganizationAdmin(GISModelAdmin):
             'fields': ('name', 'address')
         }),
         ('Location Settings', {
-            'fields': ('location', 'geofence_radius', 'location_source'),
+            'fields': ('location', 'geofence_radius', 'location_source', 'time_zone'),
+            'classes': ('collapse',)
+        }),
+        ('Attendance', {
+            'fields': ('work_start_time', 'late_grace_minutes'),
             'classes': ('collapse',)
         }),
     )
     readonly_fields = ('location_source',)
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(
+            active_intern_count=Count('intern', filter=Q(intern__is_active=True))
+        )
+
     def location_status(self, obj):
         if obj.location:
             return format_html(
@@ -92,8 +103,9 @@ class OrganizationAdmin(GISModelAdmin):
     location_status.short_description = "Location"
 
     def get_intern_count(self, obj):
-        return obj.get_intern_count()
+        return obj.active_intern_count
     get_intern_count.short_description = 'Active Interns'
+    get_intern_count.admin_order_field = 'active_intern_count'
 
     def geocode_selected(self, request, queryset):
         for org in queryset:
@@ -121,10 +133,21 @@ class OrganizationAdmin(GISModelAdmin):
 
 
 
+@admin.register(GeofenceZone)
+class GeofenceZoneAdmin(GISModelAdmin):
+    list_display = ('name', 'organization', 'is_active')
+    list_filter = ('organization', 'is_active')
+    list_select_related = ('organization',)
+    search_fields = ('name', 'organization__name')
+
+
+
+
 # Location Log Admin
 @admin.register(LocationLog)
 class LocationLogAdmin(GISModelAdmin):
     list_display = ('intern', 'timestamp', 'status', 'address_short', 'accuracy')
+    list_select_related = ('intern',)
     search_fields = ('intern__user__username', 'address')
     readonly_fields = ('timestamp',)
     date_hierarchy = 'timestamp'
@@ -148,7 +171,25 @@ class LocationLogAdmin(GISModelAdmin):
             obj.intern.organization.location = obj.point
             obj.intern.organization.location_source = 'first_checkin'
             obj.intern.organization.save()
+        if not obj.address:
+            try:
+                obj.address = reverse_geocode(obj.point.y, obj.point.x)
+            except GeopyError:
+                pass
         super().save_model(request, obj, form, change)
+        if not obj.address:
+            enqueue_address_lookups([obj])
+        # Daily summaries are only folded in on ingest
+        rebuild_summaries_for([obj])
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        rebuild_summaries_for([obj])
+
+    def delete_queryset(self, request, queryset):
+        logs = list(queryset.select_related('intern'))
+        super().delete_queryset(request, queryset)
+        rebuild_summaries_for(logs)
 
 
 from django.contrib import admin
@@ -189,9 +230,15 @@ class DepartmentAdmin(admin.ModelAdmin):
         }),
     )
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(
+            active_employee_count=Count('employee', filter=Q(employee__is_active=True))
+        )
+
     def current_headcount(self, obj):
-        return obj.current_headcount
+        return obj.active_employee_count
     current_headcount.short_description = 'Employees'
+    current_headcount.admin_order_field = 'active_employee_count'
 
 
 
@@ -207,6 +254,7 @@ class InternAdmin(admin.ModelAdmin):
         'display_image'
         
     )
+    list_select_related = ('university', 'department', 'mentor')
     list_filter = (
         'status',
         'department',
@@ -293,6 +341,7 @@ class InternAdmin(admin.ModelAdmin):
 @admin.register(Employee)
 class EmployeeAdmin(admin.ModelAdmin):
     list_display = ('name', 'employee_id', 'get_department', 'position', 'hire_date', 'is_active')
+    list_select_related = ('department',)
     search_fields = ('user__first_name', 'user__last_name', 'employee_id', 'department__name', 'position')
     list_filter = ('department', 'position', 'is_active', 'employee_id')
     date_hierarchy = 'hire_date'
@@ -310,9 +359,16 @@ class EmployeeAdmin(admin.ModelAdmin):
 # ====================== ATTENDANCE & LEAVE ======================
 @admin.register(Attendance)
 class AttendanceAdmin(admin.ModelAdmin):
-    list_display = ('employee', 'date', 'check_in', 'check_out', 'status')
+    list_display = ('employee', 'date', 'check_in', 'check_out', 'status', 'source')
+    list_select_related = ('employee',)
     search_fields = ('employee__user__first_name', 'employee__user__last_name', 'date')
-    list_filter = ('status', 'date')
+    list_filter = ('status', 'source', 'date')
+    readonly_fields = ('source',)
+
+    def save_model(self, request, obj, form, change):
+        # An edited row is HR's now; re-deriving attendance must not undo it
+        obj.source = 'manual'
+        super().save_model(request, obj, form, change)
     
     def get_employee_name(self, obj):
         return f"{obj.employee.user.first_name} {obj.employee.user.last_name}" if obj.employee.user else '-'
@@ -380,10 +436,14 @@ class PerformanceReviewAdmin(admin.ModelAdmin):
 class SkillAdmin(admin.ModelAdmin):
     list_display = ('name', 'employee_count')
     search_fields = ('name',)
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(num_employees=Count('employees', distinct=True))
     
     def employee_count(self, obj):
-        return obj.employees.count()
+        return obj.num_employees
     employee_count.short_description = 'Employees'
+    employee_count.admin_order_field = 'num_employees'
 
 @admin.register(EmployeeSkill)
 class EmployeeSkillAdmin(admin.ModelAdmin):
@@ -0,0 +1,113 @@
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+from .models import Department, Employee
+
+CACHE_KEY = 'department-analytics'
+
+
+def _depths(ids, parents):
+    """Depth of every department below its root; departments in a parent cycle count as roots"""
+    index = {pk: i for i, pk in enumerate(ids)}
+    depths = [-1] * len(ids)
+    for start in range(len(ids)):
+        chain = []
+        seen = set()
+        node = start
+        while node is not None and depths[node] < 0 and node not in seen:
+            chain.append(node)
+            seen.add(node)
+            node = index.get(parents[node])
+        base = depths[node] if node is not None and depths[node] >= 0 else -1
+        for offset, member in enumerate(reversed(chain)):
+            depths[member] = base + 1 + offset
+    return np.array(depths)
+
+
+def compute_department_stats():
+    """Headcount, salary totals and budget utilization for every department, with sub-tree rollups.
+
+    Per-department figures come from one aggregate query over active employees.
+    Sub-tree totals are accumulated bottom-up one tree level at a time.
+    Utilization is active salaries as a percentage of the budget, or 0 without one.
+    """
+    rows = list(
+        Department.objects.order_by().annotate(
+            active_headcount=Count('employee', filter=Q(employee__is_active=True)),
+            salary_total=Sum('employee__salary', filter=Q(employee__is_active=True)),
+        ).values_list('id', 'parent_department_id', 'budget', 'active_headcount', 'salary_total')
+    )
+    if not rows:
+        return {}
+
+    ids = [row[0] for row in rows]
+    parents = [row[1] for row in rows]
+    index = {pk: i for i, pk in enumerate(ids)}
+    budget = np.array([float(row[2] or 0) for row in rows])
+    headcount = np.array([row[3] for row in rows], dtype=np.int64)
+    salaries = np.array([float(row[4] or 0) for row in rows])
+
+    depths = _depths(ids, parents)
+    parent_index = np.array([index.get(parent, -1) for parent in parents])
+    parent_index[depths == 0] = -1
+
+    subtree_budget = budget.copy()
+    subtree_headcount = headcount.copy()
+    subtree_salaries = salaries.copy()
+    for depth in range(int(depths.max()), 0, -1):
+        level = np.flatnonzero(depths == depth)
+        targets = parent_index[level]
+        np.add.at(subtree_budget, targets, subtree_budget[level])
+        np.add.at(subtree_headcount, targets, subtree_headcount[level])
+        np.add.at(subtree_salaries, targets, subtree_salaries[level])
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        utilization = np.where(budget > 0, salaries / budget * 100, 0.0)
+        subtree_utilization = np.where(subtree_budget > 0, subtree_salaries / subtree_budget * 100, 0.0)
+
+    return {
+        pk: {
+            'headcount': int(headcount[i]),
+            'salary_total': round(float(salaries[i]), 2),
+            'budget': round(float(budget[i]), 2),
+            'utilization': round(float(utilization[i]), 2),
+            'subtree_headcount': int(subtree_headcount[i]),
+            'subtree_salary_total': round(float(subtree_salaries[i]), 2),
+            'subtree_budget': round(float(subtree_budget[i]), 2),
+            'subtree_utilization': round(float(subtree_utilization[i]), 2),
+        }
+        for pk, i in index.items()
+    }
+
+
+def department_stats():
+    """Cached result of compute_department_stats, dropped whenever an Employee or Department is saved"""
+    stats = cache.get(CACHE_KEY)
+    if stats is None:
+        stats = compute_department_stats()
+        cache.set(CACHE_KEY, stats, timeout=getattr(settings, 'DEPARTMENT_ANALYTICS_CACHE_SECONDS', 300))
+    return stats
+
+
+def invalidate_department_stats():
+    """Drop the cached stats from the shared cache once the current transaction commits"""
+    transaction.on_commit(lambda: cache.delete(CACHE_KEY))
+
+
+def refresh_headcounts(department_ids=None):
+    """Store the active employee count in Department.headcount with a single UPDATE"""
+    active = (
+        Employee.objects.filter(department=OuterRef('pk'), is_active=True)
+        .order_by()
+        .values('department')
+        .annotate(total=Count('pk'))
+        .values('total')
+    )
+    departments = Department.objects.all()
+    if department_ids is not None:
+        departments = departments.filter(pk__in=[pk for pk in department_ids if pk is not None])
+    return departments.update(headcount=Coalesce(Subquery(active), 0))
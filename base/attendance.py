@@ -0,0 +1,142 @@
+from datetime import datetime, time, timedelta
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import Attendance, Employee, Intern, LeaveRequest, PresenceSession
+
+# Check-out recorded for a day whose last inside session runs past local midnight
+END_OF_DAY = time(23, 59, 59)
+
+
+def _day_bounds(day, tz):
+    return datetime.combine(day, time.min, tzinfo=tz), datetime.combine(day + timedelta(days=1), time.min, tzinfo=tz)
+
+
+def _inside_days(organization, user_ids, start_date, end_date):
+    """First check-in and last check-out per (user id, local date), splitting sessions at local midnight"""
+    tz = organization.tzinfo
+    window_start, _ = _day_bounds(start_date, tz)
+    _, window_end = _day_bounds(end_date, tz)
+    sessions = PresenceSession.objects.filter(
+        organization=organization,
+        is_inside=True,
+        intern__user_id__in=user_ids,
+        # A day of lookback picks up sessions that began the evening before the window;
+        # an inside stretch that started earlier still is not credited to its later days
+        started_at__gte=window_start - timedelta(days=1),
+        started_at__lt=window_end,
+        ended_at__gte=window_start,
+    ).values_list('intern__user_id', 'started_at', 'ended_at')
+
+    days = {}
+    for user_id, started_at, ended_at in sessions:
+        day = max(timezone.localdate(started_at, tz), start_date)
+        while day <= min(timezone.localdate(ended_at, tz), end_date):
+            day_start, day_end = _day_bounds(day, tz)
+            # A session ending exactly at midnight does not reach into the next day
+            if ended_at > day_start or started_at >= day_start:
+                first_in, last_out = days.get((user_id, day), (day_end, day_start))
+                days[(user_id, day)] = (min(first_in, max(started_at, day_start)), max(last_out, min(ended_at, day_end)))
+            day += timedelta(days=1)
+    return days
+
+
+def _mark_absences(organization, start_date, end_date):
+    """Insert derived 'absent' rows for weekdays with neither an inside session nor approved leave.
+
+    One INSERT ... SELECT. Each employee's days are limited to their hire date
+    and internship dates, and days that already have a row are left alone.
+    Returns the number of rows inserted.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            INSERT INTO {Attendance._meta.db_table} (employee_id, date, status, source)
+            SELECT e.id, d.day::date, 'absent', 'derived'
+            FROM {Employee._meta.db_table} e
+            JOIN {Intern._meta.db_table} i ON i.user_id = e.user_id
+            -- GREATEST and LEAST skip NULLs, so a missing internship date does not bound the series
+            CROSS JOIN LATERAL generate_series(
+                GREATEST(%(start_date)s::date, e.hire_date, i.internship_start_date),
+                LEAST(%(end_date)s::date, i.internship_end_date),
+                interval '1 day'
+            ) AS d(day)
+            WHERE e.is_active
+                AND i.organization_id = %(organization)s
+                AND EXTRACT(ISODOW FROM d.day) < 6
+                AND NOT EXISTS (
+                    SELECT 1 FROM {LeaveRequest._meta.db_table} lr
+                    WHERE lr.employee_id = e.id AND lr.status = 'approved'
+                        AND lr.start_date <= d.day::date AND lr.end_date >= d.day::date
+                )
+                AND NOT EXISTS (
+                    SELECT 1 FROM {PresenceSession._meta.db_table} s
+                    WHERE s.intern_id = i.id AND s.organization_id = %(organization)s AND s.is_inside
+                        AND s.started_at < ((d.day + interval '1 day') AT TIME ZONE %(time_zone)s)
+                        AND (s.ended_at > (d.day AT TIME ZONE %(time_zone)s)
+                             OR s.started_at >= (d.day AT TIME ZONE %(time_zone)s))
+                )
+            ON CONFLICT (employee_id, date) DO NOTHING
+            """,
+            {
+                'organization': organization.pk,
+                'time_zone': organization.time_zone,
+                'start_date': start_date,
+                'end_date': end_date,
+            },
+        )
+        return cursor.rowcount
+
+
+def derive_attendance(organization, start_date, end_date):
+    """Rebuild the derived Attendance rows of an organization's employees from their inside sessions.
+
+    Sessions are split at local midnight, so one that crosses it counts towards
+    both days. Check-in is the start of the first inside stretch of the local
+    day and check-out the end of the last one (23:59:59 if it runs past
+    midnight); a check-in after work_start_time plus the grace period is 'late'.
+    Past weekdays without any inside session or approved leave are 'absent'.
+    Derived rows in the range are deleted and recreated in one transaction, so
+    ones that no longer apply disappear; manual rows are never touched.
+    Employees are matched to interns through their shared user account. Returns
+    the number of rows written.
+    """
+    tz = organization.tzinfo
+    employees = dict(
+        Employee.objects.filter(
+            is_active=True,
+            user__intern__organization=organization,
+        ).values_list('user_id', 'id')
+    )
+    if not employees:
+        return 0
+
+    late_after = (
+        datetime.combine(start_date, organization.work_start_time)
+        + timedelta(minutes=organization.late_grace_minutes)
+    ).time()
+    existing = Attendance.objects.filter(
+        employee_id__in=list(employees.values()), date__gte=start_date, date__lte=end_date
+    )
+    rows = []
+    for (user_id, day), (first_in, last_out) in _inside_days(organization, list(employees), start_date, end_date).items():
+        check_in = timezone.localtime(first_in, tz).time()
+        rows.append(Attendance(
+            employee_id=employees[user_id],
+            date=day,
+            check_in=check_in,
+            check_out=END_OF_DAY if last_out >= _day_bounds(day, tz)[1] else timezone.localtime(last_out, tz).time(),
+            status='late' if check_in > late_after else 'present',
+            source='derived',
+        ))
+
+    # Today is still in progress, so it never counts as an absence
+    last_absent_day = min(end_date, timezone.localdate(timezone=tz) - timedelta(days=1))
+    with transaction.atomic():
+        existing.filter(source='derived').delete()
+        manual = set(existing.values_list('employee_id', 'date'))
+        rows = [row for row in rows if (row.employee_id, row.date) not in manual]
+        Attendance.objects.bulk_create(rows, batch_size=2000, ignore_conflicts=True)
+        absent = _mark_absences(organization, start_date, last_absent_day) if start_date <= last_absent_day else 0
+    return len(rows) + absent
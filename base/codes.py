@@ -0,0 +1,83 @@
+import re
+from collections import defaultdict
+
+from django.db import connection
+
+from .models import DepartmentCodeSequence
+
+SEQUENCE_TABLE = DepartmentCodeSequence._meta.db_table
+PREFIX_MAX_LENGTH = 4
+# Same shape as the codes migration 0023 seeded the counters from
+CODE_NAME = re.compile(r'(?P<prefix>.{1,10})-(?P<number>[0-9]{1,9})')
+
+
+def department_prefix(name):
+    """Code prefix for a department name: initials of several words, else the first three letters"""
+    words = re.findall(r'[A-Za-z0-9]+', name or '')
+    if not words:
+        return 'DEP'
+    prefix = ''.join(word[0] for word in words) if len(words) > 1 else words[0][:3]
+    return prefix.upper()[:PREFIX_MAX_LENGTH]
+
+
+def format_code(prefix, number):
+    return f"{prefix}-{number:03d}"
+
+
+def allocate_numbers(prefix, count=1):
+    """Reserve ``count`` consecutive numbers for ``prefix`` and return them as a range.
+
+    A single upsert both creates the prefix's counter and advances it, so
+    concurrent callers always get disjoint blocks. Numbers reserved by a
+    transaction that rolls back are skipped, not reused.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            INSERT INTO {SEQUENCE_TABLE} (prefix, last_value)
+            VALUES (%s, %s)
+            ON CONFLICT (prefix) DO UPDATE SET last_value = {SEQUENCE_TABLE}.last_value + EXCLUDED.last_value
+            RETURNING last_value
+            """,
+            [prefix, count],
+        )
+        last_value = cursor.fetchone()[0]
+    return range(last_value - count + 1, last_value + 1)
+
+
+def reserve_code(code):
+    """Move the counter for a hand-entered "PREFIX-NNN" code past its number, so it is never handed out"""
+    match = CODE_NAME.fullmatch(code or '')
+    if match is None:
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            INSERT INTO {SEQUENCE_TABLE} (prefix, last_value)
+            VALUES (%s, %s)
+            ON CONFLICT (prefix) DO UPDATE SET last_value = GREATEST({SEQUENCE_TABLE}.last_value, EXCLUDED.last_value)
+            """,
+            [match['prefix'], int(match['number'])],
+        )
+
+
+def allocate_code(prefix):
+    return format_code(prefix, allocate_numbers(prefix)[0])
+
+
+def assign_codes(departments):
+    """Give every department without a code one, with one allocation per prefix.
+
+    Meant for bulk imports ahead of bulk_create; codes that are already set
+    are reserved instead. Returns the departments.
+    """
+    by_prefix = defaultdict(list)
+    for department in departments:
+        if department.code:
+            reserve_code(department.code)
+        else:
+            by_prefix[department_prefix(department.name)].append(department)
+    for prefix, group in by_prefix.items():
+        for department, number in zip(group, allocate_numbers(prefix, len(group))):
+            department.code = format_code(prefix, number)
+    return departments
@@ -0,0 +1,147 @@
+import asyncio
+import json
+import logging
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+
+def organization_channel(organization_id):
+    return f'organization:{organization_id}'
+
+
+class LocalSubscription:
+    """One listener's bounded queue, bound to the event loop that created it"""
+
+    def __init__(self, broker, channel, max_queue):
+        self.broker = broker
+        self.channel = channel
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=max_queue)
+        self.dropped = 0
+
+    def deliver(self, event):
+        # A listener that cannot keep up loses its oldest events rather than stalling publishers
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(event)
+
+    async def get(self, timeout):
+        """Wait for the next event; returns None when ``timeout`` seconds pass without one"""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class LocalBroker:
+    """In-process pub/sub: events reach only listeners connected to the same process.
+
+    Publishing is thread-safe, so synchronous views and commands can publish to
+    listeners running on an ASGI event loop. Deployments with several processes
+    need a broker backed by a shared service, configured through EVENT_BROKER.
+    """
+
+    def __init__(self, max_queue=100):
+        self.max_queue = max_queue
+        self._subscribers = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def subscribe(self, channel):
+        subscription = LocalSubscription(self, channel, self.max_queue)
+        with self._lock:
+            self._subscribers[channel].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.channel)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[subscription.channel]
+
+    def publish(self, channel, event):
+        with self._lock:
+            subscribers = list(self._subscribers.get(channel, ()))
+        for subscription in subscribers:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.deliver, event)
+            except RuntimeError:
+                # The listener's event loop has shut down
+                self.unsubscribe(subscription)
+        return len(subscribers)
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    """Return the process-wide broker named by the EVENT_BROKER setting"""
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                broker_class = import_string(getattr(settings, 'EVENT_BROKER', 'base.events.LocalBroker'))
+                _broker = broker_class(**getattr(settings, 'EVENT_BROKER_OPTIONS', {}))
+    return _broker
+
+
+def location_events(intern, logs, previous):
+    """Build enter/exit events for a batch of stored fixes, plus a position event for the newest one.
+
+    ``previous`` is the intern's ``(is_inside_geofence, timestamp)`` before the
+    batch, or None for a first fix. Fixes older than it change nothing.
+    """
+    inside, last_timestamp = previous if previous else (None, None)
+    events = []
+    newest = None
+    for log in sorted(logs, key=lambda log: (log.timestamp, log.pk)):
+        if last_timestamp is not None and log.timestamp <= last_timestamp:
+            continue
+        if inside is not None and log.is_inside_geofence != inside:
+            events.append(_event('enter' if log.is_inside_geofence else 'exit', intern, log))
+        inside = log.is_inside_geofence
+        last_timestamp = log.timestamp
+        newest = log
+    if newest is not None:
+        events.append(_event('position', intern, newest))
+    return events
+
+
+def _event(kind, intern, log):
+    return {
+        'type': kind,
+        'intern_id': intern.pk,
+        'location_id': log.pk,
+        'timestamp': log.timestamp.isoformat(),
+        'latitude': log.point.y,
+        'longitude': log.point.x,
+        'is_inside_geofence': log.is_inside_geofence,
+    }
+
+
+def publish_location_events(intern, logs, previous):
+    if intern.organization_id is None:
+        return
+    channel = organization_channel(intern.organization_id)
+    broker = get_broker()
+    for event in location_events(intern, logs, previous):
+        try:
+            broker.publish(channel, event)
+        except Exception as e:
+            # Streaming is best effort; the fixes are already stored
+            logger.warning(f"Failed to publish {event['type']} event: {str(e)}")
+
+
+def format_sse(event):
+    return f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
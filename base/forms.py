@@ -78,7 +78,7 @@ class ProfileCompletionForm(forms.ModelForm):
 class OrganizationForm(forms.ModelForm):
     class Meta:
         model = Organization
-        fields = ['name', 'address', 'geofence_radius']
+        fields = ['name', 'address', 'geofence_radius', 'time_zone']
         widgets = {
             'address': forms.Textarea(attrs={'rows': 3}),
             'geofence_radius': forms.NumberInput(attrs={'min': 10}),
@@ -0,0 +1,312 @@
+import logging
+import threading
+import time
+from collections import Counter, OrderedDict
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.gis.geos import Point
+from django.db import transaction
+from django.db.models import Case, F, OuterRef, Q, Subquery, Value, When
+from django.utils import timezone
+from geopy.exc import GeopyError
+from geopy.geocoders import Nominatim
+
+from .models import GeocodeCacheEntry, GeocodeJob, InternLastLocation, LocationLog
+
+logger = logging.getLogger(__name__)
+
+GEOHASH_ALPHABET = '0123456789bcdefghjkmnpqrstuvwxyz'
+UNKNOWN_ADDRESS = "Unknown location"
+
+_geolocator = None
+
+
+def get_geolocator():
+    """Return the process-wide Nominatim client"""
+    global _geolocator
+    if _geolocator is None:
+        _geolocator = Nominatim(
+            user_agent=getattr(settings, 'GEOPY_USER_AGENT', 'base'),
+            timeout=getattr(settings, 'GEOCODE_TIMEOUT_SECONDS', 10),
+        )
+    return _geolocator
+
+
+def get_address_from_coords(lat, lng):
+    """Reverse geocode coordinates to get address"""
+    location = get_geolocator().reverse(f"{lat}, {lng}")
+    return location.address if location else UNKNOWN_ADDRESS
+
+
+def geohash_encode(lat, lng, precision):
+    """Encode a coordinate as a geohash string of ``precision`` characters"""
+    lat_range = [-90.0, 90.0]
+    lng_range = [-180.0, 180.0]
+    chars = []
+    bits = 0
+    bit_count = 0
+    even = True
+    while len(chars) < precision:
+        value, bounds = (lng, lng_range) if even else (lat, lat_range)
+        mid = (bounds[0] + bounds[1]) / 2
+        bits <<= 1
+        if value >= mid:
+            bits |= 1
+            bounds[0] = mid
+        else:
+            bounds[1] = mid
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(GEOHASH_ALPHABET[bits])
+            bits = 0
+            bit_count = 0
+    return ''.join(chars)
+
+
+def normalize_address(address):
+    return ' '.join(address.lower().split())[:255]
+
+
+class GeocodeCache:
+    """Two-tier geocode cache: an in-process LRU in front of GeocodeCacheEntry rows.
+
+    Values are ``(address, location)`` tuples. Entries set with a ``ttl`` (negative
+    results) expire in both tiers. Counters are per process; database hits are
+    added to GeocodeCacheEntry.hits in batches by flush_hits(), so the stored
+    counts are approximate (a process can exit with hits not yet written).
+    """
+
+    def __init__(self, max_entries, hit_flush_threshold=1000):
+        self.max_entries = max_entries
+        self.hit_flush_threshold = hit_flush_threshold
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._pending_hits = Counter()
+        self.memory_hits = 0
+        self.db_hits = 0
+        self.misses = 0
+
+    def _remember(self, kind, key, value, expires_at=None):
+        with self._lock:
+            self._entries[(kind, key)] = (value, expires_at)
+            self._entries.move_to_end((kind, key))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get_many(self, kind, keys):
+        """Look up several keys with at most one database query"""
+        found = {}
+        missing = set()
+        now = timezone.now()
+        with self._lock:
+            for key in set(keys):
+                value, expires_at = self._entries.get((kind, key), (None, None))
+                if value is not None and (expires_at is None or expires_at > now):
+                    self._entries.move_to_end((kind, key))
+                    found[key] = value
+                    self.memory_hits += 1
+                else:
+                    missing.add(key)
+
+        if missing:
+            entries = GeocodeCacheEntry.objects.filter(kind=kind, key__in=missing).filter(
+                Q(expires_at__isnull=True) | Q(expires_at__gt=now)
+            )
+            hit_ids = []
+            for entry in entries:
+                value = (entry.address, entry.location)
+                found[entry.key] = value
+                self._remember(kind, entry.key, value, entry.expires_at)
+                hit_ids.append(entry.pk)
+            with self._lock:
+                self._pending_hits.update(hit_ids)
+                pending = sum(self._pending_hits.values())
+                self.db_hits += len(hit_ids)
+                self.misses += len(missing) - len(hit_ids)
+            if pending >= self.hit_flush_threshold:
+                self.flush_hits()
+        return found
+
+    def flush_hits(self):
+        """Add the database hits counted since the last flush to GeocodeCacheEntry.hits in one UPDATE"""
+        with self._lock:
+            pending, self._pending_hits = self._pending_hits, Counter()
+        if pending:
+            GeocodeCacheEntry.objects.filter(pk__in=list(pending)).update(
+                hits=F('hits') + Case(*[When(pk=pk, then=Value(count)) for pk, count in pending.items()], default=0)
+            )
+
+    def get(self, kind, key):
+        return self.get_many(kind, [key]).get(key)
+
+    def set(self, kind, key, address='', location=None, ttl=None):
+        """Store an entry in both tiers; ``ttl`` seconds limits how long it is served"""
+        expires_at = timezone.now() + timedelta(seconds=ttl) if ttl is not None else None
+        GeocodeCacheEntry.objects.update_or_create(
+            kind=kind,
+            key=key,
+            defaults={'address': address, 'location': location, 'expires_at': expires_at},
+        )
+        self._remember(kind, key, (address, location), expires_at)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.memory_hits + self.db_hits + self.misses
+            return {
+                'size': len(self._entries),
+                'memory_hits': self.memory_hits,
+                'db_hits': self.db_hits,
+                'misses': self.misses,
+                'hit_rate': (self.memory_hits + self.db_hits) / lookups if lookups else 0.0,
+            }
+
+
+geocode_cache = GeocodeCache(
+    getattr(settings, 'GEOCODE_CACHE_MAX_ENTRIES', 10000),
+    getattr(settings, 'GEOCODE_HIT_FLUSH_THRESHOLD', 1000),
+)
+
+
+def coords_cell(lat, lng):
+    return geohash_encode(lat, lng, getattr(settings, 'GEOCODE_CACHE_PRECISION', 8))
+
+
+def cached_addresses(coords):
+    """Return cached addresses for a list of (lat, lng) pairs, None where the cell is unknown"""
+    cells = [coords_cell(lat, lng) for lat, lng in coords]
+    found = geocode_cache.get_many('reverse', cells)
+    return [found[cell][0] if cell in found else None for cell in cells]
+
+
+def remember_address(cell, address):
+    """Cache a reverse-geocode result; "not found" is kept only for GEOCODE_NEGATIVE_CACHE_SECONDS"""
+    ttl = getattr(settings, 'GEOCODE_NEGATIVE_CACHE_SECONDS', 21600) if address == UNKNOWN_ADDRESS else None
+    geocode_cache.set('reverse', cell, address=address, ttl=ttl)
+
+
+def reverse_geocode(lat, lng):
+    """Reverse geocode through the cache, calling Nominatim only for unseen cells"""
+    cell = coords_cell(lat, lng)
+    cached = geocode_cache.get('reverse', cell)
+    if cached:
+        return cached[0]
+    address = get_address_from_coords(lat, lng)
+    remember_address(cell, address)
+    return address
+
+
+def forward_geocode(address):
+    """Geocode an address to a Point through the cache; returns None when not found"""
+    key = normalize_address(address)
+    cached = geocode_cache.get('forward', key)
+    if cached:
+        return cached[1]
+    location = get_geolocator().geocode(address)
+    if not location:
+        return None
+    point = Point(location.longitude, location.latitude, srid=4326)
+    geocode_cache.set('forward', key, address=location.address, location=point)
+    return point
+
+
+def enqueue_address_lookups(logs):
+    """Queue a reverse-geocode job for every saved log that has no address yet"""
+    jobs = [GeocodeJob(location_log=log) for log in logs if not log.address]
+    GeocodeJob.objects.bulk_create(jobs, ignore_conflicts=True)
+    return len(jobs)
+
+
+def claim_geocode_jobs(limit):
+    """Lease up to ``limit`` jobs to this worker, skipping rows other workers hold.
+
+    Jobs whose LocationLog is gone (deleted outside the ORM, or dropped with a
+    detached partition) would be claimed and never completed, so they are deleted.
+    """
+    now = timezone.now()
+    lease_expired = now - timedelta(seconds=getattr(settings, 'GEOCODE_JOB_LEASE_SECONDS', 300))
+    with transaction.atomic():
+        job_ids = list(
+            GeocodeJob.objects.select_for_update(skip_locked=True)
+            .filter(Q(status='pending') | Q(status='running', claimed_at__lt=lease_expired))
+            .order_by('created_at')
+            .values_list('id', flat=True)[:limit]
+        )
+        GeocodeJob.objects.filter(id__in=job_ids).update(
+            status='running',
+            claimed_at=now,
+            attempts=F('attempts') + 1,
+        )
+    jobs = list(GeocodeJob.objects.filter(id__in=job_ids).select_related('location_log'))
+    orphaned = set(job_ids) - {job.pk for job in jobs}
+    if orphaned:
+        GeocodeJob.objects.filter(id__in=orphaned).delete()
+        logger.info(f"Dropped {len(orphaned)} geocode jobs whose location log no longer exists")
+    return jobs
+
+
+def process_geocode_jobs(batch_size=50):
+    """Resolve one batch of queued jobs and write the addresses back in bulk.
+
+    Returns the number of jobs claimed, so callers can tell an empty queue apart.
+    """
+    jobs = claim_geocode_jobs(batch_size)
+    if not jobs:
+        return 0
+
+    min_delay = getattr(settings, 'GEOCODE_MIN_DELAY_SECONDS', 1.0)
+    max_attempts = getattr(settings, 'GEOCODE_JOB_MAX_ATTEMPTS', 5)
+
+    # Group the batch by cache cell so each unseen cell costs one remote lookup
+    jobs_by_cell = OrderedDict()
+    for job in jobs:
+        point = job.location_log.point
+        jobs_by_cell.setdefault(coords_cell(point.y, point.x), []).append(job)
+    resolved = {cell: value[0] for cell, value in geocode_cache.get_many('reverse', list(jobs_by_cell)).items()}
+
+    last_request = 0.0
+    for cell, cell_jobs in jobs_by_cell.items():
+        if cell in resolved:
+            continue
+        # Nominatim's usage policy allows one request per second
+        wait = min_delay - (time.monotonic() - last_request)
+        if wait > 0:
+            time.sleep(wait)
+        last_request = time.monotonic()
+        point = cell_jobs[0].location_log.point
+        try:
+            resolved[cell] = get_address_from_coords(point.y, point.x)
+            remember_address(cell, resolved[cell])
+        except GeopyError as e:
+            logger.warning(f"Reverse geocoding failed for cell {cell}: {str(e)}")
+            resolved[cell] = e
+
+    logs, done, retry = [], [], []
+    for cell, cell_jobs in jobs_by_cell.items():
+        result = resolved[cell]
+        for job in cell_jobs:
+            if isinstance(result, GeopyError):
+                job.status = 'failed' if job.attempts >= max_attempts else 'pending'
+                job.last_error = str(result)
+                retry.append(job)
+                continue
+            job.location_log.address = result
+            logs.append(job.location_log)
+            done.append(job.pk)
+
+    with transaction.atomic():
+        LocationLog.objects.bulk_update(logs, ['address'])
+        InternLastLocation.objects.filter(location_log_id__in=[log.pk for log in logs]).update(
+            address=Subquery(LocationLog.objects.filter(pk=OuterRef('location_log_id')).values('address')[:1])
+        )
+        GeocodeJob.objects.filter(id__in=done).delete()
+        GeocodeJob.objects.bulk_update(retry, ['status', 'last_error'])
+
+    # The worker is off the ingest path, so it also writes out this process's hit counts
+    geocode_cache.flush_hits()
+    return len(jobs)
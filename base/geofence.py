@@ -0,0 +1,167 @@
+import math
+import threading
+import time
+
+import numpy as np
+from django.conf import settings
+from django.contrib.gis.geos import Point
+
+EARTH_RADIUS_M = 6371008.8
+
+
+def _haversine(lat0, lng0, cos_lat0, lats, lngs):
+    lats = np.radians(np.asarray(lats, dtype=np.float64))
+    lngs = np.radians(np.asarray(lngs, dtype=np.float64))
+    a = np.sin((lats - lat0) / 2) ** 2 + cos_lat0 * np.cos(lats) * np.sin((lngs - lng0) / 2) ** 2
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def haversine_distances(lat0, lng0, lats, lngs):
+    """Great-circle distance in meters from (lat0, lng0) to arrays of coordinates in degrees"""
+    lat0 = math.radians(lat0)
+    return _haversine(lat0, math.radians(lng0), math.cos(lat0), lats, lngs)
+
+
+class STRtree:
+    """Sort-Tile-Recursive packed R-tree over ``(minx, miny, maxx, maxy)`` envelopes.
+
+    Built once per fence; ``query`` returns the indexes of envelopes containing a point.
+    """
+
+    def __init__(self, envelopes, node_capacity=8):
+        self.node_capacity = node_capacity
+        level = [(*envelope, index) for index, envelope in enumerate(envelopes)]
+        while len(level) > node_capacity:
+            level = self._pack(level)
+        self.root = level
+
+    def _pack(self, entries):
+        capacity = self.node_capacity
+        node_count = math.ceil(len(entries) / capacity)
+        slice_size = math.ceil(math.sqrt(node_count)) * capacity
+        entries = sorted(entries, key=lambda e: e[0] + e[2])
+        nodes = []
+        for start in range(0, len(entries), slice_size):
+            vertical_slice = sorted(entries[start:start + slice_size], key=lambda e: e[1] + e[3])
+            for offset in range(0, len(vertical_slice), capacity):
+                children = vertical_slice[offset:offset + capacity]
+                nodes.append((
+                    min(c[0] for c in children),
+                    min(c[1] for c in children),
+                    max(c[2] for c in children),
+                    max(c[3] for c in children),
+                    children,
+                ))
+        return nodes
+
+    def query(self, x, y):
+        matches = []
+        stack = list(self.root)
+        while stack:
+            minx, miny, maxx, maxy, payload = stack.pop()
+            if minx <= x <= maxx and miny <= y <= maxy:
+                if isinstance(payload, list):
+                    stack.extend(payload)
+                else:
+                    matches.append(payload)
+        return matches
+
+
+class OrganizationFence:
+    """An organization's geofence: a circle around its location plus any polygon zones.
+
+    The haversine terms for the circle's center are precomputed, and each zone's
+    geometry is prepared once and indexed by envelope. A fix is inside when it is
+    within the circle or covered by any active zone.
+    """
+
+    def __init__(self, organization, zones=()):
+        self.organization_id = organization.pk
+        self.radius = float(organization.geofence_radius)
+        self.has_center = organization.location is not None
+        if self.has_center:
+            self.lat0 = math.radians(organization.location.y)
+            self.lng0 = math.radians(organization.location.x)
+            self.cos_lat0 = math.cos(self.lat0)
+
+        self.zone_ids = [zone.pk for zone in zones]
+        self.prepared_zones = [zone.boundary.prepared for zone in zones]
+        envelopes = [zone.boundary.extent for zone in zones]
+        self.zone_index = STRtree(envelopes) if envelopes else None
+        if envelopes:
+            self.zones_extent = (
+                min(e[0] for e in envelopes),
+                min(e[1] for e in envelopes),
+                max(e[2] for e in envelopes),
+                max(e[3] for e in envelopes),
+            )
+        self.loaded_at = time.monotonic()
+
+    def distances(self, lats, lngs):
+        return _haversine(self.lat0, self.lng0, self.cos_lat0, lats, lngs)
+
+    def zone_at(self, lat, lng):
+        """Return the id of the first zone covering the coordinate, or None"""
+        if self.zone_index is None:
+            return None
+        point = Point(lng, lat, srid=4326)
+        for candidate in self.zone_index.query(lng, lat):
+            if self.prepared_zones[candidate].covers(point):
+                return self.zone_ids[candidate]
+        return None
+
+    def contains(self, lats, lngs):
+        """Classify arrays of coordinates, returning a boolean array"""
+        lats = np.asarray(lats, dtype=np.float64)
+        lngs = np.asarray(lngs, dtype=np.float64)
+        if self.has_center:
+            inside = self.distances(lats, lngs) <= self.radius
+        else:
+            inside = np.zeros(len(lats), dtype=bool)
+
+        if self.zone_index is not None:
+            # Only fixes outside the circle and inside the zones' combined extent need GEOS
+            minx, miny, maxx, maxy = self.zones_extent
+            candidates = ~inside & (lngs >= minx) & (lngs <= maxx) & (lats >= miny) & (lats <= maxy)
+            for i in np.flatnonzero(candidates):
+                inside[i] = self.zone_at(lats[i], lngs[i]) is not None
+        return inside
+
+
+class GeofenceEngine:
+    """Process-wide cache of OrganizationFence objects keyed by organization id.
+
+    Entries are dropped by Organization.save and GeofenceZone.save/delete, and expire after GEOFENCE_CACHE_TTL_SECONDS
+    so changes saved by other processes are picked up too.
+    """
+
+    def __init__(self):
+        self._fences = {}
+        self._lock = threading.Lock()
+
+    def get(self, organization_id):
+        from .models import Organization
+
+        ttl = getattr(settings, 'GEOFENCE_CACHE_TTL_SECONDS', 60)
+        fence = self._fences.get(organization_id)
+        if fence is None or time.monotonic() - fence.loaded_at > ttl:
+            organization = Organization.objects.only('location', 'geofence_radius').get(pk=organization_id)
+            zones = list(organization.geofence_zones.filter(is_active=True).only('boundary'))
+            fence = OrganizationFence(organization, zones)
+            with self._lock:
+                self._fences[organization_id] = fence
+        return fence
+
+    def invalidate(self, organization_id):
+        with self._lock:
+            self._fences.pop(organization_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._fences.clear()
+
+    def contains(self, organization_id, lats, lngs):
+        return self.get(organization_id).contains(lats, lngs)
+
+
+geofence_engine = GeofenceEngine()
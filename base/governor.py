@@ -0,0 +1,130 @@
+import math
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.redis import RedisCache
+
+from .geofence import haversine_distances
+from .models import InternLastLocation
+
+
+class RateLimited(Exception):
+    """Raised when an intern has sent more ingest requests than its limit allows"""
+
+    def __init__(self, retry_after):
+        super().__init__(f'Rate limit exceeded, retry after {retry_after} seconds')
+        self.retry_after = retry_after
+
+
+# Refill a bucket for the time since it was last touched, then take a token if one
+# is there. Runs atomically inside Redis, so concurrent requests from every process
+# see each other. Returns {1, tokens} when a token was taken, else {0, tokens}.
+TOKEN_BUCKET_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local tokens = tonumber(state[1]) or capacity
+local updated = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - updated) * rate)
+local taken = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+    taken = 1
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+return {taken, tostring(tokens)}
+"""
+
+_bucket_script = None
+_local_lock = threading.Lock()
+
+
+def _refill(tokens, updated, capacity, rate, now):
+    return min(capacity, tokens + max(0.0, now - updated) * rate)
+
+
+def _take_from_redis(backend, key, capacity, rate, now):
+    global _bucket_script
+    key = backend.make_and_validate_key(key)
+    client = backend._cache.get_client(key, write=True)
+    if _bucket_script is None:
+        _bucket_script = client.register_script(TOKEN_BUCKET_SCRIPT)
+    taken, tokens = _bucket_script(keys=[key], args=[capacity, rate, now], client=client)
+    return bool(taken), float(tokens)
+
+
+def _take_from_cache(backend, key, capacity, rate, now):
+    # Other cache backends have no server-side scripting; the lock makes this
+    # atomic within one process, which is all a local cache can offer anyway
+    with _local_lock:
+        tokens, updated = backend.get(key, (capacity, now))
+        tokens = _refill(tokens, updated, capacity, rate, now)
+        taken = tokens >= 1
+        if taken:
+            tokens -= 1
+        backend.set(key, (tokens, now), timeout=math.ceil(capacity / rate) + 1)
+    return taken, tokens
+
+
+def take_token(intern_id, now=None):
+    """Take one ingest token from the intern's bucket, raising RateLimited when it is empty.
+
+    The bucket holds INGEST_RATE_BURST tokens and refills continuously at
+    INGEST_RATE_PER_MINUTE, so a client can send a burst at once and then keep
+    to the sustained rate, with no window boundary to straddle. With the Redis
+    cache the bucket is updated by one Lua script, so the limit holds across
+    every process.
+    """
+    capacity = getattr(settings, 'INGEST_RATE_BURST', 20)
+    rate = getattr(settings, 'INGEST_RATE_PER_MINUTE', 60) / 60
+    now = time.time() if now is None else now
+    backend = caches['default']
+    take = _take_from_redis if isinstance(backend, RedisCache) else _take_from_cache
+    taken, tokens = take(backend, f'ingest-bucket:{intern_id}', capacity, rate, now)
+    if not taken:
+        raise RateLimited(max(1, math.ceil((1 - tokens) / rate)))
+
+
+def drop_redundant_fixes(intern, fixes):
+    """Drop fixes too close in time or space to the previous accepted fix, returning the rest.
+
+    A fix is dropped when it comes less than INGEST_MIN_INTERVAL_SECONDS after the
+    previous one or less than INGEST_MIN_DISTANCE_METERS away from it, unless its
+    ``is_inside_geofence`` differs: a step across the fence is always kept, so
+    enter/exit transitions are never lost. One fix per INGEST_MAX_SILENCE_SECONDS
+    is always kept, so a stationary intern still shows up as present. Fixes older than the intern's last position are backfill and
+    are kept as they are. ingest_fixes holds the intern's row lock around this
+    and the insert, so concurrent batches see each other's fixes.
+    """
+    min_interval = getattr(settings, 'INGEST_MIN_INTERVAL_SECONDS', 5)
+    min_distance = getattr(settings, 'INGEST_MIN_DISTANCE_METERS', 10)
+    max_silence = getattr(settings, 'INGEST_MAX_SILENCE_SECONDS', 300)
+
+    previous = (
+        InternLastLocation.objects.filter(intern=intern)
+        .values_list('timestamp', 'point', 'is_inside_geofence').first()
+    )
+    if previous is not None:
+        last_timestamp, last_point, last_inside = previous[0], (previous[1].y, previous[1].x), previous[2]
+    else:
+        last_timestamp, last_point, last_inside = None, None, None
+
+    accepted = []
+    for fix in sorted(fixes, key=lambda fix: fix['timestamp']):
+        if last_timestamp is not None:
+            elapsed = (fix['timestamp'] - last_timestamp).total_seconds()
+            if elapsed < 0:
+                accepted.append(fix)
+                continue
+            if elapsed < max_silence and fix['is_inside_geofence'] == last_inside:
+                distance = haversine_distances(last_point[0], last_point[1], [fix['latitude']], [fix['longitude']])[0]
+                if elapsed < min_interval or distance < min_distance:
+                    continue
+        accepted.append(fix)
+        last_timestamp, last_point = fix['timestamp'], (fix['latitude'], fix['longitude'])
+        last_inside = fix['is_inside_geofence']
+    return accepted
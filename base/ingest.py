@@ -0,0 +1,225 @@
+import asyncio
+import json
+import logging
+import weakref
+from datetime import timedelta
+
+import numpy as np
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.gis.geos import Point
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .events import publish_location_events
+from .geocoding import cached_addresses, enqueue_address_lookups
+from .geofence import geofence_engine
+from .governor import drop_redundant_fixes
+from .models import Intern, LocationLog
+from .positions import record_last_location
+from .presence import note_late_fixes
+from .rollups import record_fixes
+from .tiles import invalidate_tiles
+from .writebehind import location_buffer
+
+logger = logging.getLogger(__name__)
+
+NDJSON_CONTENT_TYPES = ('application/x-ndjson', 'application/ndjson', 'application/jsonlines')
+
+
+class FixError(ValueError):
+    """Raised when a location fix (or a batch of them) cannot be accepted"""
+
+
+def parse_fix(data):
+    """Validate one fix payload and return the fields needed for a LocationLog row"""
+    if not isinstance(data, dict):
+        raise FixError('Fix must be a JSON object')
+
+    if 'latitude' not in data or 'longitude' not in data:
+        raise FixError('Missing latitude/longitude')
+
+    try:
+        lat = float(data['latitude'])
+        lng = float(data['longitude'])
+    except (ValueError, TypeError):
+        raise FixError('Invalid coordinates')
+    if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+        raise FixError('Invalid coordinates')
+
+    accuracy = data.get('accuracy')
+    if accuracy is not None:
+        try:
+            accuracy = float(accuracy)
+        except (ValueError, TypeError):
+            raise FixError('Invalid accuracy')
+
+    # Buffered fixes carry the time they were taken on the device
+    now = timezone.now()
+    timestamp = data.get('timestamp')
+    if timestamp:
+        timestamp = parse_datetime(str(timestamp))
+        if timestamp is None:
+            raise FixError('Invalid timestamp')
+        if timezone.is_naive(timestamp):
+            timestamp = timezone.make_aware(timestamp, timezone.get_default_timezone())
+        max_skew = timedelta(seconds=getattr(settings, 'LOCATION_MAX_CLOCK_SKEW_SECONDS', 300))
+        if timestamp > now + max_skew:
+            raise FixError('Timestamp is in the future')
+    else:
+        timestamp = now
+
+    return {
+        'latitude': lat,
+        'longitude': lng,
+        'point': Point(lng, lat, srid=4326),
+        'accuracy': accuracy,
+        'timestamp': timestamp,
+    }
+
+
+def decode_fix_batch(body, content_type):
+    """Decode a JSON array, a {"fixes": [...]} object or an NDJSON body into raw fix payloads"""
+    try:
+        if content_type in NDJSON_CONTENT_TYPES:
+            fixes = [json.loads(line) for line in body.decode('utf-8').splitlines() if line.strip()]
+        else:
+            fixes = json.loads(body)
+            if isinstance(fixes, dict):
+                fixes = fixes.get('fixes')
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        raise FixError('Invalid JSON')
+
+    if not isinstance(fixes, list) or not fixes:
+        raise FixError('Expected a non-empty array of fixes')
+
+    max_fixes = getattr(settings, 'LOCATION_BATCH_MAX_FIXES', 500)
+    if len(fixes) > max_fixes:
+        raise FixError(f'Batch exceeds {max_fixes} fixes')
+    return fixes
+
+
+def parse_fix_batch(payloads):
+    """Validate every payload in one pass, returning (fixes, rejected)"""
+    fixes = []
+    rejected = []
+    for index, data in enumerate(payloads):
+        try:
+            fixes.append(parse_fix(data))
+        except FixError as e:
+            rejected.append({'index': index, 'message': str(e)})
+    return fixes, rejected
+
+
+def prepare_logs(intern, fixes):
+    """Classify parsed fixes against the intern's geofence and build unsaved LocationLog rows.
+
+    Addresses come from the geocode cache only. Fixes are classified first so
+    that the governor can keep every geofence crossing; the ones it considers
+    redundant are then dropped, so there may be fewer logs than fixes.
+    """
+    if not fixes:
+        return []
+    inside = geofence_engine.contains(
+        intern.organization_id,
+        np.array([fix['latitude'] for fix in fixes]),
+        np.array([fix['longitude'] for fix in fixes]),
+    )
+    fixes = drop_redundant_fixes(intern, [
+        {**fix, 'is_inside_geofence': bool(is_inside)} for fix, is_inside in zip(fixes, inside)
+    ])
+    if not fixes:
+        return []
+
+    addresses = cached_addresses([(fix['latitude'], fix['longitude']) for fix in fixes])
+    return [
+        LocationLog(
+            intern=intern,
+            point=fix['point'],
+            timestamp=fix['timestamp'],
+            accuracy=fix['accuracy'],
+            address=fix.get('address') or address,
+            is_inside_geofence=fix['is_inside_geofence'],
+        )
+        for fix, address in zip(fixes, addresses)
+    ]
+
+
+def persist_logs(intern, logs, buffered=False):
+    """Store prepared logs with a single insert and update everything derived from them.
+
+    A GeocodeJob is queued for each row whose cell has not been resolved yet.
+    Tile invalidation and event publishing wait for the outermost commit.
+    ``buffered`` logs come from the write-behind buffer, whose append already
+    moved the last position and published events; here they only get linked to
+    their stored rows.
+    """
+    with transaction.atomic():
+        LocationLog.objects.bulk_create(logs)
+        enqueue_address_lookups(logs)
+        record_fixes(intern, logs)
+        note_late_fixes(intern, logs)
+        previous = record_last_location(intern, logs)
+        coords = [(log.point.y, log.point.x) for log in logs]
+        transaction.on_commit(lambda: invalidate_tiles(intern.organization_id, coords))
+        if not buffered:
+            transaction.on_commit(lambda: publish_location_events(intern, logs, previous))
+    return logs
+
+
+def ingest_fixes(intern, fixes):
+    """Accept parsed fixes for an intern, returning the logs built from them.
+
+    With LOCATION_WRITE_BEHIND the logs are appended to the local write-behind
+    buffer and stored by its flusher; otherwise they are stored before returning.
+    Ingests for one intern run one at a time under a lock on the intern's row,
+    so the governor's view of the last fix cannot change under it. Buffered
+    fixes still move the intern's last position and publish their enter/exit
+    events straight away, so the next batch is compared with them rather than
+    with whatever the flusher last stored.
+    """
+    write_behind = getattr(settings, 'LOCATION_WRITE_BEHIND', False)
+    with transaction.atomic():
+        # NO KEY UPDATE leaves the LocationLog foreign key checks on this row unblocked
+        Intern.objects.select_for_update(no_key=True).filter(pk=intern.pk).first()
+        logs = prepare_logs(intern, fixes)
+        if logs and write_behind:
+            location_buffer.append(intern, logs)
+            previous = record_last_location(intern, logs)
+            transaction.on_commit(lambda: publish_location_events(intern, logs, previous))
+        elif logs:
+            persist_logs(intern, logs)
+    return logs
+
+
+# One semaphore per event loop: asyncio primitives bind to the loop that first
+# waits on them, and async_to_sync under WSGI starts a fresh loop per request
+_ingest_slots = weakref.WeakKeyDictionary()
+
+
+def _slots_for_running_loop():
+    loop = asyncio.get_running_loop()
+    slots = _ingest_slots.get(loop)
+    if slots is None:
+        slots = _ingest_slots[loop] = asyncio.Semaphore(getattr(settings, 'INGEST_MAX_CONCURRENCY', 16))
+    return slots
+
+
+def _ingest_in_worker(intern, fixes):
+    # Worker threads are outside the request cycle, so recycle their connections here
+    close_old_connections()
+    try:
+        return ingest_fixes(intern, fixes)
+    finally:
+        close_old_connections()
+
+
+async def aingest_fixes(intern, fixes):
+    """Run ingest_fixes off the event loop, at most INGEST_MAX_CONCURRENCY at a time per event loop.
+
+    Requests beyond the limit wait on the semaphore without holding a thread or a
+    database connection.
+    """
+    async with _slots_for_running_loop():
+        return await sync_to_async(_ingest_in_worker, thread_sensitive=False)(intern, fixes)
@@ -0,0 +1,39 @@
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from base.models import Organization
+from base.rollups import rebuild_daily_summaries
+
+
+class Command(BaseCommand):
+    help = 'Recompute DailyPresenceSummary rows (including time inside) from LocationLog'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', type=date.fromisoformat, help='First date (YYYY-MM-DD); defaults to yesterday')
+        parser.add_argument('--until', type=date.fromisoformat, help='Last date (YYYY-MM-DD); defaults to today')
+        parser.add_argument('--organization', type=int, help='Only rebuild this organization id')
+        parser.add_argument('--chunk-days', type=int, default=7, help='Days recomputed per statement')
+
+    def handle(self, *args, **options):
+        today = timezone.localdate()
+        since = options['since'] or today - timedelta(days=1)
+        until = options['until'] or today
+        if since > until:
+            raise CommandError('--since must not be after --until')
+
+        organization = None
+        if options['organization']:
+            organization = Organization.objects.filter(pk=options['organization']).first()
+            if organization is None:
+                raise CommandError(f"Organization {options['organization']} does not exist")
+
+        chunk_start = since
+        while chunk_start <= until:
+            chunk_end = min(chunk_start + timedelta(days=options['chunk_days'] - 1), until)
+            written = rebuild_daily_summaries(chunk_start, chunk_end, organization)
+            self.stdout.write(f"{chunk_start} to {chunk_end}: {written} summaries")
+            chunk_start = chunk_end + timedelta(days=1)
+
+        self.stdout.write(self.style.SUCCESS('Presence summaries rebuilt'))
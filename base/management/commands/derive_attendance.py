@@ -0,0 +1,33 @@
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from base.attendance import derive_attendance
+from base.models import Organization
+
+
+class Command(BaseCommand):
+    help = 'Derive daily Attendance records from geofence presence sessions'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', type=date.fromisoformat, help='First date (YYYY-MM-DD); defaults to yesterday')
+        parser.add_argument('--until', type=date.fromisoformat, help='Last date (YYYY-MM-DD); defaults to today')
+        parser.add_argument('--organization', type=int, help='Only derive attendance for this organization id')
+
+    def handle(self, *args, **options):
+        today = timezone.localdate()
+        since = options['since'] or today - timedelta(days=1)
+        until = options['until'] or today
+        if since > until:
+            raise CommandError('--since must not be after --until')
+
+        organizations = Organization.objects.all()
+        if options['organization']:
+            organizations = organizations.filter(pk=options['organization'])
+
+        for organization in organizations:
+            written = derive_attendance(organization, since, until)
+            self.stdout.write(f"{organization}: {written} attendance records")
+
+        self.stdout.write(self.style.SUCCESS('Attendance derived'))
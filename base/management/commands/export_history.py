@@ -0,0 +1,47 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from base.models import Organization
+from base.transfer import DATASETS, FORMATS, TransferError, export_rows
+
+
+class Command(BaseCommand):
+    help = 'Stream LocationLog or Attendance rows to a CSV, NDJSON or Parquet file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('dataset', choices=sorted(DATASETS))
+        parser.add_argument('output', help='File to write')
+        parser.add_argument('--format', choices=FORMATS, default='csv')
+        parser.add_argument('--organization', type=int, help='Only export this organization id')
+        parser.add_argument('--since', type=date.fromisoformat, help='First date (YYYY-MM-DD)')
+        parser.add_argument('--until', type=date.fromisoformat, help='Last date (YYYY-MM-DD)')
+        parser.add_argument('--chunk-size', type=int, default=10000, help='Rows fetched per round trip')
+
+    def handle(self, *args, **options):
+        if options['since'] and options['until'] and options['since'] > options['until']:
+            raise CommandError('--since must not be after --until')
+
+        organization = None
+        if options['organization']:
+            try:
+                organization = Organization.objects.get(pk=options['organization'])
+            except Organization.DoesNotExist:
+                raise CommandError(f"Organization {options['organization']} does not exist")
+
+        try:
+            with open(options['output'], 'wb') as output:
+                count = export_rows(
+                    options['dataset'],
+                    output,
+                    options['format'],
+                    organization=organization,
+                    since=options['since'],
+                    until=options['until'],
+                    chunk_size=options['chunk_size'],
+                )
+        except TransferError as e:
+            raise CommandError(str(e))
+
+        rows = f"{count} rows" if count is not None else "rows"
+        self.stdout.write(self.style.SUCCESS(f"Exported {rows} of {options['dataset']} to {options['output']}"))
@@ -0,0 +1,41 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from base.models import LocationBufferSegment
+from base.writebehind import pending_segments, read_segment, replay_orphaned_segments
+
+
+class Command(BaseCommand):
+    help = 'Replay write-behind segments left by exited processes into LocationLog'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true',
+                            help='Also flush segments of running processes (only while the web servers are stopped)')
+        parser.add_argument('--stats', action='store_true', help='Report the buffer depth on disk and exit')
+        parser.add_argument('--watch', type=float, metavar='SECONDS',
+                            help='Keep replaying orphaned segments at this interval')
+        parser.add_argument('--keep-days', type=int, default=7, help='Days to keep flushed segment markers')
+
+    def handle(self, *args, **options):
+        if options['stats']:
+            segments = pending_segments()
+            rows = sum(len(read_segment(path)) for path in segments)
+            self.stdout.write(f"{len(segments)} segments with {rows} fixes waiting to be flushed")
+            return
+
+        while True:
+            started = time.monotonic()
+            segments, rows = replay_orphaned_segments(include_live=options['all'])
+            if segments or options['verbosity'] > 1:
+                self.stdout.write(
+                    f"Replayed {segments} segments ({rows} fixes) in {time.monotonic() - started:.2f}s"
+                )
+            cutoff = timezone.now() - timedelta(days=options['keep_days'])
+            LocationBufferSegment.objects.filter(flushed_at__lt=cutoff).delete()
+            if options['watch'] is None:
+                break
+            time.sleep(options['watch'])
+        self.stdout.write(self.style.SUCCESS('Location buffer flushed'))
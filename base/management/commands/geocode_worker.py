@@ -0,0 +1,31 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from base.geocoding import geocode_cache, process_geocode_jobs
+
+
+class Command(BaseCommand):
+    help = 'Fill in LocationLog addresses by draining the reverse-geocode job queue'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=50, help='Jobs claimed per batch')
+        parser.add_argument('--idle-sleep', type=float, default=5.0, help='Seconds to wait when the queue is empty')
+        parser.add_argument('--once', action='store_true', help='Process a single batch and exit')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        while True:
+            processed = process_geocode_jobs(batch_size)
+            if processed and options['verbosity'] > 1:
+                stats = geocode_cache.stats()
+                self.stdout.write(
+                    f"Processed {processed} geocode jobs "
+                    f"(cache: {stats['memory_hits']} memory hits, {stats['db_hits']} db hits, "
+                    f"{stats['misses']} misses, {stats['hit_rate']:.0%} hit rate)"
+                )
+            if options['once']:
+                break
+            if not processed:
+                time.sleep(options['idle_sleep'])
+        self.stdout.write(self.style.SUCCESS('Geocode worker finished'))
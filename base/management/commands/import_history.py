@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from base.transfer import DATASETS, FORMATS, TransferError, import_rows
+
+
+class Command(BaseCommand):
+    help = 'Load LocationLog or Attendance rows from a file written by export_history'
+
+    def add_arguments(self, parser):
+        parser.add_argument('dataset', choices=sorted(DATASETS))
+        parser.add_argument('source', help='File to read')
+        parser.add_argument('--format', choices=FORMATS, default='csv')
+        parser.add_argument('--chunk-size', type=int, default=10000, help='Rows sent per COPY for NDJSON and Parquet')
+
+    def handle(self, *args, **options):
+        mode = 'rb' if options['format'] == 'parquet' else 'r'
+        try:
+            with open(options['source'], mode, **({} if mode == 'rb' else {'encoding': 'utf-8', 'newline': ''})) as source:
+                imported, skipped = import_rows(options['dataset'], source, options['format'], options['chunk_size'])
+        except (TransferError, ValueError) as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(
+            f"Skipped {skipped} rows that were already stored, repeated, or had missing fields "
+            "or unknown interns/employees"
+        )
+        if options['dataset'] == 'locations' and imported:
+            self.stdout.write(
+                "Run sessionize_presence to fold the imported fixes into sessions, "
+                "and manage_location_partitions if they fall outside the existing partitions"
+            )
+        self.stdout.write(self.style.SUCCESS(f"Imported {imported} rows of {options['dataset']}"))
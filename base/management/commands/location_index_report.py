@@ -0,0 +1,66 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from base.models import DailyPresenceSummary, Intern, LocationLog
+from base.rollups import window_dates
+from base.utils import get_time_window, intern_time_zone
+
+
+def view_querysets(intern):
+    """The queries issued by dashboard, intern_detail and geofence_violations"""
+    start, end = get_time_window('today', intern_time_zone(intern))
+    start_date, end_date = window_dates(start, end)
+    today_logs = LocationLog.objects.for_intern(intern).in_window(start, end)
+    return {
+        'dashboard: recent locations': today_logs.order_by('-timestamp')[:10],
+        'dashboard: violations today': DailyPresenceSummary.objects.filter(
+            intern=intern,
+            date__gte=start_date,
+            date__lte=end_date
+        ),
+        'intern_detail: locations': today_logs.order_by('-timestamp')[:50],
+        'geofence_violations: intern': LocationLog.objects.for_intern(intern).violations().order_by('-timestamp'),
+        'geofence_violations: organization': LocationLog.objects.for_organization(
+            intern.organization_id
+        ).violations().order_by('-timestamp'),
+    }
+
+
+class Command(BaseCommand):
+    help = 'Show the query plans the LocationLog views get and how often each index is used'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--intern', type=int, help='Intern id to plan for (defaults to the most active one)')
+        parser.add_argument('--analyze', action='store_true', help='Run EXPLAIN ANALYZE (executes the queries)')
+
+    def handle(self, *args, **options):
+        if options['intern']:
+            intern = Intern.objects.filter(pk=options['intern']).first()
+        else:
+            latest = LocationLog.objects.order_by('-timestamp').values_list('intern_id', flat=True).first()
+            intern = Intern.objects.filter(pk=latest).first()
+        if intern is None:
+            raise CommandError('No intern with location data found')
+
+        self.stdout.write(self.style.MIGRATE_HEADING(f"Query plans for intern {intern.pk}"))
+        for name, queryset in view_querysets(intern).items():
+            self.stdout.write(self.style.MIGRATE_LABEL(name))
+            if options['analyze']:
+                plan = queryset.explain(analyze=True, buffers=True)
+            else:
+                plan = queryset.explain()
+            self.stdout.write(plan + '\n')
+
+        self.stdout.write(self.style.MIGRATE_HEADING('Index usage'))
+        with connection.cursor() as cursor:
+            cursor.execute(
+                """
+                SELECT relname, indexrelname, idx_scan, pg_size_pretty(pg_relation_size(indexrelid))
+                FROM pg_stat_user_indexes
+                WHERE relname LIKE %s
+                ORDER BY relname, indexrelname
+                """,
+                [LocationLog._meta.db_table + '%'],
+            )
+            for table, index, scans, size in cursor.fetchall():
+                self.stdout.write(f"{table:<32} {index:<48} {scans:>10} scans  {size}")
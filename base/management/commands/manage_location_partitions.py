@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from base.partitions import add_months, detach_partition, ensure_partition, list_partitions
+
+
+class Command(BaseCommand):
+    help = 'Create upcoming monthly LocationLog partitions and detach or archive expired ones'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ahead', type=int, default=3, help='Months to create beyond the current one')
+        parser.add_argument('--retain-months', type=int, help='Detach partitions older than this many months')
+        parser.add_argument('--archive-schema', help='Move detached partitions into this schema')
+        parser.add_argument('--drop', action='store_true', help='Drop detached partitions instead of keeping them')
+
+    def handle(self, *args, **options):
+        if options['drop'] and options['archive_schema']:
+            raise CommandError('--drop and --archive-schema are mutually exclusive')
+
+        today = timezone.now().date()
+        current_month = today.replace(day=1)
+
+        for offset in range(options['ahead'] + 1):
+            month = add_months(current_month, offset)
+            if ensure_partition(month):
+                self.stdout.write(f"Created partition for {month:%Y-%m}")
+
+        if options['retain_months'] is not None:
+            cutoff = add_months(current_month, -options['retain_months'])
+            for month in sorted(list_partitions()):
+                if month >= cutoff:
+                    break
+                detach_partition(month, archive_schema=options['archive_schema'], drop=options['drop'])
+                self.stdout.write(f"Detached partition for {month:%Y-%m}")
+
+        self.stdout.write(self.style.SUCCESS('LocationLog partitions are up to date'))
@@ -0,0 +1,31 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from base.payroll import month_start, run_payroll
+
+
+def parse_month(value):
+    try:
+        return date.fromisoformat(f'{value}-01')
+    except ValueError:
+        raise CommandError(f'Invalid month {value}; expected YYYY-MM')
+
+
+class Command(BaseCommand):
+    help = 'Compute Payroll rows for every active employee for one month'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--month', help='Month to run (YYYY-MM); defaults to the current month')
+        parser.add_argument('--batch-size', type=int, default=2000, help='Rows written per upsert')
+
+    def handle(self, *args, **options):
+        month = parse_month(options['month']) if options['month'] else month_start(timezone.localdate())
+
+        def progress(written, total):
+            if options['verbosity'] > 0:
+                self.stdout.write(f"{written}/{total} payroll rows written")
+
+        written = run_payroll(month, batch_size=options['batch_size'], progress=progress)
+        self.stdout.write(self.style.SUCCESS(f"Payroll for {month:%Y-%m}: {written} employees"))
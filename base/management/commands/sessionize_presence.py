@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from base.attendance import derive_attendance
+from base.models import Intern, Organization
+from base.presence import sessionize
+
+
+class Command(BaseCommand):
+    help = 'Incrementally merge new LocationLog fixes into inside/outside presence sessions'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--organization', type=int, help='Only sessionize interns of this organization id')
+        parser.add_argument('--max-fixes', type=int, default=50000, help='Fixes processed per intern per transaction')
+
+    def handle(self, *args, **options):
+        interns = Intern.objects.filter(organization__isnull=False)
+        if options['organization']:
+            interns = interns.filter(organization_id=options['organization'])
+
+        total, rewound = sessionize(interns, options['max_fixes'])
+        self.stdout.write(self.style.SUCCESS(f"Sessionized {total} fixes"))
+
+        # Late fixes rebuilt older sessions; attendance derived from them is redone too
+        for organization in Organization.objects.filter(pk__in=list(rewound)):
+            since = timezone.localtime(rewound[organization.pk], organization.tzinfo).date()
+            today = timezone.localdate(timezone=organization.tzinfo)
+            written = derive_attendance(organization, since, today)
+            self.stdout.write(f"{organization}: re-derived {written} attendance records since {since}")
@@ -0,0 +1,19 @@
+# Generated by Django 5.2 on 2026-10-17 09:12
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0007_alter_intern_user'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='locationlog',
+            name='timestamp',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2 on 2026-10-17 10:41
+
+import django.contrib.gis.db.models.fields
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0009_geocodejob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GeocodeCacheEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('reverse', 'Reverse'), ('forward', 'Forward')], max_length=7)),
+                ('key', models.CharField(max_length=255)),
+                ('address', models.TextField(blank=True)),
+                ('location', django.contrib.gis.db.models.fields.PointField(blank=True, null=True, srid=4326)),
+                ('hits', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name_plural': 'Geocode cache entries',
+                'constraints': [models.UniqueConstraint(fields=('kind', 'key'), name='unique_geocode_cache_key')],
+            },
+        ),
+    ]
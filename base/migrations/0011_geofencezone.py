@@ -0,0 +1,28 @@
+# Generated by Django 5.2 on 2026-10-17 11:27
+
+import django.contrib.gis.db.models.fields
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0010_geocodecacheentry'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GeofenceZone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100)),
+                ('boundary', django.contrib.gis.db.models.fields.MultiPolygonField(srid=4326)),
+                ('is_active', models.BooleanField(default=True)),
+                ('organization', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='geofence_zones', to='base.organization')),
+            ],
+            options={
+                'ordering': ['name'],
+            },
+        ),
+    ]
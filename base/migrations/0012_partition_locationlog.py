@@ -0,0 +1,117 @@
+# Generated by Django 5.2 on 2026-10-17 12:15
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+# Rebuild base_locationlog as a table range-partitioned by month on "timestamp".
+# PostgreSQL requires the partition key in the primary key, so the table's PK
+# becomes (id, "timestamp"); Django still treats id as the primary key, which
+# stays unique because every row draws it from the same identity sequence.
+# Existing rows are copied into monthly partitions, a default partition catches
+# anything outside the managed range, and three months ahead are pre-created
+# (see the manage_location_partitions command for ongoing maintenance).
+PARTITION_SQL = """
+ALTER TABLE base_locationlog RENAME TO base_locationlog_unpartitioned;
+ALTER TABLE base_locationlog_unpartitioned RENAME CONSTRAINT base_locationlog_pkey TO base_locationlog_unpartitioned_pkey;
+
+CREATE TABLE base_locationlog (
+    id bigint GENERATED BY DEFAULT AS IDENTITY,
+    point geometry(Point, 4326) NOT NULL,
+    "timestamp" timestamp with time zone NOT NULL,
+    accuracy double precision NULL,
+    address text NULL,
+    is_inside_geofence boolean NOT NULL,
+    intern_id bigint NOT NULL,
+    CONSTRAINT base_locationlog_pkey PRIMARY KEY (id, "timestamp"),
+    CONSTRAINT base_locationlog_intern_id_fk_base_intern_id
+        FOREIGN KEY (intern_id) REFERENCES base_intern (id) DEFERRABLE INITIALLY DEFERRED
+) PARTITION BY RANGE ("timestamp");
+
+CREATE INDEX base_locationlog_intern_id_part_idx ON base_locationlog (intern_id);
+CREATE INDEX base_locationlog_point_part_idx ON base_locationlog USING GIST (point);
+CREATE TABLE base_locationlog_default PARTITION OF base_locationlog DEFAULT;
+
+DO $$
+DECLARE
+    month_start date;
+    last_month date := date_trunc('month', now() AT TIME ZONE 'UTC') + interval '3 months';
+BEGIN
+    SELECT date_trunc('month', min("timestamp") AT TIME ZONE 'UTC')
+      INTO month_start FROM base_locationlog_unpartitioned;
+    IF month_start IS NULL OR month_start > date_trunc('month', now() AT TIME ZONE 'UTC') THEN
+        month_start := date_trunc('month', now() AT TIME ZONE 'UTC');
+    END IF;
+    WHILE month_start <= last_month LOOP
+        EXECUTE format(
+            'CREATE TABLE %I PARTITION OF base_locationlog FOR VALUES FROM (%L) TO (%L)',
+            'base_locationlog_p' || to_char(month_start, 'YYYYMM'),
+            month_start::timestamp AT TIME ZONE 'UTC',
+            (month_start + interval '1 month')::timestamp AT TIME ZONE 'UTC'
+        );
+        month_start := month_start + interval '1 month';
+    END LOOP;
+END $$;
+
+INSERT INTO base_locationlog (id, point, "timestamp", accuracy, address, is_inside_geofence, intern_id)
+SELECT id, point, "timestamp", accuracy, address, is_inside_geofence, intern_id
+FROM base_locationlog_unpartitioned;
+
+SELECT setval(
+    pg_get_serial_sequence('base_locationlog', 'id'),
+    COALESCE((SELECT max(id) FROM base_locationlog), 0) + 1,
+    false
+);
+
+DROP TABLE base_locationlog_unpartitioned;
+"""
+
+UNPARTITION_SQL = """
+ALTER TABLE base_locationlog RENAME TO base_locationlog_partitioned;
+ALTER TABLE base_locationlog_partitioned RENAME CONSTRAINT base_locationlog_pkey TO base_locationlog_partitioned_pkey;
+
+CREATE TABLE base_locationlog (
+    id bigint GENERATED BY DEFAULT AS IDENTITY,
+    point geometry(Point, 4326) NOT NULL,
+    "timestamp" timestamp with time zone NOT NULL,
+    accuracy double precision NULL,
+    address text NULL,
+    is_inside_geofence boolean NOT NULL,
+    intern_id bigint NOT NULL,
+    CONSTRAINT base_locationlog_pkey PRIMARY KEY (id),
+    CONSTRAINT base_locationlog_intern_id_fk_base_intern_id_flat
+        FOREIGN KEY (intern_id) REFERENCES base_intern (id) DEFERRABLE INITIALLY DEFERRED
+);
+
+INSERT INTO base_locationlog (id, point, "timestamp", accuracy, address, is_inside_geofence, intern_id)
+SELECT id, point, "timestamp", accuracy, address, is_inside_geofence, intern_id
+FROM base_locationlog_partitioned;
+
+SELECT setval(
+    pg_get_serial_sequence('base_locationlog', 'id'),
+    COALESCE((SELECT max(id) FROM base_locationlog), 0) + 1,
+    false
+);
+
+DROP TABLE base_locationlog_partitioned CASCADE;
+
+CREATE INDEX base_locationlog_intern_id_flat_idx ON base_locationlog (intern_id);
+CREATE INDEX base_locationlog_point_flat_idx ON base_locationlog USING GIST (point);
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0011_geofencezone'),
+    ]
+
+    operations = [
+        # A partitioned table cannot be the target of a foreign key on id alone
+        migrations.AlterField(
+            model_name='geocodejob',
+            name='location_log',
+            field=models.OneToOneField(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='geocode_job', to='base.locationlog'),
+        ),
+        migrations.RunSQL(PARTITION_SQL, UNPARTITION_SQL),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2 on 2026-10-17 12:58
+
+import django.contrib.postgres.indexes
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0012_partition_locationlog'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='locationlog',
+            index=models.Index(fields=['intern', '-timestamp'], name='locationlog_intern_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='locationlog',
+            index=models.Index(condition=models.Q(('is_inside_geofence', False)), fields=['intern', '-timestamp'], name='locationlog_violation_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='locationlog',
+            index=django.contrib.postgres.indexes.BrinIndex(fields=['timestamp'], name='locationlog_timestamp_brin'),
+        ),
+    ]
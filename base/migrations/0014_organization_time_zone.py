@@ -0,0 +1,19 @@
+# Generated by Django 5.2 on 2026-10-17 13:40
+
+import base.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0013_locationlog_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='organization',
+            name='time_zone',
+            field=models.CharField(default='UTC', help_text='IANA time zone used for daily reports (e.g. Africa/Nairobi)', max_length=63, validators=[base.models.validate_time_zone]),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2 on 2026-10-17 14:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0014_organization_time_zone'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='locationlog',
+            name='locationlog_intern_ts_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='locationlog',
+            name='locationlog_violation_idx',
+        ),
+        migrations.AddIndex(
+            model_name='locationlog',
+            index=models.Index(fields=['intern', '-timestamp', '-id'], name='locationlog_intern_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='locationlog',
+            index=models.Index(condition=models.Q(('is_inside_geofence', False)), fields=['intern', '-timestamp', '-id'], name='locationlog_violation_idx'),
+        ),
+    ]
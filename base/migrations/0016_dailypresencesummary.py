@@ -0,0 +1,35 @@
+# Generated by Django 5.2 on 2026-10-17 15:06
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0015_locationlog_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyPresenceSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('fixes', models.PositiveIntegerField(default=0)),
+                ('violations', models.PositiveIntegerField(default=0)),
+                ('first_seen', models.DateTimeField(blank=True, null=True)),
+                ('last_seen', models.DateTimeField(blank=True, null=True)),
+                ('seconds_inside', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('intern', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_summaries', to='base.intern')),
+                ('organization', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='daily_summaries', to='base.organization')),
+            ],
+            options={
+                'verbose_name_plural': 'Daily presence summaries',
+                'ordering': ['-date'],
+                'indexes': [models.Index(fields=['organization', 'date'], name='presence_org_date_idx')],
+                'constraints': [models.UniqueConstraint(fields=('intern', 'date'), name='unique_daily_presence')],
+            },
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 5.2 on 2026-10-17 15:53
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0016_dailypresencesummary'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PresenceSession',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('is_inside', models.BooleanField()),
+                ('started_at', models.DateTimeField()),
+                ('ended_at', models.DateTimeField()),
+                ('fix_count', models.PositiveIntegerField(default=0)),
+                ('intern', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='presence_sessions', to='base.intern')),
+                ('organization', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='presence_sessions', to='base.organization')),
+            ],
+            options={
+                'ordering': ['-started_at'],
+                'indexes': [
+                    models.Index(fields=['intern', '-started_at'], name='presence_session_intern_idx'),
+                    models.Index(fields=['organization', 'started_at'], name='presence_session_org_idx'),
+                ],
+            },
+        ),
+        migrations.CreateModel(
+            name='SessionizerCheckpoint',
+            fields=[
+                ('intern', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='sessionizer_checkpoint', serialize=False, to='base.intern')),
+                ('last_timestamp', models.DateTimeField(blank=True, null=True)),
+                ('last_log_id', models.BigIntegerField(blank=True, null=True)),
+                ('pending_count', models.PositiveSmallIntegerField(default=0)),
+                ('pending_since', models.DateTimeField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('open_session', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='base.presencesession')),
+            ],
+        ),
+    ]
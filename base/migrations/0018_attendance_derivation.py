@@ -0,0 +1,42 @@
+# Generated by Django 5.2 on 2026-10-17 16:38
+
+import datetime
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0017_presencesession_sessionizercheckpoint'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='organization',
+            name='work_start_time',
+            field=models.TimeField(default=datetime.time(9, 0), help_text='Local time after which a check-in counts as late'),
+        ),
+        migrations.AddField(
+            model_name='organization',
+            name='late_grace_minutes',
+            field=models.PositiveSmallIntegerField(default=15),
+        ),
+        migrations.AlterField(
+            model_name='attendance',
+            name='check_in',
+            field=models.TimeField(blank=True, null=True),
+        ),
+        # Keep the newest record per employee and day before enforcing uniqueness
+        migrations.RunSQL(
+            """
+            DELETE FROM base_attendance a
+            USING base_attendance b
+            WHERE a.employee_id = b.employee_id AND a.date = b.date AND a.id < b.id
+            """,
+            migrations.RunSQL.noop,
+        ),
+        migrations.AddConstraint(
+            model_name='attendance',
+            constraint=models.UniqueConstraint(fields=('employee', 'date'), name='unique_attendance_per_day'),
+        ),
+    ]
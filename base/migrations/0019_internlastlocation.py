@@ -0,0 +1,47 @@
+# Generated by Django 5.2 on 2026-10-18 09:12
+
+import django.contrib.gis.db.models.fields
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0018_attendance_derivation'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InternLastLocation',
+            fields=[
+                ('intern', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='last_location', serialize=False, to='base.intern')),
+                ('point', django.contrib.gis.db.models.fields.PointField(srid=4326)),
+                ('timestamp', models.DateTimeField()),
+                ('accuracy', models.FloatField(blank=True, null=True)),
+                ('address', models.TextField(blank=True, null=True)),
+                ('is_inside_geofence', models.BooleanField(default=False)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('location_log', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='base.locationlog')),
+                ('organization', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='intern_positions', to='base.organization')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['organization', '-timestamp'], name='last_location_org_idx')],
+            },
+        ),
+        # Seed one row per intern from the existing history
+        migrations.RunSQL(
+            sql="""
+                INSERT INTO base_internlastlocation
+                    (intern_id, organization_id, location_log_id, point, "timestamp", accuracy, address,
+                     is_inside_geofence, updated_at)
+                SELECT DISTINCT ON (l.intern_id)
+                    l.intern_id, i.organization_id, l.id, l.point, l."timestamp", l.accuracy, l.address,
+                    l.is_inside_geofence, now()
+                FROM base_locationlog l
+                JOIN base_intern i ON i.id = l.intern_id
+                ORDER BY l.intern_id, l."timestamp" DESC, l.id DESC
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2 on 2026-10-18 11:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0019_internlastlocation'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LocationBufferSegment',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True)),
+                ('rows', models.PositiveIntegerField(default=0)),
+                ('flushed_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['-flushed_at'],
+            },
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2 on 2026-10-18 14:05
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0020_locationbuffersegment'),
+    ]
+
+    operations = [
+        # headcount was never maintained before; Employee.save keeps it current from here on
+        migrations.RunSQL(
+            sql="""
+                UPDATE base_department d
+                SET headcount = (
+                    SELECT count(*) FROM base_employee e
+                    WHERE e.department_id = d.id AND e.is_active
+                )
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
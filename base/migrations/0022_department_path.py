@@ -0,0 +1,62 @@
+# Generated by Django 5.2 on 2026-10-18 15:20
+
+from django.db import migrations, models
+
+
+def build_paths(apps, schema_editor):
+    """Fill path and depth for existing departments.
+
+    A department caught in a parent cycle has its parent cleared, making it a
+    root; the rest of the cycle then hangs below it.
+    """
+    Department = apps.get_model('base', 'Department')
+    parents = dict(Department.objects.values_list('id', 'parent_department_id'))
+    paths = {}
+    detached = []
+    for pk in parents:
+        while pk not in paths:
+            chain = []
+            node = pk
+            while node is not None and node not in paths and node not in chain:
+                chain.append(node)
+                node = parents.get(node)
+            if node in chain:
+                parents[node] = None
+                detached.append(node)
+                continue
+            path, depth = paths[node] if node is not None else ('/', -1)
+            for member in reversed(chain):
+                path, depth = f'{path}{member}/', depth + 1
+                paths[member] = (path, depth)
+
+    departments = list(Department.objects.only('id'))
+    for department in departments:
+        department.path, department.depth = paths[department.pk]
+        if department.pk in detached:
+            department.parent_department_id = None
+    Department.objects.bulk_update(departments, ['path', 'depth', 'parent_department'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0021_refresh_department_headcount'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='department',
+            name='path',
+            field=models.CharField(blank=True, default='', editable=False, max_length=512),
+        ),
+        migrations.AddField(
+            model_name='department',
+            name='depth',
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(build_paths, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='department',
+            index=models.Index(fields=['path'], name='department_path_idx', opclasses=['varchar_pattern_ops']),
+        ),
+    ]
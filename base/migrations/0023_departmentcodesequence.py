@@ -0,0 +1,32 @@
+# Generated by Django 5.2 on 2026-10-18 16:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0022_department_path'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DepartmentCodeSequence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('prefix', models.CharField(max_length=10, unique=True)),
+                ('last_value', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        # Start each prefix after the highest number already used by PREFIX-NNN codes
+        migrations.RunSQL(
+            sql="""
+                INSERT INTO base_departmentcodesequence (prefix, last_value)
+                SELECT substring(code FROM '^(.+)-[0-9]+$'), max(substring(code FROM '-([0-9]+)$')::integer)
+                FROM base_department
+                WHERE code ~ '^.+-[0-9]{1,9}$'
+                GROUP BY 1
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2 on 2026-10-18 17:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0023_departmentcodesequence'),
+    ]
+
+    operations = [
+        # Keep the newest payroll row per employee and month before enforcing uniqueness
+        migrations.RunSQL(
+            """
+            DELETE FROM base_payroll a
+            USING base_payroll b
+            WHERE a.employee_id = b.employee_id AND a.month = b.month AND a.id < b.id
+            """,
+            migrations.RunSQL.noop,
+        ),
+        migrations.AddConstraint(
+            model_name='payroll',
+            constraint=models.UniqueConstraint(fields=('employee', 'month'), name='unique_payroll_per_month'),
+        ),
+    ]
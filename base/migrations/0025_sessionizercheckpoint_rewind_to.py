@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-18 19:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0024_payroll_unique_month'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sessionizercheckpoint',
+            name='rewind_to',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2 on 2026-10-18 19:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0025_sessionizercheckpoint_rewind_to'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='locationlog',
+            index=models.Index(condition=models.Q(('is_inside_geofence', False)), fields=['-timestamp', '-id'], name='locationlog_violation_ts_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-18 20:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0026_locationlog_violation_ts_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='geocodecacheentry',
+            name='expires_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
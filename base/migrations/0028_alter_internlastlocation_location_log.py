@@ -0,0 +1,19 @@
+# Generated by Django 5.2 on 2026-10-19 09:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0027_geocodecacheentry_expires_at'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='internlastlocation',
+            name='location_log',
+            field=models.ForeignKey(db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='base.locationlog'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2 on 2026-10-19 10:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0028_alter_internlastlocation_location_log'),
+    ]
+
+    operations = [
+        # Existing rows cannot be told apart, so they are kept as manual and never rewritten
+        migrations.AddField(
+            model_name='attendance',
+            name='source',
+            field=models.CharField(choices=[('manual', 'Manual'), ('derived', 'Derived')], db_default='manual', default='manual', max_length=10),
+        ),
+    ]
@@ -1,20 +1,33 @@
-from django.db import models
+from django.db import models, transaction
 from django.conf import settings
 from django.utils import timezone
 from django.contrib.auth.hashers import make_password
 from django.contrib.auth.models import UserManager
 from django.dispatch import receiver
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, pre_delete
 from django.contrib.auth.models import User
+import datetime
 import random
 import uuid
+import zoneinfo
 from django.contrib.gis.db import models as gis_models
+from django.contrib.postgres.indexes import BrinIndex
+from django.db.models import F, Value
+from django.db.models.functions import Concat, Substr
 from django.contrib.gis.geos import Point
-from geopy.geocoders import Nominatim
 from geopy.exc import GeocoderTimedOut, GeocoderServiceError
 import logging
 from django.core.validators import MinLengthValidator
+from django.core.exceptions import ValidationError
+
+logger = logging.getLogger(__name__)
+
 
+def validate_time_zone(value):
+    try:
+        zoneinfo.ZoneInfo(value)
+    except (zoneinfo.ZoneInfoNotFoundError, ValueError):
+        raise ValidationError(f"{value} is not a known IANA time zone")
 
 
 
@@ -65,6 +78,20 @@ class University(models.Model):
 
 
 
+class DepartmentQuerySet(models.QuerySet):
+    def descendants_of(self, department, include_self=False):
+        """Every department below ``department`` at any depth, with one indexed prefix match"""
+        if not department.path:
+            return self.none()
+        descendants = self.filter(path__startswith=department.path)
+        return descendants if include_self else descendants.exclude(pk=department.pk)
+
+    def ancestors_of(self, department):
+        """Every department above ``department``, read from its path"""
+        ancestor_ids = [int(pk) for pk in department.path.strip('/').split('/')[:-1] if pk]
+        return self.filter(pk__in=ancestor_ids)
+
+
 class Department(models.Model):
     # Basic Information
     name = models.CharField(max_length=100, unique=True, null=True)
@@ -76,6 +103,9 @@ class Department(models.Model):
         blank=True,
         related_name='sub_departments'
     )
+    # Materialized path of ancestor ids ending with this department's, e.g. "/1/4/9/"
+    path = models.CharField(max_length=512, blank=True, default='', editable=False)
+    depth = models.PositiveSmallIntegerField(default=0, editable=False)
     
     # Operational Details
     location = models.CharField(max_length=100, blank=True)
@@ -105,6 +135,8 @@ class Department(models.Model):
     created_at = models.DateTimeField(auto_now_add=True, null=True)
     updated_at = models.DateTimeField(auto_now=True, null=True)
 
+    objects = DepartmentQuerySet.as_manager()
+
     class Meta:
         ordering = ['name']
         verbose_name = 'Department'
@@ -112,44 +144,120 @@ class Department(models.Model):
         permissions = [
             ('can_manage_department', 'Can manage department settings'),
         ]
+        indexes = [
+            # varchar_pattern_ops lets path__startswith use the index under any collation
+            models.Index(fields=['path'], name='department_path_idx', opclasses=['varchar_pattern_ops']),
+        ]
 
     def __str__(self):
         return f"{self.name} ({self.code})"
     
     def save(self, *args, **kwargs):
+        from .analytics import invalidate_department_stats
+        from .codes import allocate_code, department_prefix, reserve_code
+
         if not self.code:
-            # Auto-generate department code if not provided
-            prefix = self.department_type.upper()
-            last_dept = Department.objects.filter(
-                department_type=self.department_type
-            ).order_by('-code').first()
-            if last_dept:
-                last_num = int(last_dept.code.split('-')[-1])
-                self.code = f"{prefix}-{last_num + 1:03d}"
-            else:
-                self.code = f"{prefix}-001"
-        super().save(*args, **kwargs)
+            # Auto-generate department code if not provided, e.g. "HR-001" for "Human Resources"
+            self.code = allocate_code(department_prefix(self.name))
+        with transaction.atomic():
+            # A code typed in by hand (or an allocated one, harmlessly) moves the counter past itself
+            reserve_code(self.code)
+            # Hold this department and its parent (in id order, so concurrent moves queue rather
+            # than deadlock) until the subtree has been rewritten
+            list(
+                Department.objects.select_for_update()
+                .filter(pk__in=[self.pk, self.parent_department_id]).order_by('pk').values_list('pk', flat=True)
+            )
+            parent_path, parent_depth = self._parent_path()
+            if self.pk:
+                # The stored path is authoritative; an ancestor may have moved since this instance was loaded
+                self.path, self.depth = Department.objects.filter(pk=self.pk).values_list('path', 'depth').first() or ('', 0)
+            super().save(*args, **kwargs)
+            self._move_subtree(f"{parent_path}{self.pk}/", parent_depth + 1)
+        invalidate_department_stats()
+
+    def clean(self):
+        super().clean()
+        self._parent_path()
+
+    def _parent_path(self):
+        """Return the parent's (path, depth), or ("/", -1) for a root; rejects parent cycles"""
+        if self.parent_department_id is None:
+            return '/', -1
+        if self.parent_department_id == self.pk:
+            raise ValidationError({'parent_department': "A department cannot be its own parent"})
+        parent = Department.objects.filter(pk=self.parent_department_id).values_list('path', 'depth').first()
+        if parent is None:
+            return '/', -1
+        if self.pk and f"/{self.pk}/" in parent[0]:
+            raise ValidationError({'parent_department': "A department cannot be moved under its own sub-department"})
+        return parent
+
+    def _move_subtree(self, new_path, new_depth):
+        """Rewrite this department's path and, in one UPDATE, the paths of everything under it"""
+        old_path, old_depth = self.path, self.depth
+        if new_path == old_path and new_depth == old_depth:
+            return
+        Department.objects.filter(pk=self.pk).update(path=new_path, depth=new_depth)
+        if old_path:
+            Department.objects.filter(path__startswith=old_path).exclude(pk=self.pk).update(
+                path=Concat(Value(new_path), Substr('path', len(old_path) + 1)),
+                depth=F('depth') + (new_depth - old_depth),
+            )
+        self.path, self.depth = new_path, new_depth
+
+    def delete(self, *args, **kwargs):
+        from .analytics import invalidate_department_stats
+
+        # Sub-departments are re-rooted by reroot_sub_departments before SET_NULL detaches them
+        result = super().delete(*args, **kwargs)
+        invalidate_department_stats()
+        return result
+
+    @property
+    def stats(self):
+        """Cached figures from base.analytics; empty for an unsaved department"""
+        from .analytics import department_stats
+
+        return department_stats().get(self.pk, {})
     
     @property
     def current_headcount(self):
         """Returns actual count of active employees in department"""
-        return self.employee_set.filter(is_active=True).count()
+        return self.stats.get('headcount', 0)
     
     @property
     def budget_utilization(self):
         """Calculates percentage of budget used"""
-        if self.budget and self.budget > 0:
-            total_salaries = sum(
-                emp.salary for emp in self.employees.filter(is_active=True)
-            )
-            return (total_salaries / self.budget) * 100
-        return 0
+        return self.stats.get('utilization', 0)
 
 
 
 
 
 
+@receiver(pre_delete, sender=Department)
+def reroot_sub_departments(sender, instance, **kwargs):
+    """Make each child of a deleted department a root, paths included.
+
+    SET_NULL clears parent_department with a bare UPDATE that never calls save(),
+    so the subtrees are rewritten here. A signal rather than delete() also covers
+    queryset deletes such as the admin's bulk action; it runs inside the
+    deletion's transaction.
+    """
+    for child in Department.objects.select_for_update().filter(parent_department=instance).order_by('pk'):
+        child._move_subtree(f"/{child.pk}/", 0)
+
+
+class DepartmentCodeSequence(models.Model):
+    """Last number handed out per department code prefix (see base.codes)"""
+    prefix = models.CharField(max_length=10, unique=True)
+    last_value = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.prefix}: {self.last_value}"
+
+
 class Employee(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, null=True)
     name = models.CharField(max_length=20, null=True)
@@ -165,6 +273,33 @@ class Employee(models.Model):
     def __str__(self):
         return self.employee_id
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember what headcounts were last computed from, so save() can skip the refresh
+        instance._saved_placement = (instance.__dict__.get('department_id'), instance.__dict__.get('is_active'))
+        return instance
+
+    def save(self, *args, **kwargs):
+        from .analytics import invalidate_department_stats, refresh_headcounts
+
+        saved = getattr(self, '_saved_placement', None)
+        super().save(*args, **kwargs)
+        placement = (self.department_id, self.is_active)
+        if saved != placement:
+            refresh_headcounts({self.department_id, saved[0] if saved else None})
+            self._saved_placement = placement
+        invalidate_department_stats()
+
+    def delete(self, *args, **kwargs):
+        from .analytics import invalidate_department_stats, refresh_headcounts
+
+        department_id = self.department_id
+        result = super().delete(*args, **kwargs)
+        refresh_headcounts({department_id})
+        invalidate_department_stats()
+        return result
+
 
 
 
@@ -300,13 +435,24 @@ class Intern(models.Model):
 class Attendance(models.Model):
     employee = models.ForeignKey(Employee, on_delete=models.CASCADE, null=True)
     date = models.DateField()
-    check_in = models.TimeField()
+    check_in = models.TimeField(null=True, blank=True)
     check_out = models.TimeField(null=True, blank=True)
     status = models.CharField(max_length=20, choices=[
         ('present', 'Present'),
         ('absent', 'Absent'),
         ('late', 'Late'),
     ])
+    # Derived rows are rewritten by base.attendance; manual ones are never touched by it.
+    # db_default covers rows inserted with raw SQL (imports)
+    source = models.CharField(max_length=10, choices=[
+        ('manual', 'Manual'),
+        ('derived', 'Derived'),
+    ], default='manual', db_default='manual')
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['employee', 'date'], name='unique_attendance_per_day'),
+        ]
 
     def __str__(self):
         return 'self.employee'
@@ -353,6 +499,11 @@ class Payroll(models.Model):
     tax = models.DecimalField(max_digits=10, decimal_places=2)
     net_salary = models.DecimalField(max_digits=10, decimal_places=2)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['employee', 'month'], name='unique_payroll_per_month'),
+        ]
+
 class Benefit(models.Model):
     name = models.CharField(max_length=100)  # e.g., "Health Insurance"
     description = models.TextField()
@@ -427,21 +578,40 @@ class Organization(models.Model):
         choices=LOCATION_SOURCE_CHOICES,
         default='pending'
     )
+    time_zone = models.CharField(
+        max_length=63,
+        default='UTC',
+        validators=[validate_time_zone],
+        help_text="IANA time zone used for daily reports (e.g. Africa/Nairobi)"
+    )
+    work_start_time = models.TimeField(
+        default=datetime.time(9, 0),
+        help_text="Local time after which a check-in counts as late"
+    )
+    late_grace_minutes = models.PositiveSmallIntegerField(default=15)
 
     def __str__(self):
         return self.name
 
+    @property
+    def tzinfo(self):
+        return zoneinfo.ZoneInfo(self.time_zone)
+
     def save(self, *args, **kwargs):
+        from .geofence import geofence_engine
+
         if self.location_source == 'geocode' and self.address and not self.location:
             self.geocode_from_address()
         super().save(*args, **kwargs)
+        geofence_engine.invalidate(self.pk)
     
     def geocode_from_address(self):
+        from .geocoding import forward_geocode
+
         try:
-            geolocator = Nominatim(user_agent="base")
-            location = geolocator.geocode(self.address)
+            location = forward_geocode(self.address)
             if location:
-                self.location = Point(location.longitude, location.latitude)
+                self.location = location
                 self.location_source = 'geocode'
                 return True
         except (GeocoderTimedOut, GeocoderServiceError) as e:
@@ -457,26 +627,291 @@ class Organization(models.Model):
         verbose_name_plural = "Organizations"
 
 
+class GeofenceZone(models.Model):
+    """Polygon geofence zone; an organization can have several (buildings, grounds)"""
+    organization = models.ForeignKey(Organization, on_delete=models.CASCADE, related_name='geofence_zones')
+    name = models.CharField(max_length=100)
+    boundary = gis_models.MultiPolygonField()
+    is_active = models.BooleanField(default=True)
+
+    class Meta:
+        ordering = ['name']
+
+    def __str__(self):
+        return f"{self.name} ({self.organization})"
+
+    def save(self, *args, **kwargs):
+        from .geofence import geofence_engine
+
+        super().save(*args, **kwargs)
+        geofence_engine.invalidate(self.organization_id)
+
+    def delete(self, *args, **kwargs):
+        from .geofence import geofence_engine
+
+        organization_id = self.organization_id
+        result = super().delete(*args, **kwargs)
+        geofence_engine.invalidate(organization_id)
+        return result
+
+
 
 
     
 
+class LocationLogQuerySet(models.QuerySet):
+    def for_intern(self, intern):
+        return self.filter(intern=intern)
+
+    def for_organization(self, organization):
+        return self.filter(intern__organization=organization)
+
+    def violations(self):
+        return self.filter(is_inside_geofence=False)
+
+    def in_window(self, start, end):
+        """Half-open [start, end) range on the raw column, so timestamp indexes stay usable"""
+        return self.filter(timestamp__gte=start, timestamp__lt=end)
+
+
 class LocationLog(models.Model):
+    """A single position fix.
+
+    The table is range-partitioned by month on ``timestamp`` (migration 0012) and
+    its partitions are maintained by the manage_location_partitions command.
+    """
     intern = models.ForeignKey(Intern, on_delete=models.CASCADE)
     point = gis_models.PointField()
-    timestamp = models.DateTimeField(auto_now_add=True)
+    timestamp = models.DateTimeField(default=timezone.now)
     accuracy = models.FloatField(null=True, blank=True)
     address = models.TextField(null=True, blank=True)
     is_inside_geofence = models.BooleanField(default=False)
 
+    objects = LocationLogQuerySet.as_manager()
+
     class Meta:
         ordering = ['-timestamp']
+        indexes = [
+            # Per-intern timelines (dashboard, intern_detail, location_history)
+            # id breaks timestamp ties for keyset pagination (utils.keyset_page)
+            models.Index(fields=['intern', '-timestamp', '-id'], name='locationlog_intern_ts_idx'),
+            # Violations are a small fraction of rows; keep them in their own index
+            models.Index(
+                fields=['intern', '-timestamp', '-id'],
+                condition=models.Q(is_inside_geofence=False),
+                name='locationlog_violation_idx',
+            ),
+            # Organization-wide violation pages walk this newest-first, filtering by intern
+            models.Index(
+                fields=['-timestamp', '-id'],
+                condition=models.Q(is_inside_geofence=False),
+                name='locationlog_violation_ts_idx',
+            ),
+            # Cheap range index for organization-wide time scans
+            BrinIndex(fields=['timestamp'], name='locationlog_timestamp_brin'),
+        ]
 
     def __str__(self):
         status = "Inside" if self.is_inside_geofence else "Outside"
         return f"{self.intern} at {self.point} ({status})"
 
 
+class DailyPresenceSummary(models.Model):
+    """Per-intern daily rollup of LocationLog, with dates in the organization's time zone.
+
+    Fix counts are incremented on ingest; seconds_inside is filled in by the
+    backfill_presence_summaries command, which recomputes whole days. Imports
+    and admin edits rebuild the days they touch; any other change to LocationLog
+    (raw SQL, shell scripts) needs a backfill for its dates.
+    """
+    intern = models.ForeignKey(Intern, on_delete=models.CASCADE, related_name='daily_summaries')
+    organization = models.ForeignKey(
+        Organization,
+        on_delete=models.CASCADE,
+        null=True,
+        related_name='daily_summaries'
+    )
+    date = models.DateField()
+    fixes = models.PositiveIntegerField(default=0)
+    violations = models.PositiveIntegerField(default=0)
+    first_seen = models.DateTimeField(null=True, blank=True)
+    last_seen = models.DateTimeField(null=True, blank=True)
+    seconds_inside = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['-date']
+        verbose_name_plural = 'Daily presence summaries'
+        constraints = [
+            models.UniqueConstraint(fields=['intern', 'date'], name='unique_daily_presence'),
+        ]
+        indexes = [
+            models.Index(fields=['organization', 'date'], name='presence_org_date_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.intern} on {self.date}"
+
+
+class PresenceSession(models.Model):
+    """A continuous stretch of an intern being inside or outside the geofence (see base.presence)"""
+    intern = models.ForeignKey(Intern, on_delete=models.CASCADE, related_name='presence_sessions')
+    organization = models.ForeignKey(
+        Organization,
+        on_delete=models.CASCADE,
+        null=True,
+        related_name='presence_sessions'
+    )
+    is_inside = models.BooleanField()
+    started_at = models.DateTimeField()
+    ended_at = models.DateTimeField()
+    fix_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ['-started_at']
+        indexes = [
+            models.Index(fields=['intern', '-started_at'], name='presence_session_intern_idx'),
+            models.Index(fields=['organization', 'started_at'], name='presence_session_org_idx'),
+        ]
+
+    def __str__(self):
+        status = "Inside" if self.is_inside else "Outside"
+        return f"{self.intern} {status} {self.started_at} - {self.ended_at}"
+
+    @property
+    def duration(self):
+        return self.ended_at - self.started_at
+
+
+class SessionizerCheckpoint(models.Model):
+    """Per-intern high-water mark and in-flight state of the presence sessionizer"""
+    intern = models.OneToOneField(
+        Intern,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='sessionizer_checkpoint'
+    )
+    last_timestamp = models.DateTimeField(null=True, blank=True)
+    last_log_id = models.BigIntegerField(null=True, blank=True)
+    open_session = models.ForeignKey(PresenceSession, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    # Fixes seen against the open session's state that are not yet confirmed as a transition
+    pending_count = models.PositiveSmallIntegerField(default=0)
+    pending_since = models.DateTimeField(null=True, blank=True)
+    # Oldest fix stored behind last_timestamp since the last run; sessions from there are rebuilt
+    rewind_to = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Sessionizer checkpoint for {self.intern}"
+
+
+class InternLastLocation(models.Model):
+    """Each intern's most recent fix, upserted on ingest (see base.positions)"""
+    intern = models.OneToOneField(
+        Intern,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='last_location'
+    )
+    organization = models.ForeignKey(
+        Organization,
+        on_delete=models.CASCADE,
+        null=True,
+        related_name='intern_positions'
+    )
+    # No database constraint: LocationLog is partitioned and its primary key includes timestamp
+    # NULL while the fix is still in the write-behind buffer
+    location_log = models.ForeignKey(
+        LocationLog,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        null=True,
+        related_name='+'
+    )
+    point = gis_models.PointField()
+    timestamp = models.DateTimeField()
+    accuracy = models.FloatField(null=True, blank=True)
+    address = models.TextField(null=True, blank=True)
+    is_inside_geofence = models.BooleanField(default=False)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['organization', '-timestamp'], name='last_location_org_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.intern} last seen {self.timestamp}"
+
+
+class LocationBufferSegment(models.Model):
+    """Marker for a write-behind segment already stored in LocationLog (see base.writebehind)"""
+    name = models.CharField(max_length=255, unique=True)
+    rows = models.PositiveIntegerField(default=0)
+    flushed_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-flushed_at']
+
+    def __str__(self):
+        return self.name
+
+
+class GeocodeJob(models.Model):
+    """Pending reverse-geocode lookup for a LocationLog, drained by the geocode_worker command"""
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('failed', 'Failed'),
+    ]
+    # No database constraint: base_locationlog is partitioned, so id alone is not a unique key there
+    location_log = models.OneToOneField(
+        LocationLog,
+        on_delete=models.CASCADE,
+        related_name='geocode_job',
+        db_constraint=False
+    )
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveSmallIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['status', 'created_at'], name='geocodejob_status_idx'),
+        ]
+
+    def __str__(self):
+        return f"Geocode {self.location_log_id} ({self.status})"
+
+
+class GeocodeCacheEntry(models.Model):
+    """Persistent tier of the geocode cache, keyed by geohash cell or normalized address"""
+    KIND_CHOICES = [
+        ('reverse', 'Reverse'),
+        ('forward', 'Forward'),
+    ]
+    kind = models.CharField(max_length=7, choices=KIND_CHOICES)
+    key = models.CharField(max_length=255)
+    address = models.TextField(blank=True)
+    location = gis_models.PointField(null=True, blank=True)
+    hits = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    # Set for negative results, so a place the geocoder did not know yet is retried later
+    expires_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name_plural = 'Geocode cache entries'
+        constraints = [
+            models.UniqueConstraint(fields=['kind', 'key'], name='unique_geocode_cache_key'),
+        ]
+
+    def __str__(self):
+        return f"{self.kind}:{self.key}"
+
+
 
 
 
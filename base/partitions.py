@@ -0,0 +1,121 @@
+import logging
+import re
+from datetime import date, datetime, timezone as dt_timezone
+
+from django.db import connection, transaction
+
+from .models import GeocodeJob, LocationLog
+
+logger = logging.getLogger(__name__)
+
+PARENT_TABLE = LocationLog._meta.db_table
+DEFAULT_PARTITION = f'{PARENT_TABLE}_default'
+PARTITION_NAME_RE = re.compile(rf'^{PARENT_TABLE}_p(\d{{4}})(\d{{2}})$')
+
+
+def add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def month_bounds(month):
+    """Return the UTC [start, end) datetimes of a monthly partition"""
+    start = datetime(month.year, month.month, 1, tzinfo=dt_timezone.utc)
+    end = add_months(month, 1)
+    return start, datetime(end.year, end.month, 1, tzinfo=dt_timezone.utc)
+
+
+def partition_name(month):
+    return f'{PARENT_TABLE}_p{month:%Y%m}'
+
+
+def list_partitions():
+    """Return {month: table name} for the monthly partitions attached to LocationLog"""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT child.relname
+            FROM pg_inherits
+            JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+            JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+            WHERE parent.relname = %s
+            """,
+            [PARENT_TABLE],
+        )
+        names = [row[0] for row in cursor.fetchall()]
+
+    partitions = {}
+    for name in names:
+        match = PARTITION_NAME_RE.match(name)
+        if match:
+            partitions[date(int(match.group(1)), int(match.group(2)), 1)] = name
+    return partitions
+
+
+def ensure_partition(month):
+    """Create the partition for ``month`` if missing; returns True when one was created.
+
+    Rows for that month that already landed in the default partition are moved
+    into the new partition, since PostgreSQL refuses to attach over them.
+    """
+    month = date(month.year, month.month, 1)
+    if month in list_partitions():
+        return False
+
+    name = partition_name(month)
+    start, end = month_bounds(month)
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(
+            f'SELECT EXISTS (SELECT 1 FROM {DEFAULT_PARTITION} WHERE "timestamp" >= %s AND "timestamp" < %s)',
+            [start, end],
+        )
+        if cursor.fetchone()[0]:
+            cursor.execute(f'CREATE TABLE {name} (LIKE {PARENT_TABLE} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)')
+            cursor.execute(
+                f"""
+                WITH moved AS (
+                    DELETE FROM {DEFAULT_PARTITION}
+                    WHERE "timestamp" >= %s AND "timestamp" < %s
+                    RETURNING *
+                )
+                INSERT INTO {name} SELECT * FROM moved
+                """,
+                [start, end],
+            )
+            cursor.execute(
+                f'ALTER TABLE {PARENT_TABLE} ATTACH PARTITION {name} FOR VALUES FROM (%s) TO (%s)',
+                [start, end],
+            )
+        else:
+            cursor.execute(
+                f'CREATE TABLE {name} PARTITION OF {PARENT_TABLE} FOR VALUES FROM (%s) TO (%s)',
+                [start, end],
+            )
+    logger.info(f"Created LocationLog partition {name}")
+    return True
+
+
+def detach_partition(month, archive_schema=None, drop=False):
+    """Detach a monthly partition, then move it to ``archive_schema`` or drop it.
+
+    Without either option the detached table stays in place as a plain table.
+    """
+    name = list_partitions().get(month)
+    if name is None:
+        return False
+
+    start, end = month_bounds(month)
+    with transaction.atomic(), connection.cursor() as cursor:
+        # Jobs for rows leaving LocationLog could never be completed
+        GeocodeJob.objects.filter(
+            location_log__timestamp__gte=start,
+            location_log__timestamp__lt=end,
+        ).delete()
+        cursor.execute(f'ALTER TABLE {PARENT_TABLE} DETACH PARTITION {name}')
+        if drop:
+            cursor.execute(f'DROP TABLE {name}')
+        elif archive_schema:
+            cursor.execute(f'CREATE SCHEMA IF NOT EXISTS {connection.ops.quote_name(archive_schema)}')
+            cursor.execute(f'ALTER TABLE {name} SET SCHEMA {connection.ops.quote_name(archive_schema)}')
+    logger.info(f"Detached LocationLog partition {name}")
+    return True
@@ -0,0 +1,128 @@
+from datetime import date
+from decimal import Decimal
+
+import numpy as np
+from django.conf import settings
+from django.db.models import Count, Exists, F, OuterRef
+
+from .models import Attendance, Employee, LeaveRequest, Payroll
+
+
+def month_start(value):
+    return date(value.year, value.month, 1)
+
+
+def next_month(value):
+    return date(value.year + value.month // 12, value.month % 12 + 1, 1)
+
+
+def tax_brackets():
+    """PAYROLL_TAX_BRACKETS as (lower bounds, rates) arrays sorted by lower bound"""
+    brackets = sorted(getattr(settings, 'PAYROLL_TAX_BRACKETS', [(0, 0.0)]))
+    return (
+        np.array([float(lower) for lower, _ in brackets]),
+        np.array([float(rate) for _, rate in brackets]),
+    )
+
+
+def progressive_tax(taxable, lower_bounds, rates):
+    """Tax for an array of monthly taxable incomes under marginal brackets"""
+    taxable = np.asarray(taxable, dtype=np.float64)
+    widths = np.diff(np.append(lower_bounds, np.inf))
+    in_bracket = np.clip(taxable[:, None] - lower_bounds[None, :], 0, widths[None, :])
+    return in_bracket @ rates
+
+
+def absent_days(employee_ids, start, end):
+    """Weekdays marked absent per employee in [start, end), leaving out days on approved leave.
+
+    Weekends are not working days (see np.busday_count in run_payroll), so an
+    absence recorded on one costs nothing. Nor do absences before the hire date:
+    run_payroll already prorates basic salary from it.
+    """
+    on_leave = LeaveRequest.objects.filter(
+        employee=OuterRef('employee'),
+        status='approved',
+        start_date__lte=OuterRef('date'),
+        end_date__gte=OuterRef('date'),
+    )
+    return dict(
+        Attendance.objects.filter(employee_id__in=employee_ids, status='absent', date__gte=start, date__lt=end)
+        .filter(date__gte=F('employee__hire_date'))
+        .exclude(Exists(on_leave))
+        .exclude(date__week_day__in=(1, 7))  # Sunday, Saturday
+        .order_by()
+        .values('employee_id')
+        .annotate(days=Count('id'))
+        .values_list('employee_id', 'days')
+    )
+
+
+def _money(values):
+    return [Decimal(f'{value:.2f}') for value in values]
+
+
+def run_payroll(month, batch_size=2000, progress=None):
+    """Compute and upsert the month's Payroll row for every active employee; returns the row count.
+
+    Basic salary is prorated by working days for employees hired during the
+    month. Each day absent without approved leave deducts one working day's
+    pay, and tax is applied to basic plus bonuses less those deductions.
+    Bonuses entered on existing rows are kept. ``progress`` is called with
+    (written, total) after each batch.
+    """
+    start = month_start(month)
+    end = next_month(start)
+    employees = list(
+        Employee.objects.filter(is_active=True, hire_date__lt=end)
+        .order_by('id')
+        .values_list('id', 'salary', 'hire_date')
+    )
+    if not employees:
+        return 0
+
+    ids = [employee_id for employee_id, _, _ in employees]
+    salaries = np.array([float(salary) for _, salary, _ in employees])
+    hired = np.array([max(hire_date, start) for _, _, hire_date in employees], dtype='datetime64[D]')
+
+    working_days = np.busday_count(np.datetime64(start), np.datetime64(end))
+    daily_rate = salaries / working_days
+    basic = np.where(
+        hired > np.datetime64(start),
+        daily_rate * np.busday_count(hired, np.datetime64(end)),
+        salaries,
+    )
+
+    absences = absent_days(ids, start, end)
+    existing_bonuses = dict(
+        Payroll.objects.filter(month=start, employee_id__in=ids).values_list('employee_id', 'bonuses')
+    )
+    bonuses = np.array([float(existing_bonuses.get(employee_id, 0)) for employee_id in ids])
+    deductions = np.minimum(daily_rate * np.array([absences.get(employee_id, 0) for employee_id in ids]), basic)
+
+    taxable = np.maximum(basic + bonuses - deductions, 0)
+    tax = progressive_tax(taxable, *tax_brackets())
+
+    rows = []
+    for employee_id, basic_salary, deduction, employee_tax in zip(ids, _money(basic), _money(deductions), _money(tax)):
+        bonus = Decimal(existing_bonuses.get(employee_id, 0))
+        rows.append(Payroll(
+            employee_id=employee_id,
+            month=start,
+            basic_salary=basic_salary,
+            bonuses=bonus,
+            deductions=deduction,
+            tax=employee_tax,
+            # From the rounded components, so the stored figures always add up
+            net_salary=basic_salary + bonus - deduction - employee_tax,
+        ))
+    for offset in range(0, len(rows), batch_size):
+        Payroll.objects.bulk_create(
+            rows[offset:offset + batch_size],
+            update_conflicts=True,
+            unique_fields=['employee', 'month'],
+            update_fields=['basic_salary', 'deductions', 'tax', 'net_salary'],
+        )
+        if progress:
+            progress(min(offset + batch_size, len(rows)), len(rows))
+    return len(rows)
@@ -0,0 +1,80 @@
+from django.db import connection
+from django.utils import timezone
+
+from .models import InternLastLocation
+
+POSITION_TABLE = InternLastLocation._meta.db_table
+
+
+def record_last_location(intern, logs):
+    """Upsert the intern's newest stored fix; rows with an older timestamp are left alone.
+
+    The WHERE clause makes late-arriving buffered fixes harmless. Logs from the
+    write-behind buffer have no primary key yet and are recorded with a NULL
+    location_log; storing the same fix later fills it in. Returns the
+    row's previous ``(is_inside_geofence, timestamp)``, or None if there was none;
+    the row stays locked until the caller's transaction ends, so concurrent
+    ingests for the same intern see each other's positions in order.
+    """
+    if not logs:
+        return None
+    latest = max(logs, key=lambda log: (log.timestamp, log.pk))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'SELECT is_inside_geofence, "timestamp" FROM {POSITION_TABLE} WHERE intern_id = %s FOR UPDATE',
+            [intern.pk],
+        )
+        previous = cursor.fetchone()
+        cursor.execute(
+            f"""
+            INSERT INTO {POSITION_TABLE}
+                (intern_id, organization_id, location_log_id, point, "timestamp", accuracy, address,
+                 is_inside_geofence, updated_at)
+            VALUES (%s, %s, %s, ST_GeomFromEWKB(%s), %s, %s, %s, %s, %s)
+            ON CONFLICT (intern_id) DO UPDATE SET
+                organization_id = EXCLUDED.organization_id,
+                location_log_id = EXCLUDED.location_log_id,
+                point = EXCLUDED.point,
+                "timestamp" = EXCLUDED."timestamp",
+                accuracy = EXCLUDED.accuracy,
+                address = EXCLUDED.address,
+                is_inside_geofence = EXCLUDED.is_inside_geofence,
+                updated_at = EXCLUDED.updated_at
+            WHERE EXCLUDED."timestamp" > {POSITION_TABLE}."timestamp"
+                OR (EXCLUDED."timestamp" = {POSITION_TABLE}."timestamp" AND {POSITION_TABLE}.location_log_id IS NULL)
+            """,
+            [
+                intern.pk,
+                intern.organization_id,
+                latest.pk,
+                bytes(latest.point.ewkb),
+                latest.timestamp,
+                latest.accuracy,
+                latest.address,
+                latest.is_inside_geofence,
+                timezone.now(),
+            ],
+        )
+    return previous
+
+
+def organization_positions(organization):
+    """Current position of every active intern in the organization, newest first"""
+    return (
+        InternLastLocation.objects.filter(organization=organization, intern__is_active=True)
+        .select_related('intern__user')
+        .order_by('-timestamp')
+    )
+
+
+def serialize_position(position):
+    return {
+        'intern_id': position.intern_id,
+        'name': position.intern.user.get_full_name() if position.intern.user else str(position.intern),
+        'timestamp': position.timestamp.isoformat(),
+        'latitude': position.point.y,
+        'longitude': position.point.x,
+        'accuracy': position.accuracy,
+        'address': position.address,
+        'is_inside_geofence': position.is_inside_geofence,
+    }
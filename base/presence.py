@@ -0,0 +1,157 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Value
+from django.db.models.functions import Least
+from django.utils import timezone
+
+from .models import LocationLog, PresenceSession, SessionizerCheckpoint
+
+
+class Sessionizer:
+    """Merges each intern's fixes, in (timestamp, id) order, into PresenceSession rows.
+
+    A change of state only counts as an enter/exit once SESSION_CONFIRM_FIXES
+    consecutive fixes agree on it; shorter runs are treated as GPS jitter and folded
+    into the open session. Fixes with an accuracy worse than
+    SESSION_MAX_ACCURACY_METERS are skipped, and a silence longer than
+    SESSION_MAX_GAP_SECONDS ends the open session at its last fix.
+
+    Progress is kept in SessionizerCheckpoint, so each run only reads fixes newer than
+    the previous one. Fixes younger than SESSION_LAG_SECONDS are left for the next run
+    to give buffered uploads time to arrive. A fix stored behind the checkpoint later
+    still (see note_late_fixes) makes the next run rebuild sessions from the one it
+    falls into; ``rewound`` collects the earliest rebuilt time per organization.
+    """
+
+    def __init__(self):
+        self.confirm_fixes = getattr(settings, 'SESSION_CONFIRM_FIXES', 3)
+        self.max_accuracy = getattr(settings, 'SESSION_MAX_ACCURACY_METERS', 100)
+        self.max_gap = timedelta(seconds=getattr(settings, 'SESSION_MAX_GAP_SECONDS', 1800))
+        self.lag = timedelta(seconds=getattr(settings, 'SESSION_LAG_SECONDS', 300))
+        self.rewound = {}
+
+    def new_session(self, intern, is_inside, started_at, ended_at, fix_count):
+        return PresenceSession(
+            intern=intern,
+            organization_id=intern.organization_id,
+            is_inside=is_inside,
+            started_at=started_at,
+            ended_at=ended_at,
+            fix_count=fix_count,
+        )
+
+    def rewind(self, intern, checkpoint):
+        """Delete the sessions from the one containing checkpoint.rewind_to onwards and resume before them.
+
+        Sessions only ever end at their last fix or at the first fix of the next
+        session, so resuming at the start of the reopened session with the one
+        before it open replays exactly the state the fixes were first folded in.
+        """
+        sessions = PresenceSession.objects.filter(intern=intern)
+        reopened = sessions.filter(started_at__lt=checkpoint.rewind_to).order_by('-started_at').first()
+        if reopened is None:
+            sessions.delete()
+            checkpoint.open_session = None
+            checkpoint.last_timestamp = None
+            restart = checkpoint.rewind_to
+        else:
+            sessions.filter(started_at__gte=reopened.started_at).delete()
+            checkpoint.open_session = sessions.order_by('-started_at').first()
+            checkpoint.last_timestamp = restart = reopened.started_at
+        # No fix has id 0, so every fix at the restart time is read again
+        checkpoint.last_log_id = 0
+        checkpoint.pending_count = 0
+        checkpoint.pending_since = None
+        checkpoint.rewind_to = None
+        earliest = self.rewound.get(intern.organization_id)
+        self.rewound[intern.organization_id] = restart if earliest is None else min(earliest, restart)
+
+    def process_intern(self, intern, max_fixes=50000):
+        """Fold up to ``max_fixes`` unprocessed fixes into sessions; returns the number read"""
+        with transaction.atomic():
+            checkpoint, _ = SessionizerCheckpoint.objects.select_for_update().get_or_create(intern=intern)
+            if checkpoint.rewind_to is not None:
+                self.rewind(intern, checkpoint)
+                checkpoint.save()
+            open_session = checkpoint.open_session
+            session = open_session
+            new_sessions = []
+
+            logs = LocationLog.objects.filter(intern=intern, timestamp__lt=timezone.now() - self.lag)
+            if checkpoint.last_timestamp is not None:
+                logs = logs.filter(timestamp__gte=checkpoint.last_timestamp).exclude(
+                    timestamp=checkpoint.last_timestamp,
+                    id__lte=checkpoint.last_log_id,
+                )
+            logs = logs.order_by('timestamp', 'id').values_list('id', 'timestamp', 'accuracy', 'is_inside_geofence')
+
+            read = 0
+            for log_id, timestamp, accuracy, is_inside in logs[:max_fixes].iterator(chunk_size=2000):
+                read += 1
+                checkpoint.last_timestamp = timestamp
+                checkpoint.last_log_id = log_id
+                if accuracy is not None and accuracy > self.max_accuracy:
+                    continue
+
+                if session is None or timestamp - session.ended_at > self.max_gap:
+                    session = self.new_session(intern, is_inside, timestamp, timestamp, 1)
+                    new_sessions.append(session)
+                    checkpoint.pending_count = 0
+                    checkpoint.pending_since = None
+                elif is_inside == session.is_inside:
+                    # Any pending contrary fixes were jitter
+                    session.ended_at = timestamp
+                    session.fix_count += checkpoint.pending_count + 1
+                    checkpoint.pending_count = 0
+                    checkpoint.pending_since = None
+                else:
+                    if checkpoint.pending_count == 0:
+                        checkpoint.pending_since = timestamp
+                    checkpoint.pending_count += 1
+                    if checkpoint.pending_count >= self.confirm_fixes:
+                        # Confirmed transition, dated from the first contrary fix
+                        session.ended_at = checkpoint.pending_since
+                        session = self.new_session(
+                            intern, is_inside, checkpoint.pending_since, timestamp, checkpoint.pending_count
+                        )
+                        new_sessions.append(session)
+                        checkpoint.pending_count = 0
+                        checkpoint.pending_since = None
+
+            if read:
+                if open_session is not None:
+                    open_session.save(update_fields=['ended_at', 'fix_count'])
+                PresenceSession.objects.bulk_create(new_sessions)
+                checkpoint.open_session = session
+                checkpoint.save()
+        return read
+
+
+def note_late_fixes(intern, logs):
+    """Make the next sessionizer run go back for fixes stored behind the intern's checkpoint.
+
+    One UPDATE that matches nothing unless the oldest fix is older than the
+    checkpoint; called in the transaction that stores the fixes.
+    """
+    if not logs:
+        return 0
+    oldest = min(log.timestamp for log in logs)
+    # PostgreSQL's LEAST ignores NULL, so an unset rewind_to simply becomes ``oldest``
+    return SessionizerCheckpoint.objects.filter(intern=intern, last_timestamp__gt=oldest).update(
+        rewind_to=Least('rewind_to', Value(oldest))
+    )
+
+
+def sessionize(interns, max_fixes=50000):
+    """Run the sessionizer over ``interns``; returns (fixes read, earliest rebuilt time per organization id)"""
+    sessionizer = Sessionizer()
+    total = 0
+    for intern in interns.iterator():
+        while True:
+            read = sessionizer.process_intern(intern, max_fixes)
+            total += read
+            if read < max_fixes:
+                break
+    return total, sessionizer.rewound
@@ -0,0 +1,153 @@
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Sum
+from django.utils import timezone
+
+from .models import DailyPresenceSummary, Intern, LocationLog, Organization
+from .utils import intern_time_zone
+
+SUMMARY_TABLE = DailyPresenceSummary._meta.db_table
+
+
+def record_fixes(intern, logs):
+    """Fold newly stored fixes into the intern's daily summaries with a single upsert"""
+    tz = intern_time_zone(intern)
+    days = {}
+    for log in logs:
+        day = timezone.localtime(log.timestamp, tz).date()
+        fixes, violations, first_seen, last_seen = days.get(day, (0, 0, log.timestamp, log.timestamp))
+        days[day] = (
+            fixes + 1,
+            violations + (0 if log.is_inside_geofence else 1),
+            min(first_seen, log.timestamp),
+            max(last_seen, log.timestamp),
+        )
+    if not days:
+        return
+
+    now = timezone.now()
+    rows = []
+    params = []
+    for day, (fixes, violations, first_seen, last_seen) in days.items():
+        rows.append('(%s, %s, %s, %s, %s, %s, %s, 0, %s)')
+        params.extend([intern.pk, intern.organization_id, day, fixes, violations, first_seen, last_seen, now])
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            INSERT INTO {SUMMARY_TABLE}
+                (intern_id, organization_id, date, fixes, violations, first_seen, last_seen, seconds_inside, updated_at)
+            VALUES {', '.join(rows)}
+            ON CONFLICT (intern_id, date) DO UPDATE SET
+                fixes = {SUMMARY_TABLE}.fixes + EXCLUDED.fixes,
+                violations = {SUMMARY_TABLE}.violations + EXCLUDED.violations,
+                first_seen = LEAST({SUMMARY_TABLE}.first_seen, EXCLUDED.first_seen),
+                last_seen = GREATEST({SUMMARY_TABLE}.last_seen, EXCLUDED.last_seen),
+                updated_at = EXCLUDED.updated_at
+            """,
+            params,
+        )
+
+
+def rebuild_daily_summaries(start_date, end_date, organization=None):
+    """Recompute summaries for local dates in [start_date, end_date] from raw LocationLog rows.
+
+    Time inside is the sum of gaps between consecutive fixes that were both inside
+    the geofence, each gap capped at PRESENCE_MAX_GAP_SECONDS so that a phone going
+    quiet overnight does not count as presence. Existing summaries in the range
+    are deleted in the same transaction, so a day whose fixes were all removed
+    loses its summary too. Returns the number of rows written.
+    """
+    max_gap = getattr(settings, 'PRESENCE_MAX_GAP_SECONDS', 900)
+    # Pad the scan by a day on each side so every local day is fully covered
+    scan_start = datetime.combine(start_date - timedelta(days=1), time.min, tzinfo=dt_timezone.utc)
+    scan_end = datetime.combine(end_date + timedelta(days=2), time.min, tzinfo=dt_timezone.utc)
+    local_day = "(l.\"timestamp\" AT TIME ZONE COALESCE(o.time_zone, %(default_tz)s))::date"
+    organization_filter = 'AND i.organization_id = %(organization)s' if organization else ''
+    stale = DailyPresenceSummary.objects.filter(date__gte=start_date, date__lte=end_date)
+    if organization:
+        stale = stale.filter(organization=organization)
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        stale.delete()
+        cursor.execute(
+            f"""
+            WITH fixes AS (
+                SELECT
+                    l.intern_id,
+                    i.organization_id,
+                    {local_day} AS day,
+                    l."timestamp",
+                    l.is_inside_geofence,
+                    LAG(l."timestamp") OVER w AS prev_timestamp,
+                    LAG(l.is_inside_geofence) OVER w AS prev_inside
+                FROM {LocationLog._meta.db_table} l
+                JOIN {Intern._meta.db_table} i ON i.id = l.intern_id
+                LEFT JOIN {Organization._meta.db_table} o ON o.id = i.organization_id
+                WHERE l."timestamp" >= %(scan_start)s AND l."timestamp" < %(scan_end)s
+                {organization_filter}
+                WINDOW w AS (PARTITION BY l.intern_id, {local_day} ORDER BY l."timestamp", l.id)
+            )
+            INSERT INTO {SUMMARY_TABLE}
+                (intern_id, organization_id, date, fixes, violations, first_seen, last_seen, seconds_inside, updated_at)
+            SELECT
+                intern_id,
+                organization_id,
+                day,
+                count(*),
+                count(*) FILTER (WHERE NOT is_inside_geofence),
+                min("timestamp"),
+                max("timestamp"),
+                COALESCE(sum(LEAST(EXTRACT(EPOCH FROM "timestamp" - prev_timestamp), %(max_gap)s))
+                         FILTER (WHERE is_inside_geofence AND prev_inside), 0)::integer,
+                now()
+            FROM fixes
+            WHERE day BETWEEN %(start_date)s AND %(end_date)s
+            GROUP BY intern_id, organization_id, day
+            ON CONFLICT (intern_id, date) DO UPDATE SET
+                organization_id = EXCLUDED.organization_id,
+                fixes = EXCLUDED.fixes,
+                violations = EXCLUDED.violations,
+                first_seen = EXCLUDED.first_seen,
+                last_seen = EXCLUDED.last_seen,
+                seconds_inside = EXCLUDED.seconds_inside,
+                updated_at = EXCLUDED.updated_at
+            """,
+            {
+                'default_tz': settings.TIME_ZONE,
+                'organization': getattr(organization, 'pk', organization),
+                'scan_start': scan_start,
+                'scan_end': scan_end,
+                'start_date': start_date,
+                'end_date': end_date,
+                'max_gap': max_gap,
+            },
+        )
+        return cursor.rowcount
+
+
+def window_dates(start, end):
+    """Local dates covered by a half-open [start, end) window from utils.get_time_window"""
+    return start.date(), (end - timedelta(days=1)).date()
+
+
+def violation_count(start_date, end_date, intern=None, organization=None):
+    """Total violations between two local dates, read from the daily summaries"""
+    summaries = DailyPresenceSummary.objects.filter(date__gte=start_date, date__lte=end_date)
+    if intern is not None:
+        summaries = summaries.filter(intern=intern)
+    if organization is not None:
+        summaries = summaries.filter(organization=organization)
+    return summaries.aggregate(total=Sum('violations'))['total'] or 0
+
+
+def rebuild_summaries_for(logs):
+    """Rebuild the days holding ``logs`` for their organizations, after an edit outside ingest"""
+    days = {}
+    for log in logs:
+        day = timezone.localtime(log.timestamp, intern_time_zone(log.intern)).date()
+        days.setdefault(log.intern.organization_id, set()).add(day)
+    for organization_id, dates in days.items():
+        rebuild_daily_summaries(min(dates), max(dates), organization_id)
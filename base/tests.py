@@ -1,3 +1,1061 @@
-from django.test import TestCase
+import asyncio
+import io
+import itertools
+import json
+import math
+import os
+import shutil
+import socket
+import tempfile
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+from pathlib import Path
+from unittest import mock
+from urllib.parse import urlencode
 
-# Create your tests here.
+import numpy as np
+import polyline
+from django.contrib.auth.models import User
+from django.contrib.gis.geos import MultiPolygon, Point, Polygon
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from .analytics import _depths
+from .attendance import derive_attendance
+from .codes import allocate_numbers, assign_codes
+from .events import location_events
+from .geocoding import UNKNOWN_ADDRESS, GeocodeCache, claim_geocode_jobs, geocode_cache, remember_address
+from .geofence import (
+    EARTH_RADIUS_M, GeofenceEngine, OrganizationFence, STRtree, geofence_engine, haversine_distances,
+)
+from .governor import RateLimited, drop_redundant_fixes, take_token
+from .ingest import _slots_for_running_loop, ingest_fixes, parse_fix, persist_logs
+from .tiles import get_tile, invalidate_tiles, tile_for
+from .tracks import encode_track, simplify, zoom_tolerance
+from .transfer import export_rows, import_rows
+from .models import (
+    Attendance, DailyPresenceSummary, Department, Employee, EmployeeSkill, GeocodeCacheEntry, GeocodeJob, GeofenceZone,
+    Intern, InternLastLocation, LeaveRequest, LocationBufferSegment, LocationLog, Organization, Payroll,
+    PresenceSession, Skill, SupervisorProfile, University, UserProfile,
+)
+from .payroll import progressive_tax, run_payroll, tax_brackets
+from .presence import Sessionizer
+from .rollups import rebuild_daily_summaries
+from .writebehind import (
+    SEALED_SUFFIX, WriteBehindBuffer, flush_segment, pending_segments, read_segment, replay_orphaned_segments,
+    segment_owner, serialize_log,
+)
+
+_numbers = itertools.count(1)
+
+
+def make_organization(**fields):
+    n = next(_numbers)
+    return Organization.objects.create(**{
+        'name': f'Organization {n}',
+        'location': Point(36.8, -1.28, srid=4326),
+        **fields,
+    })
+
+
+def make_department(**fields):
+    n = next(_numbers)
+    return Department.objects.create(**{'name': f'Department {n}', 'code': f'DEP-{n:03d}', **fields})
+
+
+def make_employee(**fields):
+    n = next(_numbers)
+    if 'department' not in fields:
+        fields['department'] = make_department()
+    return Employee.objects.create(**{
+        'name': f'Employee {n}',
+        'employee_id': f'E{n:05d}',
+        'phone': '0700000000',
+        'address': 'Nairobi',
+        'hire_date': date(2024, 1, 1),
+        'salary': 1000,
+        **fields,
+    })
+
+
+def make_intern(**fields):
+    n = next(_numbers)
+    for name, factory in (('organization', make_organization), ('department', make_department)):
+        if name not in fields:
+            fields[name] = factory()
+    return Intern.objects.create(**{
+        'first_name': f'Intern {n}',
+        'last_name': 'Test',
+        'personal_email': f'intern{n}@example.com',
+        'internship_start_date': date.today() - timedelta(days=30),
+        'internship_end_date': date.today() + timedelta(days=30),
+        **fields,
+    })
+
+
+def make_supervisor(organization):
+    n = next(_numbers)
+    user = User.objects.create_user(f'supervisor{n}', f'supervisor{n}@example.com', 'password')
+    SupervisorProfile.objects.create(
+        user_profile=UserProfile.objects.create(user=user, is_supervisor=True),
+        organization=organization,
+        phone='0700000000',
+    )
+    return user
+
+
+class AdminChangeListQueryTests(TestCase):
+    """Admin change lists must cost the same number of queries however many rows they show"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin_user = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        cls.organization = make_organization(name='Acme')
+        cls.university = University.objects.create(name='Uni', location='Nairobi')
+
+    def setUp(self):
+        self.client.force_login(self.admin_user)
+
+    def add_intern(self):
+        return make_intern(organization=self.organization, university=self.university, mentor=make_employee())
+
+    def add_organization(self):
+        organization = make_organization(location=None)
+        make_intern(organization=organization, department=None)
+        return organization
+
+    def add_department_with_staff(self):
+        department = make_department()
+        make_employee(department=department)
+        make_employee(department=department)
+        return department
+
+    def add_skill(self):
+        skill = Skill.objects.create(name=f'Skill {next(_numbers)}')
+        EmployeeSkill.objects.create(employee=make_employee(), skill=skill, proficiency='expert')
+        return skill
+
+    def add_location_log(self):
+        return LocationLog.objects.create(intern=self.add_intern(), point=Point(36.8, -1.28, srid=4326))
+
+    def assertConstantQueries(self, model, add_row):
+        url = reverse(f'admin:base_{model._meta.model_name}_changelist')
+        for _ in range(2):
+            add_row()
+        self.assertEqual(self.client.get(url).status_code, 200)
+        with CaptureQueriesContext(connection) as few_rows:
+            self.client.get(url)
+
+        for _ in range(5):
+            add_row()
+        with CaptureQueriesContext(connection) as more_rows:
+            self.client.get(url)
+        self.assertEqual(
+            len(few_rows), len(more_rows),
+            f'{model.__name__} change list runs queries per row',
+        )
+
+    def test_organization_changelist(self):
+        self.assertConstantQueries(Organization, self.add_organization)
+
+    def test_department_changelist(self):
+        self.assertConstantQueries(Department, self.add_department_with_staff)
+
+    def test_skill_changelist(self):
+        self.assertConstantQueries(Skill, self.add_skill)
+
+    def test_intern_changelist(self):
+        self.assertConstantQueries(Intern, self.add_intern)
+
+    def test_employee_changelist(self):
+        self.assertConstantQueries(Employee, make_employee)
+
+    def test_location_log_changelist(self):
+        self.assertConstantQueries(LocationLog, self.add_location_log)
+
+    def test_organization_intern_count_annotation(self):
+        organization = self.add_organization()
+        make_intern(organization=organization, department=None, is_active=False)
+        response = self.client.get(reverse('admin:base_organization_changelist'))
+        row = next(obj for obj in response.context['cl'].result_list if obj.pk == organization.pk)
+        self.assertEqual(row.active_intern_count, 1)
+
+
+class WriteBehindBufferTests(TestCase):
+    """Segments reach LocationLog exactly once and are never confused across process restarts"""
+
+    def setUp(self):
+        self.directory = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        settings_override = override_settings(LOCATION_WRITE_BEHIND_DIR=self.directory, LOCATION_WRITE_BEHIND_MAX_ROWS=2)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.intern = make_intern()
+
+    def make_buffer(self):
+        # Flushing is driven by the test rather than a background thread with its own connection
+        buffer = WriteBehindBuffer()
+        buffer._ensure_flusher = lambda: None
+        self.addCleanup(buffer.close)
+        return buffer
+
+    def make_logs(self, count):
+        start = timezone.now() - timedelta(hours=1)
+        return [
+            LocationLog(intern=self.intern, point=Point(36.8, -1.28, srid=4326),
+                        timestamp=start + timedelta(minutes=i), is_inside_geofence=True)
+            for i in range(count)
+        ]
+
+    def write_segment(self, name, logs):
+        path = self.directory / f'{name}{SEALED_SUFFIX}'
+        path.write_text(''.join(json.dumps(serialize_log(log)) + '\n' for log in logs))
+        return path
+
+    def test_flush_stores_rows_and_marker(self):
+        buffer = self.make_buffer()
+        buffer.append(self.intern, self.make_logs(3))
+        buffer.close()
+
+        self.assertEqual(LocationLog.objects.filter(intern=self.intern).count(), 3)
+        self.assertEqual(sum(LocationBufferSegment.objects.values_list('rows', flat=True)), 3)
+        self.assertEqual(list(self.directory.iterdir()), [])
+
+    def test_existing_marker_means_already_stored(self):
+        path = self.write_segment(f'{socket.gethostname()}-1-{"a" * 12}-00000001', self.make_logs(2))
+        LocationBufferSegment.objects.create(name=path.name, rows=2)
+
+        self.assertEqual(flush_segment(path), 0)
+        self.assertFalse(path.exists())
+        self.assertFalse(LocationLog.objects.filter(intern=self.intern).exists())
+
+    def test_restarted_process_never_reuses_segment_names(self):
+        # Two buffers in one process stand in for a worker restarted with the same PID
+        first, second = self.make_buffer(), self.make_buffer()
+        first.append(self.intern, self.make_logs(2))
+        second.append(self.intern, self.make_logs(2))
+
+        segments = pending_segments()
+        self.assertEqual(len(segments), 2)
+        self.assertNotEqual(segment_owner(segments[0]), segment_owner(segments[1]))
+        for path in segments:
+            self.assertEqual(len(read_segment(path)), 2)
+
+    def test_replay_skips_live_owner_and_flushes_dead_one_with_same_pid(self):
+        live = self.make_buffer()
+        live.append(self.intern, self.make_logs(2))
+        live_segment, = pending_segments()
+        dead_segment = self.write_segment(f'{socket.gethostname()}-{os.getpid()}-{"0" * 12}-00000001', self.make_logs(3))
+
+        self.assertEqual(replay_orphaned_segments(), (1, 3))
+        self.assertFalse(dead_segment.exists())
+        self.assertTrue(live_segment.exists())
+        self.assertEqual(LocationLog.objects.filter(intern=self.intern).count(), 3)
+
+    @override_settings(LOCATION_WRITE_BEHIND=True)
+    def test_buffered_fixes_move_the_last_position_before_the_flush(self):
+        buffer = self.make_buffer()
+        start = timezone.now() - timedelta(minutes=1)
+
+        def fix(seconds):
+            timestamp = start + timedelta(seconds=seconds)
+            return parse_fix({'latitude': -1.28, 'longitude': 36.8, 'timestamp': timestamp.isoformat()})
+
+        with mock.patch('base.ingest.location_buffer', buffer):
+            self.assertEqual(len(ingest_fixes(self.intern, [fix(0)])), 1)
+            position = InternLastLocation.objects.get(intern=self.intern)
+            self.assertEqual((position.timestamp, position.location_log_id), (fix(0)['timestamp'], None))
+            # The governor compares the next batch with the buffered fix
+            self.assertEqual(ingest_fixes(self.intern, [fix(2)]), [])
+
+        buffer.close()
+        stored = LocationLog.objects.get(intern=self.intern)
+        self.assertEqual(InternLastLocation.objects.get(intern=self.intern).location_log_id, stored.pk)
+
+
+@override_settings(
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+    INGEST_RATE_BURST=4,
+    INGEST_RATE_PER_MINUTE=6,
+)
+class IngestRateLimitTests(SimpleTestCase):
+    """A bucket of four tokens refilled at one every ten seconds"""
+
+    def setUp(self):
+        # The overridden cache is the same LocMem store for every test in the class
+        cache.clear()
+
+    def test_burst_then_refill(self):
+        for _ in range(4):
+            take_token(1, now=1000.0)
+        with self.assertRaises(RateLimited) as raised:
+            take_token(1, now=1000.0)
+        self.assertEqual(raised.exception.retry_after, 10)
+        take_token(2, now=1000.0)
+        take_token(1, now=1010.0)
+
+    def test_partial_refill_sets_retry_after(self):
+        for _ in range(4):
+            take_token(1, now=1000.0)
+        with self.assertRaises(RateLimited) as raised:
+            take_token(1, now=1004.0)
+        self.assertEqual(raised.exception.retry_after, 6)
+
+    def test_no_double_burst_across_a_boundary(self):
+        # Fixed windows let four requests through either side of a boundary; the bucket does not
+        for now in (1039.0, 1039.5, 1039.9, 1039.95):
+            take_token(1, now=now)
+        with self.assertRaises(RateLimited):
+            take_token(1, now=1040.0)
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class IngestConcurrencyTests(SimpleTestCase):
+    async def hold_slot(self):
+        async with _slots_for_running_loop() as slots:
+            return slots
+
+    def test_each_event_loop_gets_its_own_limiter(self):
+        # async_to_sync under WSGI runs every request on a new loop
+        first = asyncio.run(self.hold_slot())
+        second = asyncio.run(self.hold_slot())
+        self.assertIsNot(first, second)
+
+
+class RedundantFixTests(TestCase):
+    def setUp(self):
+        self.intern = make_intern()
+        self.start = timezone.now() - timedelta(minutes=5)
+        persist_logs(self.intern, [LocationLog(intern=self.intern, point=Point(36.8, -1.28, srid=4326),
+                                               timestamp=self.start, is_inside_geofence=True)])
+
+    def fix(self, seconds, inside):
+        return {'latitude': -1.28, 'longitude': 36.80001, 'timestamp': self.start + timedelta(seconds=seconds),
+                'is_inside_geofence': inside}
+
+    def test_nearby_fixes_are_dropped_unless_they_cross_the_fence(self):
+        fixes = [self.fix(30, True), self.fix(60, False), self.fix(90, False), self.fix(120, True)]
+        kept = drop_redundant_fixes(self.intern, fixes)
+        self.assertEqual([fix['timestamp'] for fix in kept], [fixes[1]['timestamp'], fixes[3]['timestamp']])
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class TileCacheTests(TestCase):
+    def setUp(self):
+        # Only ever the overridden LocMem store, never the shared Redis cache
+        cache.clear()
+        self.intern = make_intern()
+        self.organization = self.intern.organization
+        self.coords = [(-1.28, 36.8)]
+
+    def test_only_cached_zooms_are_invalidated(self):
+        self.assertEqual(invalidate_tiles(self.organization.pk, self.coords), 0)
+        x, y = tile_for(*self.coords[0], 12)
+        self.assertEqual(get_tile(self.organization.pk, 12, x, y), [])
+        self.assertEqual(invalidate_tiles(self.organization.pk, self.coords), 1)
+
+    def test_new_fix_replaces_cached_tile(self):
+        x, y = tile_for(*self.coords[0], 12)
+        self.assertEqual(get_tile(self.organization.pk, 12, x, y), [])
+        LocationLog.objects.create(intern=self.intern, point=Point(36.8, -1.28, srid=4326))
+        self.assertEqual(get_tile(self.organization.pk, 12, x, y), [])
+        invalidate_tiles(self.organization.pk, self.coords)
+        clusters = get_tile(self.organization.pk, 12, x, y)
+        self.assertEqual([cluster['count'] for cluster in clusters], [1])
+
+    def test_invalid_organization_parameter(self):
+        staff = User.objects.create_user('staff', 'staff@example.com', 'password', is_staff=True)
+        self.client.force_login(staff)
+        x, y = tile_for(*self.coords[0], 12)
+        response = self.client.get(reverse('organization_tile', args=[12, x, y]), {'organization': 'abc'})
+        self.assertEqual(response.status_code, 404)
+
+
+@override_settings(SESSION_CONFIRM_FIXES=3, SESSION_MAX_ACCURACY_METERS=100, SESSION_MAX_GAP_SECONDS=1800,
+                   SESSION_LAG_SECONDS=300)
+class SessionizerTests(TestCase):
+    # Inside for three fixes, one fix of jitter, then a confirmed exit at minute 6
+    FIXES = [(0, True), (1, True), (2, True), (3, False), (4, True), (5, True), (6, False), (7, False), (8, False)]
+
+    def setUp(self):
+        self.intern = make_intern()
+        self.start = timezone.now() - timedelta(hours=2)
+        self.add_fixes(self.FIXES)
+        self.sessionizer = Sessionizer()
+        self.assertEqual(self.sessionizer.process_intern(self.intern), len(self.FIXES))
+
+    def at(self, minutes):
+        return self.start + timedelta(minutes=minutes)
+
+    def add_fixes(self, fixes):
+        persist_logs(self.intern, [
+            LocationLog(intern=self.intern, point=Point(36.8, -1.28, srid=4326), timestamp=self.at(minutes),
+                        is_inside_geofence=inside)
+            for minutes, inside in fixes
+        ])
+
+    def sessions(self):
+        return list(
+            PresenceSession.objects.filter(intern=self.intern).order_by('started_at')
+            .values_list('is_inside', 'started_at', 'ended_at', 'fix_count')
+        )
+
+    def test_jitter_is_folded_until_a_transition_is_confirmed(self):
+        self.assertEqual(self.sessions(), [
+            (True, self.at(0), self.at(6), 6),
+            (False, self.at(6), self.at(8), 3),
+        ])
+
+    def test_next_run_resumes_from_the_checkpoint(self):
+        self.add_fixes([(9, False), (10, False)])
+        self.assertEqual(self.sessionizer.process_intern(self.intern), 2)
+        self.assertEqual(self.sessionizer.process_intern(self.intern), 0)
+        self.assertEqual(self.sessions(), [
+            (True, self.at(0), self.at(6), 6),
+            (False, self.at(6), self.at(10), 5),
+        ])
+
+    def test_late_fixes_rebuild_the_sessions_they_fall_into(self):
+        # Two delayed uploads make minute 3 the start of a confirmed exit
+        self.add_fixes([(3.2, False), (3.4, False)])
+        self.assertEqual(self.sessionizer.process_intern(self.intern), len(self.FIXES) + 2)
+        self.assertEqual(self.sessions(), [
+            (True, self.at(0), self.at(3), 3),
+            (False, self.at(3), self.at(8), 8),
+        ])
+        self.assertEqual(self.sessionizer.rewound, {self.intern.organization_id: self.at(0)})
+
+
+class LocationImportTests(TestCase):
+    def setUp(self):
+        self.intern = make_intern()
+        start = timezone.now() - timedelta(days=2)
+        persist_logs(self.intern, [
+            LocationLog(intern=self.intern, point=Point(36.8, -1.28, srid=4326), timestamp=start + timedelta(minutes=i))
+            for i in range(3)
+        ])
+        output = io.BytesIO()
+        export_rows('locations', output, 'ndjson')
+        self.export = output.getvalue().decode()
+
+    def import_export(self):
+        return import_rows('locations', io.StringIO(self.export), 'ndjson')
+
+    def test_fixes_already_stored_are_skipped(self):
+        self.assertEqual(self.import_export(), (0, 3))
+        self.assertEqual(LocationLog.objects.filter(intern=self.intern).count(), 3)
+
+    def test_import_rebuilds_derived_data(self):
+        LocationLog.objects.all().delete()
+        DailyPresenceSummary.objects.all().delete()
+
+        self.assertEqual(self.import_export(), (3, 0))
+        self.assertEqual(self.import_export(), (0, 3))
+        self.assertEqual(LocationLog.objects.filter(intern=self.intern).count(), 3)
+        self.assertEqual(sum(DailyPresenceSummary.objects.filter(intern=self.intern).values_list('fixes', flat=True)), 3)
+        self.assertEqual(GeocodeJob.objects.filter(location_log__intern=self.intern).count(), 3)
+
+
+class DailySummaryRebuildTests(TestCase):
+    def test_days_without_fixes_lose_their_summary(self):
+        intern = make_intern()
+        yesterday = timezone.now() - timedelta(days=1)
+        persist_logs(intern, [LocationLog(intern=intern, point=Point(36.8, -1.28, srid=4326), timestamp=yesterday)])
+        day = DailyPresenceSummary.objects.get(intern=intern).date
+
+        LocationLog.objects.filter(intern=intern).delete()
+        self.assertEqual(rebuild_daily_summaries(day, day, intern.organization_id), 0)
+        self.assertFalse(DailyPresenceSummary.objects.filter(intern=intern).exists())
+
+
+class DepartmentTreeTests(TestCase):
+    def setUp(self):
+        self.root = make_department()
+        self.middle = make_department(parent_department=self.root)
+        self.leaf = make_department(parent_department=self.middle)
+        self.other = make_department()
+
+    def descendants(self, department):
+        department.refresh_from_db()
+        return set(Department.objects.descendants_of(department))
+
+    def test_paths_follow_the_tree(self):
+        self.leaf.refresh_from_db()
+        self.assertEqual(self.leaf.path, f'/{self.root.pk}/{self.middle.pk}/{self.leaf.pk}/')
+        self.assertEqual(self.leaf.depth, 2)
+        self.assertEqual(self.descendants(self.root), {self.middle, self.leaf})
+        self.assertEqual(set(Department.objects.ancestors_of(self.leaf)), {self.root, self.middle})
+
+    def test_move_rewrites_the_subtree(self):
+        self.middle.parent_department = self.other
+        self.middle.save()
+
+        self.assertEqual(self.descendants(self.root), set())
+        self.assertEqual(self.descendants(self.other), {self.middle, self.leaf})
+        self.leaf.refresh_from_db()
+        self.assertEqual(self.leaf.path, f'/{self.other.pk}/{self.middle.pk}/{self.leaf.pk}/')
+
+    def test_cycles_are_rejected(self):
+        self.root.parent_department = self.leaf
+        with self.assertRaises(ValidationError):
+            self.root.save()
+        self.assertEqual(self.descendants(self.root), {self.middle, self.leaf})
+
+    def test_deleting_a_department_makes_its_children_roots(self):
+        self.middle.delete()
+
+        self.leaf.refresh_from_db()
+        self.assertIsNone(self.leaf.parent_department)
+        self.assertEqual((self.leaf.path, self.leaf.depth), (f'/{self.leaf.pk}/', 0))
+        self.assertEqual(self.descendants(self.root), set())
+
+    def test_queryset_delete_also_reroots(self):
+        Department.objects.filter(pk=self.root.pk).delete()
+
+        self.middle.refresh_from_db()
+        self.leaf.refresh_from_db()
+        self.assertEqual(self.middle.path, f'/{self.middle.pk}/')
+        self.assertEqual((self.leaf.path, self.leaf.depth), (f'/{self.middle.pk}/{self.leaf.pk}/', 1))
+
+
+class DepartmentHeadcountTests(TestCase):
+    def setUp(self):
+        self.department = make_department()
+        self.employee = Employee.objects.get(pk=make_employee(department=self.department).pk)
+
+    def headcounts(self, *departments):
+        return [Department.objects.get(pk=department.pk).headcount for department in departments]
+
+    def test_saving_without_moving_leaves_headcounts_alone(self):
+        self.employee.salary = 2000
+        with CaptureQueriesContext(connection) as queries:
+            self.employee.save()
+        self.assertEqual(len(queries), 1)
+        self.assertEqual(self.headcounts(self.department), [1])
+
+    def test_moves_and_deactivation_refresh_headcounts(self):
+        other = make_department()
+        self.employee.department = other
+        self.employee.save()
+        self.assertEqual(self.headcounts(self.department, other), [0, 1])
+
+        self.employee.is_active = False
+        self.employee.save()
+        self.assertEqual(self.headcounts(other), [0])
+
+    def test_depths_treat_cycles_as_roots(self):
+        depths = _depths([1, 2, 3, 4], [None, 1, 4, 3])
+        self.assertEqual(depths.tolist(), [0, 1, 1, 0])
+
+
+class ProgressiveTaxTests(SimpleTestCase):
+    LOWER_BOUNDS = np.array([0.0, 1000.0, 5000.0])
+    RATES = np.array([0.0, 0.1, 0.3])
+
+    def test_each_band_is_taxed_at_its_own_rate(self):
+        tax = progressive_tax([0, 500, 1000, 3000, 5000, 10000], self.LOWER_BOUNDS, self.RATES)
+        np.testing.assert_allclose(tax, [0, 0, 0, 200, 400, 1900])
+
+    def test_a_single_bracket_is_a_flat_rate(self):
+        np.testing.assert_allclose(progressive_tax([250.0], np.array([0.0]), np.array([0.2])), [50.0])
+
+    def test_brackets_are_sorted_from_settings(self):
+        with override_settings(PAYROLL_TAX_BRACKETS=[(5000, 0.3), (0, 0), (1000, 0.1)]):
+            lower_bounds, rates = tax_brackets()
+        np.testing.assert_array_equal(lower_bounds, self.LOWER_BOUNDS)
+        np.testing.assert_array_equal(rates, self.RATES)
+
+
+@override_settings(PAYROLL_TAX_BRACKETS=[(0, 0.1)])
+class RunPayrollTests(TestCase):
+    MONTH = date(2024, 6, 1)  # 20 working days; the 1st is a Saturday
+
+    def setUp(self):
+        self.employee = make_employee(salary=Decimal('1000.00'))
+
+    def test_weekend_absences_are_not_deducted(self):
+        for day in (1, 3):  # Saturday, Monday
+            Attendance.objects.create(employee=self.employee, date=date(2024, 6, day), status='absent')
+
+        run_payroll(self.MONTH)
+        payroll = Payroll.objects.get(employee=self.employee, month=self.MONTH)
+        self.assertEqual(payroll.deductions, Decimal('50.00'))
+        self.assertEqual(payroll.tax, Decimal('95.00'))
+        self.assertEqual(payroll.net_salary, Decimal('855.00'))
+
+    def test_mid_month_hires_are_not_docked_for_days_before_joining(self):
+        self.employee.hire_date = date(2024, 6, 17)  # Monday; 10 of the 20 working days remain
+        self.employee.save()
+        for day in (10, 18):  # Before and after the hire date
+            Attendance.objects.create(employee=self.employee, date=date(2024, 6, day), status='absent')
+
+        run_payroll(self.MONTH)
+        payroll = Payroll.objects.get(employee=self.employee, month=self.MONTH)
+        self.assertEqual((payroll.basic_salary, payroll.deductions), (Decimal('500.00'), Decimal('50.00')))
+
+    def test_net_is_the_sum_of_the_stored_components(self):
+        self.employee.salary = Decimal('1000.01')
+        self.employee.save()
+        Attendance.objects.create(employee=self.employee, date=date(2024, 6, 3), status='absent')
+
+        run_payroll(self.MONTH)
+        payroll = Payroll.objects.get(employee=self.employee, month=self.MONTH)
+        self.assertEqual(
+            payroll.net_salary,
+            payroll.basic_salary + payroll.bonuses - payroll.deductions - payroll.tax,
+        )
+
+
+class DepartmentCodeTests(TestCase):
+    def test_codes_count_up_per_prefix(self):
+        first = Department.objects.create(name='Human Resources')
+        second = Department.objects.create(name='Human Relations')
+        self.assertEqual((first.code, second.code), ('HR-001', 'HR-002'))
+
+    def test_codes_entered_by_hand_are_skipped(self):
+        Department.objects.create(name='Human Resources')
+        make_department(code='HR-007')
+        make_department(code='HR-7A')
+        make_department(code='HR-003')
+
+        self.assertEqual(Department.objects.create(name='Health Research').code, 'HR-008')
+        self.assertEqual(allocate_numbers('HR', 2), range(9, 11))
+
+    def test_bulk_assignment_reserves_codes_already_set(self):
+        departments = assign_codes([Department(name='Hiring', code='HI-040'), Department(name='Hiring Ops')])
+        self.assertEqual([department.code for department in departments], ['HI-040', 'HO-001'])
+        self.assertEqual(allocate_numbers('HI'), range(41, 42))
+
+
+class DeriveAttendanceTests(TestCase):
+    # Monday 3 June 2024 to Sunday 9 June, all in the past
+    MONDAY = date(2024, 6, 3)
+
+    def setUp(self):
+        self.organization = make_organization(time_zone='Africa/Nairobi')
+        user = User.objects.create_user('attendance')
+        self.employee = make_employee(user=user)
+        self.intern = make_intern(user=user, organization=self.organization, internship_start_date=date(2024, 1, 1),
+                                  internship_end_date=date(2024, 12, 31))
+
+    def at(self, day, hour, minute=0):
+        return datetime.combine(self.MONDAY + timedelta(days=day), time(hour, minute), tzinfo=self.organization.tzinfo)
+
+    def add_session(self, started_at, ended_at):
+        PresenceSession.objects.create(intern=self.intern, organization=self.organization, is_inside=True,
+                                       started_at=started_at, ended_at=ended_at, fix_count=2)
+
+    def attendance(self):
+        return {
+            row.date: (row.status, row.check_in, row.check_out)
+            for row in Attendance.objects.filter(employee=self.employee)
+        }
+
+    def test_sessions_are_split_at_local_midnight(self):
+        self.add_session(self.at(0, 22), self.at(1, 1, 30))
+        derive_attendance(self.organization, self.MONDAY, self.MONDAY + timedelta(days=1))
+
+        self.assertEqual(self.attendance(), {
+            self.MONDAY: ('late', time(22, 0), time(23, 59, 59)),
+            self.MONDAY + timedelta(days=1): ('present', time(0, 0), time(1, 30)),
+        })
+
+    def test_weekdays_without_sessions_or_leave_are_absent(self):
+        self.add_session(self.at(0, 8, 50), self.at(0, 17))
+        LeaveRequest.objects.create(employee=self.employee, start_date=self.MONDAY + timedelta(days=2),
+                                    end_date=self.MONDAY + timedelta(days=2), reason='Exam', status='approved')
+        # A row entered by hand is kept
+        Attendance.objects.create(employee=self.employee, date=self.MONDAY + timedelta(days=3), status='present')
+
+        self.assertEqual(derive_attendance(self.organization, self.MONDAY, self.MONDAY + timedelta(days=6)), 3)
+        self.assertEqual({day: status for day, (status, _, _) in self.attendance().items()}, {
+            self.MONDAY: 'present',
+            self.MONDAY + timedelta(days=1): 'absent',
+            self.MONDAY + timedelta(days=3): 'present',
+            self.MONDAY + timedelta(days=4): 'absent',
+        })
+
+    def test_no_absences_before_the_hire_date(self):
+        self.employee.hire_date = self.MONDAY + timedelta(days=3)
+        self.employee.save()
+        derive_attendance(self.organization, self.MONDAY, self.MONDAY + timedelta(days=6))
+
+        self.assertEqual(sorted(self.attendance()), [self.MONDAY + timedelta(days=3), self.MONDAY + timedelta(days=4)])
+
+    def test_rederiving_replaces_derived_rows_only(self):
+        derive_attendance(self.organization, self.MONDAY, self.MONDAY + timedelta(days=1))
+        self.assertEqual({status for status, _, _ in self.attendance().values()}, {'absent'})
+
+        # Leave approved after the fact, a late-synced session, and an HR correction
+        LeaveRequest.objects.create(employee=self.employee, start_date=self.MONDAY, end_date=self.MONDAY,
+                                    reason='Sick', status='approved')
+        self.add_session(self.at(1, 8), self.at(1, 17))
+        Attendance.objects.filter(employee=self.employee, date=self.MONDAY + timedelta(days=1)).update(
+            status='absent', source='manual'
+        )
+        derive_attendance(self.organization, self.MONDAY, self.MONDAY + timedelta(days=1))
+
+        self.assertEqual(self.attendance(), {self.MONDAY + timedelta(days=1): ('absent', None, None)})
+
+
+class LocationHistoryPaginationTests(TestCase):
+    def setUp(self):
+        self.client.force_login(User.objects.create_superuser('staff', 'staff@example.com', 'password'))
+        self.intern = make_intern()
+        now = timezone.now()
+        for seconds in (1, 2, 3):
+            LocationLog.objects.create(intern=self.intern, point=Point(36.8, -1.28, srid=4326),
+                                       timestamp=now - timedelta(seconds=seconds))
+
+    def test_next_link_keeps_the_page_size_and_filter(self):
+        url = reverse('location_history', args=[self.intern.pk])
+        response = self.client.get(url, {'time': 'week', 'limit': 2})
+        self.assertEqual(len(response.context['locations']), 2)
+        query = urlencode({'time': 'week', 'limit': 2, 'cursor': response.context['next_cursor']})
+        self.assertContains(response, f"?{query.replace('&', '&amp;')}")
+
+        response = self.client.get(url, {'time': 'week', 'limit': 2, 'cursor': response.context['next_cursor']})
+        self.assertEqual(len(response.context['locations']), 1)
+        self.assertIsNone(response.context['next_cursor'])
+
+
+class GeocodeCacheTests(TestCase):
+    def test_database_hits_are_written_in_batches(self):
+        geocodes = GeocodeCache(max_entries=10, hit_flush_threshold=3)
+        geocodes.set('reverse', 'kzf0tx4c', address='Nairobi')
+
+        def stored_hits():
+            return GeocodeCacheEntry.objects.get(kind='reverse', key='kzf0tx4c').hits
+
+        for expected in (0, 0, 3):
+            geocodes.clear()
+            self.assertEqual(geocodes.get('reverse', 'kzf0tx4c')[0], 'Nairobi')
+            self.assertEqual(stored_hits(), expected)
+
+    @override_settings(GEOCODE_NEGATIVE_CACHE_SECONDS=0)
+    def test_unknown_locations_expire(self):
+        remember_address('kzf0tx4d', UNKNOWN_ADDRESS)
+        remember_address('kzf0tx4e', 'Nairobi')
+
+        self.assertIsNone(geocode_cache.get('reverse', 'kzf0tx4d'))
+        self.assertEqual(geocode_cache.get('reverse', 'kzf0tx4e')[0], 'Nairobi')
+        self.assertIsNone(GeocodeCacheEntry.objects.get(key='kzf0tx4e').expires_at)
+
+
+class GeocodeJobTests(TestCase):
+    def test_jobs_without_a_location_log_are_dropped(self):
+        intern = make_intern()
+        kept, orphaned = LocationLog.objects.bulk_create([
+            LocationLog(intern=intern, point=Point(36.8, -1.28, srid=4326)) for _ in range(2)
+        ])
+        GeocodeJob.objects.bulk_create([GeocodeJob(location_log=kept), GeocodeJob(location_log=orphaned)])
+        # As when a partition is dropped: no constraint cascades to the job
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {LocationLog._meta.db_table} WHERE id = %s", [orphaned.pk])
+
+        self.assertEqual([job.location_log_id for job in claim_geocode_jobs(10)], [kept.pk])
+        self.assertEqual(list(GeocodeJob.objects.values_list('location_log_id', flat=True)), [kept.pk])
+
+
+class LocationEventTests(TestCase):
+    def setUp(self):
+        self.intern = make_intern()
+        self.start = timezone.now() - timedelta(hours=1)
+
+    def logs(self, *fixes):
+        return [
+            LocationLog(pk=i, intern=self.intern, point=Point(36.8, -1.28, srid=4326),
+                        timestamp=self.start + timedelta(minutes=minutes), is_inside_geofence=inside)
+            for i, (minutes, inside) in enumerate(fixes, 1)
+        ]
+
+    def test_crossings_then_the_newest_position(self):
+        # Out of order on purpose: events follow the timestamps
+        events = location_events(self.intern, self.logs((2, False), (1, True), (3, True)), (False, self.start))
+        self.assertEqual([(event['type'], event['location_id']) for event in events],
+                         [('enter', 2), ('exit', 1), ('enter', 3), ('position', 3)])
+        self.assertEqual(events[-1]['timestamp'], (self.start + timedelta(minutes=3)).isoformat())
+
+    def test_first_fix_is_only_a_position(self):
+        self.assertEqual([event['type'] for event in location_events(self.intern, self.logs((1, False)), None)],
+                         ['position'])
+
+    def test_fixes_older_than_the_last_one_change_nothing(self):
+        previous = (True, self.start + timedelta(minutes=5))
+        self.assertEqual(location_events(self.intern, self.logs((4, False), (5, False)), previous), [])
+
+    @override_settings(EVENT_HEARTBEAT_SECONDS=0.05, EVENT_STREAM_MAX_SECONDS=0.2)
+    def test_stream_closes_after_its_maximum_duration(self):
+        self.client.force_login(User.objects.create_superuser('staff', 'staff@example.com', 'password'))
+        response = self.client.get(reverse('organization_events'), {'organization': self.intern.organization_id})
+        # The sync test client buffers the async stream, as a WSGI server would
+        with self.assertWarns(Warning):
+            body = b''.join(response).decode()
+        self.assertTrue(body.startswith('retry: 5000\n\n'))
+        self.assertIn(': keepalive\n\n', body)
+
+
+class InternDetailTests(TestCase):
+    def setUp(self):
+        self.client.force_login(User.objects.create_superuser('staff', 'staff@example.com', 'password'))
+        self.intern = make_intern()
+
+    def test_unknown_time_filters_are_not_echoed(self):
+        payload = '`${alert(1)}`'
+        response = self.client.get(reverse('intern_detail', args=[self.intern.pk]), {'time': payload})
+        self.assertEqual(response.context['time_filter'], 'today')
+        self.assertNotContains(response, payload)
+        self.assertContains(response, '<script id="time-filter" type="application/json">"today"</script>', html=False)
+
+
+class OrganizationDashboardTests(TestCase):
+    def setUp(self):
+        self.organization = make_organization()
+        self.supervisor = make_supervisor(self.organization)
+        make_intern(organization=self.organization)
+        make_intern(organization=self.organization, is_active=False)
+        make_intern()
+
+    def test_supervisor_sees_their_organization(self):
+        self.client.force_login(self.supervisor)
+        response = self.client.get(reverse('organization_dashboard'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['organization'], self.organization)
+        self.assertEqual(response.context['active_interns'], 1)
+
+    def test_violations_come_from_the_daily_summaries(self):
+        today = timezone.localdate(timezone=self.organization.tzinfo)
+        for intern, violations in ((Intern.objects.filter(organization=self.organization).first(), 2),
+                                   (Intern.objects.exclude(organization=self.organization).get(), 5)):
+            DailyPresenceSummary.objects.create(intern=intern, organization=intern.organization, date=today,
+                                                violations=violations)
+        self.client.force_login(self.supervisor)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('organization_dashboard'))
+        self.assertEqual(response.context['violations_today'], 2)
+        self.assertFalse([q for q in queries.captured_queries if LocationLog._meta.db_table in q['sql']])
+
+    def test_other_users_are_sent_to_their_dashboard(self):
+        self.client.force_login(User.objects.create_user('someone', 'someone@example.com', 'password'))
+        response = self.client.get(reverse('organization_dashboard'))
+        self.assertRedirects(response, reverse('dashboard'), fetch_redirect_response=False)
+
+
+class TrackSimplificationTests(TestCase):
+    # An L: ten ~11 m steps east, then ten north
+    L_LATS = [-1.28] * 11 + [-1.28 + 0.0001 * i for i in range(1, 11)]
+    L_LNGS = [36.8 + 0.0001 * i for i in range(11)] + [36.801] * 10
+    # Twenty steps east, zig-zagging ~5.5 m north and back
+    ZIGZAG = [(-1.28 + (0.00005 if i % 2 else 0), 36.8 + 0.0001 * i) for i in range(21)]
+
+    def test_straight_runs_collapse_to_their_corners(self):
+        self.assertEqual(simplify(self.L_LATS, self.L_LNGS, 1.0).tolist(), [0, 10, 20])
+
+    def test_tolerance_follows_zoom(self):
+        lats, lngs = zip(*self.ZIGZAG)
+        self.assertEqual(len(simplify(lats, lngs, zoom_tolerance(10, -1.28))), 2)
+        self.assertEqual(len(simplify(lats, lngs, zoom_tolerance(16, -1.28))), len(self.ZIGZAG))
+
+    def test_encoded_track_keeps_its_endpoints(self):
+        intern = make_intern()
+        start = timezone.now() - timedelta(hours=1)
+        LocationLog.objects.bulk_create([
+            LocationLog(intern=intern, point=Point(lng, lat, srid=4326), timestamp=start + timedelta(minutes=i))
+            for i, (lat, lng) in enumerate(self.ZIGZAG)
+        ])
+
+        track = encode_track(LocationLog.objects.for_intern(intern).order_by('timestamp', 'id'), zoom=10)
+        self.assertEqual((track['points'], track['simplified_points']), (len(self.ZIGZAG), 2))
+        endpoints = [(round(lat, 5), round(lng, 5)) for lat, lng in (self.ZIGZAG[0], self.ZIGZAG[-1])]
+        self.assertEqual(polyline.decode(track['polyline'], 5), endpoints)
+        self.assertEqual(track['start'], start.isoformat())
+
+
+def scalar_haversine(lat1, lng1, lat2, lng2):
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    a = (math.sin((phi2 - phi1) / 2) ** 2
+         + math.cos(phi1) * math.cos(phi2) * math.sin(math.radians(lng2 - lng1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_M * math.asin(math.sqrt(a))
+
+
+def destination(lat, lng, bearing, meters):
+    """The point ``meters`` along a great circle from (lat, lng), in degrees with longitude in [-180, 180)"""
+    phi, lam, theta, delta = math.radians(lat), math.radians(lng), math.radians(bearing), meters / EARTH_RADIUS_M
+    phi2 = math.asin(math.sin(phi) * math.cos(delta) + math.cos(phi) * math.sin(delta) * math.cos(theta))
+    lam2 = lam + math.atan2(math.sin(theta) * math.sin(delta) * math.cos(phi),
+                            math.cos(delta) - math.sin(phi) * math.sin(phi2))
+    return math.degrees(phi2), (math.degrees(lam2) + 540) % 360 - 180
+
+
+class GeofenceDistanceTests(SimpleTestCase):
+    # Nairobi, and two centers a few meters from the antimeridian
+    CENTERS = [(-1.28, 36.8), (0.0, 179.9995), (-16.5, -179.9999)]
+
+    def fence(self, lat, lng, radius=100):
+        return OrganizationFence(Organization(location=Point(lng, lat, srid=4326), geofence_radius=radius))
+
+    def test_vectorized_distances_match_scalar_haversine(self):
+        for lat0, lng0 in self.CENTERS:
+            points = [destination(lat0, lng0, bearing, meters)
+                      for bearing in (0, 45, 90, 180, 270) for meters in (0, 99.99, 100.01, 5000)]
+            lats, lngs = zip(*points)
+            expected = [scalar_haversine(lat0, lng0, lat, lng) for lat, lng in points]
+            np.testing.assert_allclose(haversine_distances(lat0, lng0, lats, lngs), expected, rtol=0, atol=1e-6)
+            np.testing.assert_allclose(self.fence(lat0, lng0).distances(lats, lngs), expected, rtol=0, atol=1e-6)
+
+    def test_boundary_points(self):
+        for lat0, lng0 in self.CENTERS:
+            lats, lngs = zip(*[destination(lat0, lng0, 90, meters) for meters in (99.99, 100.01)])
+            self.assertEqual(self.fence(lat0, lng0).contains(lats, lngs).tolist(), [True, False])
+
+    def test_fences_wrap_across_the_antimeridian(self):
+        # 0.001 degrees of longitude at the equator, with the center and fix on opposite signs
+        self.assertAlmostEqual(haversine_distances(0.0, 179.9995, [0.0], [-179.9995])[0], 111.195, places=3)
+        fence = self.fence(0.0, 179.9995, radius=120)
+        self.assertEqual(fence.contains([0.0, 0.0], [-179.9995, -179.998]).tolist(), [True, False])
+
+
+class STRtreeTests(SimpleTestCase):
+    def test_query_matches_a_linear_scan(self):
+        # Overlapping squares on a 20 x 20 grid, enough for three levels of nodes
+        envelopes = [(x, y, x + 1.5, y + 1.5) for x in range(20) for y in range(20)]
+        tree = STRtree(envelopes, node_capacity=4)
+        for x, y in ((0, 0), (3.2, 7.9), (10.5, 10.5), (21.5, 21.5), (-0.1, 5), (25, 25)):
+            expected = [i for i, (minx, miny, maxx, maxy) in enumerate(envelopes)
+                        if minx <= x <= maxx and miny <= y <= maxy]
+            self.assertEqual(sorted(tree.query(x, y)), expected)
+
+
+def square(lng, lat, size):
+    return MultiPolygon(Polygon.from_bbox((lng, lat, lng + size, lat + size)), srid=4326)
+
+
+class GeofenceZoneTests(TestCase):
+    def setUp(self):
+        # Zones ~1 km east of the 100 m circle around the organization
+        self.organization = make_organization()
+        self.building = GeofenceZone.objects.create(organization=self.organization, name='Building',
+                                                    boundary=square(36.81, -1.28, 0.001))
+        self.annex = GeofenceZone.objects.create(organization=self.organization, name='Annex',
+                                                 boundary=square(36.812, -1.28, 0.001))
+        geofence_engine.clear()
+
+    def test_fixes_in_any_active_zone_are_inside(self):
+        lats = [-1.28, -1.2795, -1.2795, -1.2795, -1.2795]
+        lngs = [36.8, 36.8105, 36.8125, 36.8115, 36.83]
+        self.assertEqual(geofence_engine.contains(self.organization.pk, lats, lngs).tolist(),
+                         [True, True, True, False, False])
+        self.assertEqual(geofence_engine.get(self.organization.pk).zone_at(-1.2795, 36.8125), self.annex.pk)
+
+    def test_saving_a_zone_reloads_the_fence(self):
+        self.assertTrue(geofence_engine.contains(self.organization.pk, [-1.2795], [36.8125])[0])
+        self.annex.is_active = False
+        self.annex.save()
+        self.assertFalse(geofence_engine.contains(self.organization.pk, [-1.2795], [36.8125])[0])
+
+    @override_settings(GEOFENCE_CACHE_TTL_SECONDS=60)
+    def test_fences_expire_after_the_ttl(self):
+        engine = GeofenceEngine()
+        fence = engine.get(self.organization.pk)
+        # A change another process made, which never reached this engine
+        GeofenceZone.objects.filter(pk=self.building.pk).update(is_active=False)
+        self.assertIs(engine.get(self.organization.pk), fence)
+
+        with mock.patch('base.geofence.time.monotonic', return_value=fence.loaded_at + 61):
+            reloaded = engine.get(self.organization.pk)
+        self.assertIsNot(reloaded, fence)
+        self.assertEqual(reloaded.zone_ids, [self.annex.pk])
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class LocationBatchTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('intern', 'intern@example.com', 'password')
+        self.intern = make_intern(user=self.user)
+        self.client.force_login(self.user)
+        self.start = timezone.now() - timedelta(minutes=30)
+
+    def fix(self, minutes):
+        # ~110 m and a minute apart, so the governor keeps every fix
+        return {'latitude': -1.28, 'longitude': 36.8 + 0.001 * minutes,
+                'timestamp': (self.start + timedelta(minutes=minutes)).isoformat()}
+
+    def post(self, fixes):
+        return self.client.post(reverse('update_location_batch'), json.dumps(fixes), content_type='application/json')
+
+    def test_valid_fixes_are_stored_in_time_order(self):
+        response = self.post([self.fix(3), {'longitude': 36.8}, self.fix(1), {**self.fix(4), 'latitude': 200},
+                              self.fix(2)])
+
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual((body['accepted'], body['coalesced']), (3, 0))
+        self.assertEqual(body['rejected'], [
+            {'index': 1, 'message': 'Missing latitude/longitude'},
+            {'index': 3, 'message': 'Invalid coordinates'},
+        ])
+        stored = LocationLog.objects.filter(intern=self.intern).order_by('id').values_list('timestamp', flat=True)
+        self.assertEqual(list(stored), [self.start + timedelta(minutes=minutes) for minutes in (1, 2, 3)])
+
+    def test_batch_without_valid_fixes_is_rejected(self):
+        response = self.post([{'latitude': 'north', 'longitude': 36.8}])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['rejected'], [{'index': 0, 'message': 'Invalid coordinates'}])
+        self.assertFalse(LocationLog.objects.filter(intern=self.intern).exists())
+
+    @override_settings(LOCATION_BATCH_MAX_FIXES=2)
+    def test_oversized_batches_are_refused_whole(self):
+        response = self.post([self.fix(minutes) for minutes in range(3)])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['message'], 'Batch exceeds 2 fixes')
+        self.assertFalse(LocationLog.objects.filter(intern=self.intern).exists())
+        self.assertEqual(self.post([self.fix(minutes) for minutes in range(2)]).json()['accepted'], 2)
+
+
+class InternPositionTests(TestCase):
+    def setUp(self):
+        self.organization = make_organization()
+        self.now = timezone.now()
+        named = make_intern(organization=self.organization,
+                            user=User.objects.create_user('jane', first_name='Jane', last_name='Doe'))
+        self.positions = [
+            self.position(named, minutes=1, is_inside_geofence=True, address='Gate A'),
+            self.position(make_intern(organization=self.organization), minutes=5, accuracy=12.5),
+        ]
+        self.position(make_intern(organization=self.organization, is_active=False), minutes=0)
+        self.position(make_intern(), minutes=0)
+
+    def position(self, intern, minutes, **fields):
+        return InternLastLocation.objects.create(
+            intern=intern, organization=intern.organization, point=Point(36.8 + minutes / 1000, -1.28, srid=4326),
+            timestamp=self.now - timedelta(minutes=minutes), **fields
+        )
+
+    def test_active_interns_of_the_organization_newest_first(self):
+        self.client.force_login(make_supervisor(self.organization))
+        response = self.client.get(reverse('intern_positions'))
+
+        self.assertEqual(response.status_code, 200)
+        newest, oldest = self.positions
+        self.assertEqual(response.json(), {
+            'organization_id': self.organization.pk,
+            'results': [
+                {'intern_id': newest.intern_id, 'name': 'Jane Doe', 'timestamp': newest.timestamp.isoformat(),
+                 'latitude': -1.28, 'longitude': newest.point.x, 'accuracy': None, 'address': 'Gate A',
+                 'is_inside_geofence': True},
+                {'intern_id': oldest.intern_id, 'name': oldest.intern.first_name,
+                 'timestamp': oldest.timestamp.isoformat(), 'latitude': -1.28, 'longitude': oldest.point.x,
+                 'accuracy': 12.5, 'address': None, 'is_inside_geofence': False},
+            ],
+        })
+
+    def test_other_users_are_refused(self):
+        self.client.force_login(User.objects.create_user('someone'))
+        self.assertEqual(self.client.get(reverse('intern_positions')).status_code, 403)
@@ -0,0 +1,135 @@
+import math
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.utils import timezone
+
+from .models import Intern, LocationLog
+
+
+def tile_for(lat, lng, zoom):
+    """Return the (x, y) Web Mercator tile containing a coordinate at ``zoom``"""
+    scale = 2 ** zoom
+    lat = max(min(lat, 85.0511), -85.0511)
+    x = int((lng + 180.0) / 360.0 * scale)
+    lat_rad = math.radians(lat)
+    y = int((1.0 - math.asinh(math.tan(lat_rad)) / math.pi) / 2.0 * scale)
+    return min(max(x, 0), scale - 1), min(max(y, 0), scale - 1)
+
+
+def tile_zooms():
+    return range(getattr(settings, 'TILE_MIN_ZOOM', 0), getattr(settings, 'TILE_MAX_ZOOM', 18) + 1)
+
+
+def _cache_seconds():
+    return getattr(settings, 'TILE_CACHE_SECONDS', 30)
+
+
+def _version_key(organization_id, zoom, x, y):
+    return f'tile-version:{organization_id}:{zoom}:{x}:{y}'
+
+
+def _zoom_key(organization_id, zoom):
+    # Present while the organization has tiles cached at this zoom
+    return f'tile-zoom:{organization_id}:{zoom}'
+
+
+def invalidate_tiles(organization_id, coords):
+    """Bump the version of every cached tile containing one of the (lat, lng) pairs.
+
+    Only zooms with cached tiles are touched, so a fix costs one read of the
+    zoom markers and one write per zoom somebody is looking at. Returns the
+    number of versions bumped.
+    """
+    zoom_keys = {_zoom_key(organization_id, zoom): zoom for zoom in tile_zooms()}
+    zooms = [zoom_keys[key] for key in cache.get_many(list(zoom_keys))]
+    keys = {
+        _version_key(organization_id, zoom, *tile_for(lat, lng, zoom))
+        for lat, lng in coords
+        for zoom in zooms
+    }
+    if keys:
+        version = time.time_ns()
+        # A version only has to outlive the tiles cached under the previous one
+        cache.set_many({key: version for key in keys}, timeout=2 * _cache_seconds())
+    return len(keys)
+
+
+def aggregate_tile(organization_id, zoom, x, y):
+    """Aggregate an organization's recent fixes inside a tile into a grid of clusters.
+
+    The tile is divided into TILE_GRID_SIZE x TILE_GRID_SIZE cells in Web Mercator
+    and each non-empty cell becomes one cluster at the mean position of its fixes.
+    """
+    grid = getattr(settings, 'TILE_GRID_SIZE', 16)
+    since = timezone.now() - timedelta(seconds=getattr(settings, 'TILE_WINDOW_SECONDS', 3600))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            WITH tile AS (
+                SELECT ST_TileEnvelope(%(z)s, %(x)s, %(y)s) AS envelope
+            ),
+            fixes AS (
+                SELECT
+                    l.intern_id,
+                    l.point,
+                    l.is_inside_geofence,
+                    l."timestamp",
+                    ST_Transform(l.point, 3857) AS projected
+                FROM {LocationLog._meta.db_table} l
+                JOIN {Intern._meta.db_table} i ON i.id = l.intern_id, tile
+                WHERE i.organization_id = %(organization)s
+                  AND l."timestamp" >= %(since)s
+                  AND l.point && ST_Transform(tile.envelope, 4326)
+            )
+            SELECT
+                count(*),
+                count(DISTINCT intern_id),
+                count(*) FILTER (WHERE NOT is_inside_geofence),
+                avg(ST_Y(point)),
+                avg(ST_X(point)),
+                max("timestamp")
+            FROM fixes, tile
+            -- Fixes on the east or south edge belong to the last cell, not one past it
+            GROUP BY
+                LEAST(floor((ST_X(projected) - ST_XMin(tile.envelope)) / (ST_XMax(tile.envelope) - ST_XMin(tile.envelope)) * %(grid)s), %(grid)s - 1),
+                LEAST(floor((ST_YMax(tile.envelope) - ST_Y(projected)) / (ST_YMax(tile.envelope) - ST_YMin(tile.envelope)) * %(grid)s), %(grid)s - 1)
+            """,
+            {'z': zoom, 'x': x, 'y': y, 'organization': organization_id, 'since': since, 'grid': grid},
+        )
+        rows = cursor.fetchall()
+
+    return [
+        {
+            'count': count,
+            'interns': interns,
+            'violations': violations,
+            'latitude': latitude,
+            'longitude': longitude,
+            'last_seen': last_seen.isoformat(),
+        }
+        for count, interns, violations, latitude, longitude, last_seen in rows
+    ]
+
+
+def get_tile(organization_id, zoom, x, y):
+    """Return the clusters for a tile, served from the cache until a new fix lands in it"""
+    timeout = _cache_seconds()
+    version_key = _version_key(organization_id, zoom, x, y)
+    version = cache.get(version_key)
+    if version is None:
+        version = time.time_ns()
+        cache.set(version_key, version, timeout=2 * timeout)
+
+    data_key = f'tile:{organization_id}:{zoom}:{x}:{y}:{version}'
+    clusters = cache.get(data_key)
+    if clusters is None:
+        # Marked before aggregating, so a fix stored meanwhile bumps this tile's version
+        cache.set(_zoom_key(organization_id, zoom), True, timeout=2 * timeout)
+        clusters = aggregate_tile(organization_id, zoom, x, y)
+        # Fixes also age out of the window, so cached tiles expire on their own
+        cache.set(data_key, clusters, timeout=timeout)
+    return clusters
@@ -0,0 +1,83 @@
+import math
+
+import numpy as np
+import polyline
+from django.conf import settings
+
+from .geofence import EARTH_RADIUS_M
+
+# Ground resolution of a 256px Web Mercator tile at zoom 0 on the equator
+METERS_PER_PIXEL_Z0 = 156543.03392
+
+
+def meters_per_pixel(zoom, latitude):
+    return METERS_PER_PIXEL_Z0 * math.cos(math.radians(latitude)) / 2 ** zoom
+
+
+def zoom_tolerance(zoom, latitude):
+    """Simplification tolerance in meters: detail smaller than TRACK_TOLERANCE_PIXELS is invisible"""
+    return getattr(settings, 'TRACK_TOLERANCE_PIXELS', 1.0) * meters_per_pixel(zoom, latitude)
+
+
+def simplify(lats, lngs, tolerance):
+    """Douglas-Peucker simplification of a trajectory; returns the indexes of the kept points.
+
+    Coordinates are projected onto a local equirectangular plane around the track's
+    mean latitude so that ``tolerance`` is in meters.
+    """
+    lats = np.asarray(lats, dtype=np.float64)
+    lngs = np.asarray(lngs, dtype=np.float64)
+    count = len(lats)
+    if count < 3:
+        return np.arange(count)
+
+    cos_lat = math.cos(math.radians(lats.mean()))
+    x = np.radians(lngs) * EARTH_RADIUS_M * cos_lat
+    y = np.radians(lats) * EARTH_RADIUS_M
+
+    keep = np.zeros(count, dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, count - 1)]
+    while stack:
+        first, last = stack.pop()
+        if last - first < 2:
+            continue
+        px = x[first + 1:last] - x[first]
+        py = y[first + 1:last] - y[first]
+        dx = x[last] - x[first]
+        dy = y[last] - y[first]
+        length_sq = dx * dx + dy * dy
+        if length_sq > 0:
+            # Distance to the segment, not the infinite line, so loops back to the start are kept
+            t = np.clip((px * dx + py * dy) / length_sq, 0.0, 1.0)
+            distances = np.hypot(px - t * dx, py - t * dy)
+        else:
+            distances = np.hypot(px, py)
+        split = int(np.argmax(distances))
+        if distances[split] > tolerance:
+            split += first + 1
+            keep[split] = True
+            stack.append((first, split))
+            stack.append((split, last))
+    return np.flatnonzero(keep)
+
+
+def encode_track(locations, zoom):
+    """Simplify a chronologically ordered LocationLog queryset and encode it as a Google polyline"""
+    rows = list(locations.values_list('point', 'timestamp'))
+    if not rows:
+        return {'polyline': '', 'points': 0, 'simplified_points': 0, 'tolerance_meters': 0.0,
+                'start': None, 'end': None}
+
+    lats = np.array([point.y for point, _ in rows])
+    lngs = np.array([point.x for point, _ in rows])
+    tolerance = zoom_tolerance(zoom, float(lats.mean()))
+    kept = simplify(lats, lngs, tolerance)
+    return {
+        'polyline': polyline.encode(list(zip(lats[kept].tolist(), lngs[kept].tolist())), 5),
+        'points': len(rows),
+        'simplified_points': len(kept),
+        'tolerance_meters': round(tolerance, 2),
+        'start': rows[0][1].isoformat(),
+        'end': rows[-1][1].isoformat(),
+    }
@@ -0,0 +1,321 @@
+import csv
+import io
+import json
+from datetime import datetime, time, timedelta
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, transaction
+from django.db.models import FloatField, Func
+from django.utils import timezone
+
+from .models import Attendance, Employee, GeocodeJob, Intern, InternLastLocation, LocationLog, SessionizerCheckpoint
+from .rollups import rebuild_daily_summaries
+
+FORMATS = ('csv', 'ndjson', 'parquet')
+
+# Exported columns per dataset: (name, PostgreSQL type, Arrow type)
+DATASETS = {
+    'locations': [
+        ('id', 'bigint', 'int64'),
+        ('intern_id', 'bigint', 'int64'),
+        ('timestamp', 'timestamptz', 'timestamp'),
+        ('latitude', 'double precision', 'float64'),
+        ('longitude', 'double precision', 'float64'),
+        ('accuracy', 'double precision', 'float64'),
+        ('address', 'text', 'string'),
+        ('is_inside_geofence', 'boolean', 'bool'),
+    ],
+    'attendance': [
+        ('id', 'bigint', 'int64'),
+        ('employee_id', 'bigint', 'int64'),
+        ('date', 'date', 'date32'),
+        ('check_in', 'time', 'time64'),
+        ('check_out', 'time', 'time64'),
+        ('status', 'text', 'string'),
+    ],
+}
+
+STAGING_TABLE = 'transfer_staging'
+
+
+class TransferError(ValueError):
+    """Raised when an export or import cannot be carried out"""
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise TransferError('Parquet support requires pyarrow (pip install pyarrow)')
+    return pyarrow
+
+
+def _arrow_schema(pa, dataset):
+    types = {
+        'int64': pa.int64(),
+        'float64': pa.float64(),
+        'string': pa.string(),
+        'bool': pa.bool_(),
+        'date32': pa.date32(),
+        'time64': pa.time64('us'),
+        'timestamp': pa.timestamp('us', tz='UTC'),
+    }
+    return pa.schema([(name, types[arrow_type]) for name, _, arrow_type in DATASETS[dataset]])
+
+
+def export_queryset(dataset, organization=None, since=None, until=None):
+    """Rows of ``dataset`` as a values_list queryset, oldest first.
+
+    ``since`` and ``until`` are inclusive local dates, in the organization's time
+    zone when one is given.
+    """
+    columns = [name for name, _, _ in DATASETS[dataset]]
+    if dataset == 'locations':
+        tz = organization.tzinfo if organization else timezone.get_default_timezone()
+        rows = LocationLog.objects.annotate(
+            latitude=Func('point', function='ST_Y', output_field=FloatField()),
+            longitude=Func('point', function='ST_X', output_field=FloatField()),
+        )
+        if organization:
+            rows = rows.filter(intern__organization=organization)
+        if since:
+            rows = rows.filter(timestamp__gte=datetime.combine(since, time.min, tzinfo=tz))
+        if until:
+            rows = rows.filter(timestamp__lt=datetime.combine(until + timedelta(days=1), time.min, tzinfo=tz))
+        return rows.order_by('timestamp', 'id').values_list(*columns)
+
+    rows = Attendance.objects.all()
+    if organization:
+        rows = rows.filter(employee__user__intern__organization=organization)
+    if since:
+        rows = rows.filter(date__gte=since)
+    if until:
+        rows = rows.filter(date__lte=until)
+    return rows.order_by('date', 'id').values_list(*columns)
+
+
+def export_rows(dataset, output, file_format, organization=None, since=None, until=None, chunk_size=10000):
+    """Stream a dataset to ``output``, a binary file, in constant memory; returns the row count if known.
+
+    CSV is produced by PostgreSQL itself with COPY. NDJSON and Parquet read
+    through a server-side cursor, ``chunk_size`` rows at a time.
+    """
+    rows = export_queryset(dataset, organization, since, until)
+    columns = [name for name, _, _ in DATASETS[dataset]]
+
+    if file_format == 'csv':
+        sql, params = rows.query.sql_with_params()
+        with connection.cursor() as cursor:
+            query = cursor.mogrify(sql, params).decode()
+            cursor.copy_expert(f'COPY ({query}) TO STDOUT WITH (FORMAT csv, HEADER)', output)
+            return cursor.rowcount if cursor.rowcount >= 0 else None
+
+    if file_format == 'ndjson':
+        count = 0
+        for row in rows.iterator(chunk_size=chunk_size):
+            output.write(json.dumps(dict(zip(columns, row)), cls=DjangoJSONEncoder).encode() + b'\n')
+            count += 1
+        return count
+
+    if file_format == 'parquet':
+        pa = _pyarrow()
+        schema = _arrow_schema(pa, dataset)
+        count = 0
+        with pa.parquet.ParquetWriter(output, schema) as writer:
+            chunk = []
+            for row in rows.iterator(chunk_size=chunk_size):
+                chunk.append(row)
+                if len(chunk) >= chunk_size:
+                    writer.write_table(pa.Table.from_arrays([list(col) for col in zip(*chunk)], schema=schema))
+                    count += len(chunk)
+                    chunk = []
+            if chunk:
+                writer.write_table(pa.Table.from_arrays([list(col) for col in zip(*chunk)], schema=schema))
+                count += len(chunk)
+        return count
+
+    raise TransferError(f'Unknown format {file_format}')
+
+
+def _copy_records(cursor, columns, records):
+    """COPY an iterable of dicts into the staging table through an in-memory CSV chunk"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for record in records:
+        writer.writerow(['' if record.get(name) is None else record.get(name) for name in columns])
+    buffer.seek(0)
+    cursor.copy_expert(
+        f'COPY {STAGING_TABLE} ({", ".join(connection.ops.quote_name(c) for c in columns)}) FROM STDIN WITH (FORMAT csv)',
+        buffer,
+    )
+
+
+def _stage(cursor, dataset, source, file_format, chunk_size):
+    known = [name for name, _, _ in DATASETS[dataset]]
+
+    if file_format == 'csv':
+        header = next(csv.reader([source.readline()]), [])
+        unknown = set(header) - set(known)
+        if unknown:
+            raise TransferError(f'Unknown columns: {", ".join(sorted(unknown))}')
+        cursor.copy_expert(
+            f'COPY {STAGING_TABLE} ({", ".join(connection.ops.quote_name(c) for c in header)}) FROM STDIN WITH (FORMAT csv)',
+            source,
+        )
+        return
+
+    if file_format == 'ndjson':
+        chunk = []
+        for line in source:
+            if line.strip():
+                chunk.append(json.loads(line))
+            if len(chunk) >= chunk_size:
+                _copy_records(cursor, known, chunk)
+                chunk = []
+        if chunk:
+            _copy_records(cursor, known, chunk)
+        return
+
+    if file_format == 'parquet':
+        pa = _pyarrow()
+        for batch in pa.parquet.ParquetFile(source).iter_batches(batch_size=chunk_size):
+            present = [name for name in known if name in batch.schema.names]
+            _copy_records(cursor, present, batch.select(present).to_pylist())
+        return
+
+    raise TransferError(f'Unknown format {file_format}')
+
+
+def import_rows(dataset, source, file_format, chunk_size=10000):
+    """Load a file written by export_rows into the database; returns (imported, skipped).
+
+    Rows are staged with COPY into a temporary table and merged with one statement.
+    Location rows get new ids; rows for unknown interns and fixes already stored
+    for the same intern and timestamp are skipped, so importing a file twice is
+    harmless. The merge also advances last positions, queues geocode jobs for
+    rows without an address and marks sessionizer checkpoints for rebuild, and
+    the daily summaries of the imported days are recomputed. Attendance rows are
+    upserted on (employee, date). ``source`` is a text file for CSV and NDJSON
+    and a binary one for Parquet.
+    """
+    columns = DATASETS[dataset]
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(
+            f'CREATE TEMP TABLE {STAGING_TABLE} ('
+            + ', '.join(f'{connection.ops.quote_name(name)} {pg_type}' for name, pg_type, _ in columns)
+            + ') ON COMMIT DROP'
+        )
+        _stage(cursor, dataset, source, file_format, chunk_size)
+        cursor.execute(f'SELECT count(*) FROM {STAGING_TABLE}')
+        staged = cursor.fetchone()[0]
+
+        if dataset == 'locations':
+            imported, first, last = _merge_locations(cursor)
+            if imported:
+                # Local dates depend on each organization's time zone, so pad by a day
+                rebuild_daily_summaries(first.date() - timedelta(days=1), last.date() + timedelta(days=1))
+        else:
+            imported = _merge_attendance(cursor)
+    return imported, staged - imported
+
+
+def _merge_locations(cursor):
+    """Insert the staged fixes and everything derived from them; returns (inserted, first, last timestamp)"""
+    intern_table = Intern._meta.db_table
+    log_table = LocationLog._meta.db_table
+    cursor.execute(
+        f"""
+        ALTER TABLE {STAGING_TABLE} ADD COLUMN skipped boolean;
+        UPDATE {STAGING_TABLE} s
+        SET skipped = latitude IS NULL OR longitude IS NULL OR "timestamp" IS NULL
+            OR NOT EXISTS (SELECT 1 FROM {intern_table} i WHERE i.id = s.intern_id)
+            OR EXISTS (SELECT 1 FROM {log_table} l WHERE l.intern_id = s.intern_id AND l."timestamp" = s."timestamp")
+        """
+    )
+    position_table = InternLastLocation._meta.db_table
+    checkpoint_table = SessionizerCheckpoint._meta.db_table
+    cursor.execute(
+        f"""
+        WITH inserted AS (
+            -- A file may also repeat a fix; the first row for it wins
+            INSERT INTO {log_table}
+                (intern_id, point, "timestamp", accuracy, address, is_inside_geofence)
+            SELECT DISTINCT ON (intern_id, "timestamp")
+                   intern_id, ST_SetSRID(ST_MakePoint(longitude, latitude), 4326), "timestamp",
+                   accuracy, address, COALESCE(is_inside_geofence, false)
+            FROM {STAGING_TABLE}
+            WHERE NOT skipped
+            ORDER BY intern_id, "timestamp", id NULLS LAST
+            RETURNING id, intern_id, point, "timestamp", accuracy, address, is_inside_geofence
+        ),
+        latest AS (
+            SELECT DISTINCT ON (intern_id) *
+            FROM inserted
+            ORDER BY intern_id, "timestamp" DESC, id DESC
+        ),
+        positions AS (
+            INSERT INTO {position_table}
+                (intern_id, organization_id, location_log_id, point, "timestamp", accuracy, address,
+                 is_inside_geofence, updated_at)
+            SELECT latest.intern_id, i.organization_id, latest.id, latest.point, latest."timestamp",
+                   latest.accuracy, latest.address, latest.is_inside_geofence, now()
+            FROM latest
+            JOIN {intern_table} i ON i.id = latest.intern_id
+            ON CONFLICT (intern_id) DO UPDATE SET
+                organization_id = EXCLUDED.organization_id,
+                location_log_id = EXCLUDED.location_log_id,
+                point = EXCLUDED.point,
+                "timestamp" = EXCLUDED."timestamp",
+                accuracy = EXCLUDED.accuracy,
+                address = EXCLUDED.address,
+                is_inside_geofence = EXCLUDED.is_inside_geofence,
+                updated_at = EXCLUDED.updated_at
+            WHERE EXCLUDED."timestamp" > {position_table}."timestamp"
+        ),
+        jobs AS (
+            INSERT INTO {GeocodeJob._meta.db_table} (location_log_id, status, attempts, last_error, created_at)
+            SELECT id, 'pending', 0, '', now()
+            FROM inserted
+            WHERE COALESCE(address, '') = ''
+            ON CONFLICT DO NOTHING
+        ),
+        rewinds AS (
+            -- Same as presence.note_late_fixes, for every imported intern at once
+            UPDATE {checkpoint_table} c
+            SET rewind_to = LEAST(c.rewind_to, oldest.timestamp)
+            FROM (SELECT intern_id, min("timestamp") AS timestamp FROM inserted GROUP BY intern_id) oldest
+            WHERE c.intern_id = oldest.intern_id AND c.last_timestamp > oldest.timestamp
+        )
+        SELECT count(*), min("timestamp"), max("timestamp") FROM inserted
+        """
+    )
+    return cursor.fetchone()
+
+
+def _merge_attendance(cursor):
+    """Upsert the staged attendance rows; returns the number of rows inserted or updated"""
+    employee_table = Employee._meta.db_table
+    cursor.execute(
+        f"""
+        ALTER TABLE {STAGING_TABLE} ADD COLUMN skipped boolean;
+        UPDATE {STAGING_TABLE} s
+        SET skipped = date IS NULL OR status IS NULL
+            OR NOT EXISTS (SELECT 1 FROM {employee_table} e WHERE e.id = s.employee_id)
+        """
+    )
+    # Files may repeat a day; the last row for it wins
+    cursor.execute(
+        f"""
+        INSERT INTO {Attendance._meta.db_table} (employee_id, date, check_in, check_out, status)
+        SELECT DISTINCT ON (employee_id, date) employee_id, date, check_in, check_out, status
+        FROM {STAGING_TABLE}
+        WHERE NOT skipped
+        ORDER BY employee_id, date, id DESC NULLS LAST
+        ON CONFLICT (employee_id, date) DO UPDATE SET
+            check_in = EXCLUDED.check_in,
+            check_out = EXCLUDED.check_out,
+            status = EXCLUDED.status
+        """
+    )
+    return cursor.rowcount
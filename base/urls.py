@@ -20,6 +20,7 @@ urlpatterns = [
     path('profile/complete/', views.profile_complete, name='profile_complete'),
     # Location APIs
     path('update-location/', views.update_location, name='update_location'),
+    path('update-location/batch/', views.update_location_batch, name='update_location_batch'),
     path('location-history/<int:pk>/', views.location_history, name='location_history'),
     
     # Geofencing
@@ -29,8 +30,13 @@ urlpatterns = [
     
     # Intern Management
     path('interns/', views.intern_list, name='intern_list'),
+    path('interns/positions/', views.intern_positions, name='intern_positions'),
     path('interns/<int:pk>/', views.intern_detail, name='intern_detail'),
+    path('interns/<int:pk>/track/', views.intern_track, name='intern_track'),
     path('organization/', views.edit_organization, name='edit_organization'),
+    path('organization/dashboard/', views.organization_dashboard, name='organization_dashboard'),
+    path('organization/tiles/<int:z>/<int:x>/<int:y>/', views.organization_tile, name='organization_tile'),
+    path('organization/events/', views.organization_events, name='organization_events'),
 
 
     # otp
@@ -1,9 +1,74 @@
-from django.contrib.gis.geos import Point
-from geopy.distance import geodesic
+import base64
+from datetime import datetime, time, timedelta
+
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .geofence import haversine_distances
+
+# Calendar days covered by each ?time= filter, counting today
+TIME_WINDOW_DAYS = {
+    'today': 1,
+    'week': 7,
+    'month': 30,
+}
 
 def check_geofence(lat, lng, org_point, radius_meters):
     """Check if a point is within the geofence radius"""
-    org_coords = (org_point.y, org_point.x)
-    point_coords = (lat, lng)
-    distance = geodesic(org_coords, point_coords).meters
-    return distance <= radius_meters
\ No newline at end of file
+    distance = haversine_distances(org_point.y, org_point.x, [lat], [lng])[0]
+    return distance <= radius_meters
+
+def get_time_window(period, tz=None):
+    """Return the half-open [start, end) datetimes for a 'today'/'week'/'month' filter.
+
+    Windows are whole calendar days in ``tz`` (the default time zone if omitted),
+    ending at the next local midnight. Unknown periods fall back to 'today'.
+    """
+    tz = tz or timezone.get_default_timezone()
+    days = TIME_WINDOW_DAYS.get(period, TIME_WINDOW_DAYS['today'])
+    today = timezone.localdate(timezone=tz)
+    start = datetime.combine(today - timedelta(days=days - 1), time.min, tzinfo=tz)
+    end = datetime.combine(today + timedelta(days=1), time.min, tzinfo=tz)
+    return start, end
+
+def intern_time_zone(intern):
+    """The time zone an intern's activity is reported in"""
+    if intern.organization_id:
+        return intern.organization.tzinfo
+    return timezone.get_default_timezone()
+
+def encode_cursor(log):
+    """Opaque keyset cursor pointing just past ``log`` in (timestamp, id) order"""
+    raw = f"{log.timestamp.isoformat()}|{log.pk}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def decode_cursor(cursor):
+    """Return the (timestamp, id) a cursor points at; raises ValueError when malformed"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+        timestamp, pk = raw.rsplit('|', 1)
+        timestamp = parse_datetime(timestamp)
+        pk = int(pk)
+    except (TypeError, UnicodeError, ValueError, base64.binascii.Error):
+        raise ValueError('Invalid cursor')
+    if timestamp is None:
+        raise ValueError('Invalid cursor')
+    return timestamp, pk
+
+def keyset_page(queryset, cursor=None, page_size=50):
+    """Return (rows, next_cursor) for a LocationLog queryset walked newest-first.
+
+    Pages continue from the (timestamp, id) of the previous page's last row rather
+    than using OFFSET, so a page deep in the history costs the same as the first.
+    For one intern that is a range scan of locationlog_intern_ts_idx. Across an
+    organization, violations walk locationlog_violation_ts_idx and skip other
+    organizations' rows, so a page costs about page_size divided by the
+    organization's share of all violations.
+    """
+    queryset = queryset.order_by('-timestamp', '-id')
+    if cursor:
+        timestamp, pk = decode_cursor(cursor)
+        queryset = queryset.filter(timestamp__lte=timestamp).exclude(timestamp=timestamp, id__gte=pk)
+    rows = list(queryset[:page_size + 1])
+    next_cursor = encode_cursor(rows[page_size - 1]) if len(rows) > page_size else None
+    return rows[:page_size], next_cursor
\ No newline at end of file
@@ -1,14 +1,24 @@
 import json
+import time
+from asgiref.sync import sync_to_async
+from django.conf import settings
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
-from django.http import JsonResponse
+from django.http import Http404, JsonResponse, StreamingHttpResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.contrib import messages
 from django.contrib.gis.geos import Point
 from django.contrib.gis.measure import D
-from geopy.geocoders import Nominatim
 from .models import *
 from .forms import InternRegistrationForm, OrganizationForm, CustomAuthenticationForm, ProfileCompletionForm
+from .events import format_sse, get_broker, organization_channel
+from .governor import RateLimited, take_token
+from .ingest import FixError, aingest_fixes, decode_fix_batch, parse_fix, parse_fix_batch
+from .utils import TIME_WINDOW_DAYS, get_time_window, intern_time_zone, keyset_page
+from .positions import organization_positions, serialize_position
+from .rollups import violation_count, window_dates
+from .tiles import get_tile, tile_zooms
+from .tracks import encode_track
 from datetime import datetime, timedelta
 from django.contrib.auth import logout, authenticate, login
 from django.db import IntegrityError
@@ -18,16 +28,47 @@ from django.core.exceptions import PermissionDenied
 
 
 
+
 # Utility Functions
-def get_address_from_coords(lat, lng):
-    """Reverse geocode coordinates to get address"""
-    geolocator = Nominatim(user_agent="intern_tracker")
-    location = geolocator.reverse(f"{lat}, {lng}")
-    return location.address if location else "Unknown location"
+def get_page_params(request):
+    """Read the ?cursor= and ?limit= keyset pagination parameters"""
+    try:
+        page_size = min(max(int(request.GET.get('limit', 50)), 1), 200)
+    except ValueError:
+        page_size = 50
+    return request.GET.get('cursor'), page_size
 
-def check_geofence(point, organization):
-    """Check if point is within organization's geofence"""
-    return organization.location.distance(point) * 100000 <= organization.geofence_radius
+def get_time_filter(request):
+    """The ?time= window name, falling back to 'today' for anything unknown"""
+    time_filter = request.GET.get('time', 'today')
+    return time_filter if time_filter in TIME_WINDOW_DAYS else 'today'
+
+def get_supervised_organization(user, organization_id=None):
+    """The supervisor's own organization; staff pick one with ?organization="""
+    if hasattr(user, 'profile') and user.profile.is_supervisor:
+        try:
+            return user.profile.supervisor_profile.organization
+        except AttributeError:
+            raise PermissionDenied
+    if user.is_staff:
+        try:
+            organization_id = int(organization_id)
+        except (TypeError, ValueError):
+            raise Http404("Pick an organization with ?organization=<id>")
+        return get_object_or_404(Organization, pk=organization_id)
+    raise PermissionDenied
+
+def serialize_location(log):
+    return {
+        'id': log.pk,
+        'intern_id': log.intern_id,
+        'timestamp': log.timestamp.isoformat(),
+        'latitude': log.point.y,
+        'longitude': log.point.x,
+        'accuracy': log.accuracy,
+        'address': log.address,
+        'is_inside_geofence': log.is_inside_geofence,
+    }
 
 # Authentication Views
 def register(request):
@@ -79,17 +120,10 @@ def dashboard(request):
         intern = request.user.intern
         org = intern.organization
         
-        today = datetime.now().date()
-        locations = LocationLog.objects.filter(
-            intern=intern,
-            timestamp__date=today
-        ).order_by('-timestamp')[:10]
+        start, end = get_time_window('today', intern_time_zone(intern))
+        locations = LocationLog.objects.for_intern(intern).in_window(start, end).order_by('-timestamp')[:10]
         
-        violations_today = LocationLog.objects.filter(
-            intern=intern,
-            is_inside_geofence=False,
-            timestamp__date=today
-        ).count()
+        violations_today = violation_count(*window_dates(start, end), intern=intern)
         
         context = {
             'intern': intern,
@@ -236,9 +270,24 @@ def profile_complete(request):
 #     })
 
 # Location Tracking API
+async def get_ingest_intern(request):
+    """The requesting user's intern profile with its organization, or None"""
+    user = await request.auser()
+    return await Intern.objects.select_related('organization').filter(user_id=user.pk).afirst()
+
+async def throttle_ingest(intern):
+    """Return a 429 response when the intern is over its ingest rate limit"""
+    try:
+        await sync_to_async(take_token)(intern.pk)
+    except RateLimited as e:
+        response = JsonResponse({'status': 'error', 'message': str(e)}, status=429)
+        response['Retry-After'] = str(e.retry_after)
+        return response
+    return None
+
 @csrf_exempt
 @login_required
-def update_location(request):
+async def update_location(request):
     if request.method != 'POST':
         return JsonResponse({'status': 'error', 'message': 'Method not allowed'}, status=405)
 
@@ -252,44 +301,92 @@ def update_location(request):
         except json.JSONDecodeError:
             return JsonResponse({'status': 'error', 'message': 'Invalid JSON'}, status=400)
 
-        # Validate required fields
-        if 'latitude' not in data or 'longitude' not in data:
-            return JsonResponse({'status': 'error', 'message': 'Missing latitude/longitude'}, status=400)
-
         try:
-            lat = float(data['latitude'])
-            lng = float(data['longitude'])
-            point = Point(lng, lat, srid=4326)
-        except (ValueError, TypeError):
-            return JsonResponse({'status': 'error', 'message': 'Invalid coordinates'}, status=400)
+            fix = parse_fix(data)
+        except FixError as e:
+            return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
 
         # Check user profile
-        if not hasattr(request.user, 'internprofile'):
+        intern = await get_ingest_intern(request)
+        if intern is None:
             return JsonResponse({'status': 'error', 'message': 'User has no intern profile'}, status=400)
-
-        intern = request.user.internprofile
         
         # Check if organization exists
-        if not intern.organization:
+        if not intern.organization_id:
             return JsonResponse({'status': 'error', 'message': 'No organization assigned'}, status=400)
 
-        # Get address and check geofence
-        address = get_address_from_coords(lat, lng) or "Unknown"
-        is_inside = check_geofence(point, intern.organization)
-
-        # Save location
-        LocationLog.objects.create(
-            intern=intern,
-            point=point,
-            accuracy=data.get('accuracy'),
-            address=address,
-            is_inside_geofence=is_inside
-        )
+        throttled = await throttle_ingest(intern)
+        if throttled:
+            return throttled
+
+        # Check geofence and save location; the address is filled in by the geocode worker
+        logs = await aingest_fixes(intern, [fix])
+        if not logs:
+            # Too close to the previous fix to be worth storing; report where the intern already is
+            log = await InternLastLocation.objects.filter(intern=intern).afirst()
+            return JsonResponse({
+                'status': 'success',
+                'stored': False,
+                'is_inside': log.is_inside_geofence if log else None,
+                'address': log.address if log else None
+            })
 
         return JsonResponse({
             'status': 'success',
-            'is_inside': is_inside,
-            'address': address
+            'stored': True,
+            'is_inside': logs[0].is_inside_geofence,
+            'address': logs[0].address
+        })
+
+    except Exception as e:
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=500)
+
+
+@csrf_exempt
+@login_required
+async def update_location_batch(request):
+    """Accept a buffered burst of fixes as a JSON array or NDJSON and store them in one insert"""
+    if request.method != 'POST':
+        return JsonResponse({'status': 'error', 'message': 'Method not allowed'}, status=405)
+
+    try:
+        if not request.body:
+            return JsonResponse({'status': 'error', 'message': 'Empty request body'}, status=400)
+
+        try:
+            payloads = decode_fix_batch(request.body, request.content_type)
+        except FixError as e:
+            return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+
+        intern = await get_ingest_intern(request)
+        if intern is None:
+            return JsonResponse({'status': 'error', 'message': 'User has no intern profile'}, status=400)
+
+        if not intern.organization_id:
+            return JsonResponse({'status': 'error', 'message': 'No organization assigned'}, status=400)
+
+        # Invalid fixes are reported back by index; resending them would never succeed,
+        # so the valid ones are stored rather than failing the whole batch
+        fixes, rejected = parse_fix_batch(payloads)
+        if not fixes:
+            return JsonResponse({
+                'status': 'error',
+                'message': 'No valid fixes in batch',
+                'rejected': rejected
+            }, status=400)
+
+        throttled = await throttle_ingest(intern)
+        if throttled:
+            return throttled
+
+        logs = await aingest_fixes(intern, fixes)
+
+        return JsonResponse({
+            'status': 'success',
+            'accepted': len(logs),
+            'coalesced': len(fixes) - len(logs),
+            'violations': sum(1 for log in logs if not log.is_inside_geofence),
+            'rejected': rejected
         })
 
     except Exception as e:
@@ -298,18 +395,34 @@ def update_location(request):
 # Intern Management
 @login_required
 def intern_list(request):
-    if not request.user.is_supervisor:
+    is_supervisor = hasattr(request.user, 'profile') and request.user.profile.is_supervisor
+    try:
+        organization = request.user.profile.supervisor_profile.organization if is_supervisor else None
+    except AttributeError:
+        organization = None
+    if organization is None:
         messages.error(request, "You don't have permission to view this page")
         return redirect('dashboard')
     
-    organization = request.user.supervisorprofile.organization
-    interns = InternProfile.objects.filter(organization=organization)
+    # Last positions come from InternLastLocation in the same query
+    interns = Intern.objects.filter(organization=organization).select_related(
+        'user', 'department', 'organization', 'last_location'
+    )
     
     return render(request, 'list.html', {
         'interns': interns,
         'organization': organization
     })
 
+@login_required
+def intern_positions(request):
+    organization = get_supervised_organization(request.user, request.GET.get('organization'))
+
+    return JsonResponse({
+        'organization_id': organization.pk,
+        'results': [serialize_position(position) for position in organization_positions(organization)]
+    })
+
 @login_required
 def intern_detail(request, pk):
     intern = get_object_or_404(Intern, pk=pk)
@@ -325,46 +438,63 @@ def intern_detail(request, pk):
             return redirect('intern_list')
     
     # Get time filter from query params
-    time_filter = request.GET.get('time', 'today')
-    
-    if time_filter == 'week':
-        date_filter = datetime.now() - timedelta(days=7)
-    elif time_filter == 'month':
-        date_filter = datetime.now() - timedelta(days=30)
-    else:  # today
-        date_filter = datetime.now() - timedelta(days=1)
-    
-    locations = LocationLog.objects.filter(
-        intern=intern,
-        timestamp__gte=date_filter
-    ).order_by('-timestamp')
+    time_filter = get_time_filter(request)
+    start, end = get_time_window(time_filter, intern_time_zone(intern))
     
-    violations = locations.filter(is_inside_geofence=False)
+    locations = LocationLog.objects.for_intern(intern).in_window(start, end).order_by('-timestamp')
     
     return render(request, 'detail.html', {
         'intern': intern,
         'locations': locations[:50],  # Limit to 50 most recent
-        'violations': violations.count(),
+        'violations': violation_count(*window_dates(start, end), intern=intern),
         'time_filter': time_filter
     })
 
+@login_required
+def intern_track(request, pk):
+    intern = get_object_or_404(Intern, pk=pk)
+    if hasattr(request.user, 'profile') and request.user.profile.is_supervisor:
+        try:
+            if request.user.profile.supervisor_profile.organization != intern.organization:
+                raise PermissionDenied
+        except AttributeError:
+            raise PermissionDenied
+    elif getattr(request.user, 'intern', None) != intern and not (request.user.is_superuser or request.user.is_staff):
+        raise PermissionDenied
+
+    try:
+        zoom = min(max(int(request.GET.get('zoom', 15)), 0), 22)
+    except ValueError:
+        return JsonResponse({'status': 'error', 'message': 'Invalid zoom'}, status=400)
+
+    time_filter = get_time_filter(request)
+    start, end = get_time_window(time_filter, intern_time_zone(intern))
+    locations = LocationLog.objects.for_intern(intern).in_window(start, end).order_by('timestamp', 'id')
+
+    return JsonResponse({
+        'intern_id': intern.pk,
+        'zoom': zoom,
+        **encode_track(locations, zoom)
+    })
+
 # Organization Management
 @login_required
 def organization_dashboard(request):
-    if not request.user.is_supervisor:
+    is_supervisor = hasattr(request.user, 'profile') and request.user.profile.is_supervisor
+    try:
+        org = request.user.profile.supervisor_profile.organization if is_supervisor else None
+    except AttributeError:
+        org = None
+    if org is None:
         messages.error(request, "Access denied")
         return redirect('dashboard')
     
-    org = request.user.supervisorprofile.organization
-    interns = InternProfile.objects.filter(organization=org)
+    interns = Intern.objects.filter(organization=org)
     
     # Stats for dashboard
     active_interns = interns.filter(is_active=True).count()
-    violations_today = LocationLog.objects.filter(
-        intern__organization=org,
-        is_inside_geofence=False,
-        timestamp__date=datetime.now().date()
-    ).count()
+    start, end = get_time_window('today', org.tzinfo)
+    violations_today = violation_count(*window_dates(start, end), organization=org)
     
     return render(request, 'dashboard.html', {
         'organization': org,
@@ -373,14 +503,55 @@ def organization_dashboard(request):
         'mapbox_access_token': 'your_mapbox_access_token'
     })
 
+@login_required
+def organization_tile(request, z, x, y):
+    organization = get_supervised_organization(request.user, request.GET.get('organization'))
+
+    if z not in tile_zooms() or x >= 2 ** z or y >= 2 ** z:
+        return JsonResponse({'status': 'error', 'message': 'Tile out of range'}, status=404)
+
+    return JsonResponse({
+        'z': z,
+        'x': x,
+        'y': y,
+        'clusters': get_tile(organization.pk, z, x, y)
+    })
+
+@login_required
+async def organization_events(request):
+    user = await request.auser()
+    organization = await sync_to_async(get_supervised_organization)(user, request.GET.get('organization'))
+    heartbeat = getattr(settings, 'EVENT_HEARTBEAT_SECONDS', 15)
+    # Under WSGI each open stream holds a worker, so streams end and the browser reconnects
+    deadline = time.monotonic() + getattr(settings, 'EVENT_STREAM_MAX_SECONDS', 300)
+
+    async def stream():
+        subscription = get_broker().subscribe(organization_channel(organization.pk))
+        try:
+            yield 'retry: 5000\n\n'
+            while (remaining := deadline - time.monotonic()) > 0:
+                event = await subscription.get(timeout=min(heartbeat, remaining))
+                # Comment lines keep proxies from closing an idle connection
+                yield format_sse(event) if event is not None else ': keepalive\n\n'
+        finally:
+            subscription.close()
+
+    response = StreamingHttpResponse(stream(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
 @login_required
 def edit_organization(request):
-    if not request.user.is_supervisor:
+    is_supervisor = hasattr(request.user, 'profile') and request.user.profile.is_supervisor
+    try:
+        org = request.user.profile.supervisor_profile.organization if is_supervisor else None
+    except AttributeError:
+        org = None
+    if org is None:
         messages.error(request, "Access denied")
         return redirect('dashboard')
     
-    org = request.user.supervisorprofile.organization
-    
     if request.method == 'POST':
         form = OrganizationForm(request.POST, instance=org)
         if form.is_valid():
@@ -422,27 +593,33 @@ def location_history(request, pk=None):
     if pk:
         if not request.user.is_superuser and not request.user.is_staff:
             raise PermissionDenied
-        intern = get_object_or_404(InternProfile, id=pk)
+        intern = get_object_or_404(Intern, id=pk)
     else:
         # For regular users, show their own history
-        intern = request.user.internprofile
-    
-    time_filter = request.GET.get('time', 'today')
+        intern = request.user.intern
     
-    if time_filter == 'week':
-        date_filter = datetime.now() - timedelta(days=7)
-    elif time_filter == 'month':
-        date_filter = datetime.now() - timedelta(days=30)
-    else:  # today
-        date_filter = datetime.now() - timedelta(days=1)
+    time_filter = get_time_filter(request)
+    start, end = get_time_window(time_filter, intern_time_zone(intern))
     
-    locations = LocationLog.objects.filter(
-        intern=intern,
-        timestamp__gte=date_filter
-    ).order_by('-timestamp')
+    cursor, page_size = get_page_params(request)
+    try:
+        locations, next_cursor = keyset_page(
+            LocationLog.objects.for_intern(intern).in_window(start, end),
+            cursor,
+            page_size
+        )
+    except ValueError:
+        return JsonResponse({'status': 'error', 'message': 'Invalid cursor'}, status=400)
+
+    if request.GET.get('format') == 'json':
+        return JsonResponse({
+            'results': [serialize_location(log) for log in locations],
+            'next_cursor': next_cursor
+        })
     
     return render(request, 'location_history.html', {
         'locations': locations,
+        'next_cursor': next_cursor,
         'time_filter': time_filter,
         'intern': intern
     })
@@ -471,32 +648,43 @@ def location_history(request, pk=None):
 
 @login_required
 def geofence_violations(request, intern_id=None):
+    is_supervisor = hasattr(request.user, 'profile') and request.user.profile.is_supervisor
     # If intern_id is provided (for supervisor viewing specific intern)
     if intern_id:
-        if not (request.user.is_supervisor or request.user.is_staff):
+        if not (is_supervisor or request.user.is_staff):
             raise PermissionDenied
-        intern = get_object_or_404(InternProfile, id=intern_id)
-        violations = LocationLog.objects.filter(
-            intern=intern,
-            is_inside_geofence=False
-        ).order_by('-timestamp')
+        intern = get_object_or_404(Intern, id=intern_id)
+        violations = LocationLog.objects.for_intern(intern)
     # For regular intern viewing their own violations
-    elif request.user.is_intern:
-        intern = request.user.internprofile
-        violations = LocationLog.objects.filter(
-            intern=intern,
-            is_inside_geofence=False
-        ).order_by('-timestamp')
+    elif hasattr(request.user, 'intern'):
+        intern = request.user.intern
+        violations = LocationLog.objects.for_intern(intern)
     # For supervisor viewing all violations in their organization
+    elif is_supervisor:
+        org = request.user.profile.supervisor_profile.organization
+        violations = LocationLog.objects.for_organization(org)
     else:
-        org = request.user.supervisorprofile.organization
-        violations = LocationLog.objects.filter(
-            intern__organization=org,
-            is_inside_geofence=False
-        ).order_by('-timestamp')
+        raise PermissionDenied
+
+    cursor, page_size = get_page_params(request)
+    try:
+        violations, next_cursor = keyset_page(
+            violations.violations().select_related('intern__user'),
+            cursor,
+            page_size
+        )
+    except ValueError:
+        return JsonResponse({'status': 'error', 'message': 'Invalid cursor'}, status=400)
+
+    if request.GET.get('format') == 'json':
+        return JsonResponse({
+            'results': [serialize_location(log) for log in violations],
+            'next_cursor': next_cursor
+        })
     
     return render(request, 'geofence_violations.html', {
         'violations': violations,
+        'next_cursor': next_cursor,
         'specific_intern': intern if intern_id else None
     })
 
@@ -0,0 +1,331 @@
+import atexit
+import fcntl
+import json
+import logging
+import os
+import re
+import socket
+import threading
+import time
+import uuid
+from collections import defaultdict, deque
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.gis.geos import Point
+from django.db import close_old_connections, transaction
+from django.utils.dateparse import parse_datetime
+
+from .models import Intern, LocationBufferSegment, LocationLog
+
+logger = logging.getLogger(__name__)
+
+OPEN_SUFFIX = '.open'
+SEALED_SUFFIX = '.ndjson'
+LOCK_SUFFIX = '.lock'
+
+# Segments are named "<owner>-<sequence>" where the owner is "<host>-<pid>-<token>".
+# The random token keeps names unique when a restarted worker gets its old PID back.
+OWNER_NAME = re.compile(r'(?P<host>.+)-\d+-[0-9a-f]{12}')
+SEGMENT_NAME = re.compile(rf'(?P<owner>{OWNER_NAME.pattern})-\d+')
+
+
+def buffer_directory():
+    return Path(getattr(settings, 'LOCATION_WRITE_BEHIND_DIR', Path(settings.BASE_DIR) / 'var' / 'location_buffer'))
+
+
+def segment_owner(path):
+    """Return the ``host-pid-token`` owner that wrote a segment, or None for a name this module did not write"""
+    match = SEGMENT_NAME.fullmatch(path.stem)
+    return match['owner'] if match else None
+
+
+def serialize_log(log):
+    return {
+        'intern_id': log.intern_id,
+        'latitude': log.point.y,
+        'longitude': log.point.x,
+        'timestamp': log.timestamp.isoformat(),
+        'accuracy': log.accuracy,
+        'address': log.address,
+        'is_inside_geofence': log.is_inside_geofence,
+    }
+
+
+def read_segment(path):
+    """Read a segment's rows; a torn final line from a crash mid-append is skipped"""
+    rows = []
+    with open(path, encoding='utf-8') as segment:
+        for line in segment:
+            try:
+                rows.append(json.loads(line))
+            except json.JSONDecodeError:
+                logger.warning(f"Skipping torn line in write-behind segment {path.name}")
+    return rows
+
+
+def flush_segment(path):
+    """Store a segment's rows through the normal persist path, exactly once.
+
+    The segment's marker row is written in the same transaction as its
+    LocationLog rows, so a segment replayed after a crash between commit and
+    unlink is recognised and only deleted. Segment names are never reused (see
+    SEGMENT_NAME), so an existing marker always means the rows are stored.
+    Returns the number of rows stored.
+    """
+    # ingest imports this module for the shared buffer
+    from .ingest import persist_logs
+
+    rows = read_segment(path)
+    stored = 0
+    with transaction.atomic():
+        _, created = LocationBufferSegment.objects.get_or_create(name=path.name, defaults={'rows': len(rows)})
+        if not created:
+            logger.info(f"Write-behind segment {path.name} was already stored; removing it")
+        else:
+            rows_by_intern = defaultdict(list)
+            for row in rows:
+                rows_by_intern[row['intern_id']].append(row)
+            interns = Intern.objects.select_related('organization').in_bulk(list(rows_by_intern))
+            for intern_id, intern_rows in rows_by_intern.items():
+                intern = interns.get(intern_id)
+                if intern is None:
+                    logger.warning(f"Dropping {len(intern_rows)} buffered fixes for deleted intern {intern_id}")
+                    continue
+                logs = [
+                    LocationLog(
+                        intern=intern,
+                        point=Point(row['longitude'], row['latitude'], srid=4326),
+                        timestamp=parse_datetime(row['timestamp']),
+                        accuracy=row['accuracy'],
+                        address=row['address'],
+                        is_inside_geofence=row['is_inside_geofence'],
+                    )
+                    for row in intern_rows
+                ]
+                persist_logs(intern, logs, buffered=True)
+                stored += len(intern_rows)
+    path.unlink()
+    return stored
+
+
+class WriteBehindBuffer:
+    """Durable local queue in front of LocationLog.
+
+    Each process appends accepted fixes to its own NDJSON segment, fsyncing before
+    the request is answered. Segments are sealed every LOCATION_WRITE_BEHIND_FLUSH_MS
+    or LOCATION_WRITE_BEHIND_MAX_ROWS rows and flushed by a background thread.
+    While it has segments a process holds an flock on its owner lock file; the
+    kernel releases it however the process exits, which is how the
+    flush_location_buffer command tells orphaned segments from live ones.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._segment = None
+        self._segment_path = None
+        self._segment_rows = 0
+        self._segment_opened_at = None
+        self._owner = None
+        self._owner_pid = None
+        self._owner_lock = None
+        self._sequence = 0
+        self._sealed = deque()
+        self._wakeup = threading.Event()
+        self._flusher = None
+        self._flush_lock = threading.Lock()
+        self.appended_rows = 0
+        self.flushed_rows = 0
+        self.flushed_segments = 0
+        self.flush_errors = 0
+        self.last_flush_seconds = None
+
+    def _claim_owner(self):
+        # Caller holds self._lock. A new process, or a child forked from one, takes a fresh identity
+        if self._owner_pid == os.getpid():
+            return
+        if self._owner_lock is not None:
+            # Inherited from the parent, whose lock and segments stay its own
+            os.close(self._owner_lock)
+            self._segment = None
+            self._sealed.clear()
+            self._flusher = None
+        directory = buffer_directory()
+        directory.mkdir(parents=True, exist_ok=True)
+        owner = f'{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:12]}'
+        lock_path = directory / f'{owner}{LOCK_SUFFIX}'
+        # Locked before it is visible, so a replay never sees it unlocked
+        lock = os.open(f'{lock_path}.tmp', os.O_RDWR | os.O_CREAT | os.O_EXCL, 0o644)
+        fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        os.rename(f'{lock_path}.tmp', lock_path)
+        self._owner, self._owner_pid, self._owner_lock = owner, os.getpid(), lock
+        self._sequence = 0
+
+    def _release_owner(self):
+        # Caller holds self._lock; only once every segment is flushed
+        if self._owner_pid != os.getpid():
+            return
+        (buffer_directory() / f'{self._owner}{LOCK_SUFFIX}').unlink(missing_ok=True)
+        os.close(self._owner_lock)
+        self._owner = self._owner_pid = self._owner_lock = None
+
+    def _open_segment(self):
+        self._claim_owner()
+        self._sequence += 1
+        self._segment_path = buffer_directory() / f'{self._owner}-{self._sequence:08d}{OPEN_SUFFIX}'
+        self._segment = open(self._segment_path, 'x', encoding='utf-8')
+        self._segment_rows = 0
+        self._segment_opened_at = time.monotonic()
+
+    def _seal(self):
+        # Caller holds self._lock
+        if self._segment is None:
+            return
+        self._segment.close()
+        sealed_path = self._segment_path.with_suffix(SEALED_SUFFIX)
+        os.replace(self._segment_path, sealed_path)
+        self._sealed.append((sealed_path, self._segment_rows))
+        self._segment = None
+        self._segment_path = None
+        self._segment_rows = 0
+
+    def append(self, intern, logs):
+        """Durably queue prepared logs; they reach LocationLog on the next flush"""
+        data = ''.join(json.dumps(serialize_log(log)) + '\n' for log in logs)
+        max_rows = getattr(settings, 'LOCATION_WRITE_BEHIND_MAX_ROWS', 1000)
+        with self._lock:
+            if self._segment is None:
+                self._open_segment()
+            self._segment.write(data)
+            self._segment.flush()
+            os.fsync(self._segment.fileno())
+            self._segment_rows += len(logs)
+            self.appended_rows += len(logs)
+            if self._segment_rows >= max_rows:
+                self._seal()
+                self._wakeup.set()
+        self._ensure_flusher()
+
+    def _ensure_flusher(self):
+        if self._flusher is not None and self._flusher.is_alive():
+            return
+        with self._lock:
+            if self._flusher is None or not self._flusher.is_alive():
+                self._flusher = threading.Thread(target=self._run, name='location-write-behind', daemon=True)
+                self._flusher.start()
+                atexit.register(self.close)
+
+    def _run(self):
+        interval = getattr(settings, 'LOCATION_WRITE_BEHIND_FLUSH_MS', 500) / 1000
+        while True:
+            self._wakeup.wait(interval)
+            self._wakeup.clear()
+            with self._lock:
+                if self._segment is not None and time.monotonic() - self._segment_opened_at >= interval:
+                    self._seal()
+            # This thread is outside the request cycle, so recycle its connection here
+            close_old_connections()
+            try:
+                self.flush()
+            finally:
+                close_old_connections()
+
+    def flush(self):
+        """Flush every sealed segment of this process; failed segments stay queued for retry"""
+        with self._flush_lock:
+            while True:
+                with self._lock:
+                    if not self._sealed:
+                        break
+                    path, rows = self._sealed[0]
+                started = time.monotonic()
+                try:
+                    stored = flush_segment(path)
+                except Exception as e:
+                    self.flush_errors += 1
+                    logger.error(f"Failed to flush write-behind segment {path.name}: {str(e)}")
+                    break
+                with self._lock:
+                    self._sealed.popleft()
+                    self.flushed_rows += stored
+                    self.flushed_segments += 1
+                    self.last_flush_seconds = time.monotonic() - started
+                logger.info(f"Flushed {stored} buffered fixes from {path.name} in {self.last_flush_seconds * 1000:.0f}ms")
+
+    def close(self):
+        """Seal and flush whatever this process still holds, then give up its owner lock"""
+        with self._lock:
+            self._seal()
+        self.flush()
+        with self._lock:
+            if self._segment is None and not self._sealed:
+                self._release_owner()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'queued_rows': self._segment_rows + sum(rows for _, rows in self._sealed),
+                'queued_segments': len(self._sealed) + (1 if self._segment is not None else 0),
+                'appended_rows': self.appended_rows,
+                'flushed_rows': self.flushed_rows,
+                'flushed_segments': self.flushed_segments,
+                'flush_errors': self.flush_errors,
+                'last_flush_seconds': self.last_flush_seconds,
+            }
+
+
+location_buffer = WriteBehindBuffer()
+
+
+def _owner_alive(owner):
+    """Whether the process behind ``owner`` still holds its lock file; PIDs alone are reused"""
+    if OWNER_NAME.fullmatch(owner)['host'] != socket.gethostname():
+        # Another host's processes cannot be checked; its own replay handles them
+        return True
+    try:
+        lock = os.open(buffer_directory() / f'{owner}{LOCK_SUFFIX}', os.O_RDONLY)
+    except FileNotFoundError:
+        return False
+    try:
+        fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        return True
+    finally:
+        os.close(lock)
+    return False
+
+
+def pending_segments():
+    directory = buffer_directory()
+    if not directory.exists():
+        return []
+    return sorted(
+        path for path in directory.iterdir()
+        if path.suffix in (OPEN_SUFFIX, SEALED_SUFFIX)
+    )
+
+
+def replay_orphaned_segments(include_live=False):
+    """Flush segments whose writing process has exited; returns (segments, rows) flushed.
+
+    With ``include_live`` every segment is flushed, which is only safe while no
+    web process is appending.
+    """
+    segments = rows = 0
+    alive = {}
+    for path in pending_segments():
+        owner = segment_owner(path)
+        if not include_live:
+            if owner not in alive:
+                alive[owner] = owner is not None and _owner_alive(owner)
+            if alive[owner]:
+                continue
+        rows += flush_segment(path)
+        segments += 1
+
+    # Lock files of owners that died with nothing left to replay
+    for lock_path in buffer_directory().glob(f'*{LOCK_SUFFIX}'):
+        owner = lock_path.name[:-len(LOCK_SUFFIX)]
+        if OWNER_NAME.fullmatch(owner) and not _owner_alive(owner):
+            lock_path.unlink(missing_ok=True)
+    return segments, rows
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 
@@ -92,9 +93,85 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'geo_test.wsgi.application'
 
+# Shared cache: ingest rate limits, map tiles and department analytics must agree across processes
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.environ.get('REDIS_URL', 'redis://127.0.0.1:6379/1'),
+        'KEY_PREFIX': 'hrm',
+    }
+}
+
 # settings.py
 GEOPY_USER_AGENT = "base"  # Required for Nominatim
 
+# Location ingest
+LOCATION_BATCH_MAX_FIXES = 500  # Max fixes accepted per batch request
+LOCATION_MAX_CLOCK_SKEW_SECONDS = 300  # Reject device timestamps further ahead than this
+INGEST_MAX_CONCURRENCY = 16  # Ingests running at once per event loop (per process under ASGI); further requests wait without a thread
+INGEST_RATE_BURST = 20  # Token bucket size: requests an intern may send at once
+INGEST_RATE_PER_MINUTE = 60  # Bucket refill rate per intern; an empty bucket gets 429 with Retry-After
+INGEST_MIN_INTERVAL_SECONDS = 5  # Fixes closer than this to the previous accepted one are dropped
+INGEST_MIN_DISTANCE_METERS = 10  # ... as are fixes that moved less than this
+INGEST_MAX_SILENCE_SECONDS = 300  # but one fix per this period is always kept
+
+# Write-behind buffering of accepted fixes (see base/writebehind.py)
+LOCATION_WRITE_BEHIND = False  # Append fixes to a local fsynced log and store them in the background
+LOCATION_WRITE_BEHIND_DIR = BASE_DIR / 'var' / 'location_buffer'
+LOCATION_WRITE_BEHIND_FLUSH_MS = 500  # Flush at least this often
+LOCATION_WRITE_BEHIND_MAX_ROWS = 1000  # ... or as soon as a segment holds this many fixes
+
+# Department analytics
+DEPARTMENT_ANALYTICS_CACHE_SECONDS = 300  # Also dropped whenever an Employee or Department is saved
+
+# Payroll
+# Marginal monthly tax brackets as (lower bound, rate); income above each bound is taxed at its rate
+PAYROLL_TAX_BRACKETS = [
+    (0, 0.10),
+    (24000, 0.25),
+    (32333, 0.30),
+    (500000, 0.325),
+    (800000, 0.35),
+]
+
+# Reverse geocoding (run `manage.py geocode_worker` to fill in addresses)
+GEOCODE_TIMEOUT_SECONDS = 10
+GEOCODE_MIN_DELAY_SECONDS = 1.0  # Nominatim allows one request per second
+GEOCODE_JOB_LEASE_SECONDS = 300  # Claimed jobs are retried after this if a worker dies
+GEOCODE_JOB_MAX_ATTEMPTS = 5
+GEOCODE_CACHE_PRECISION = 8  # Geohash length of a cache cell (8 is roughly 38m x 19m)
+GEOCODE_CACHE_MAX_ENTRIES = 10000  # In-process LRU size; older cells stay in the database
+GEOCODE_NEGATIVE_CACHE_SECONDS = 21600  # How long an "Unknown location" result is reused before asking again
+GEOCODE_HIT_FLUSH_THRESHOLD = 1000  # Database cache hits counted in memory before one UPDATE writes them
+
+# Geofencing
+GEOFENCE_CACHE_TTL_SECONDS = 60  # Cached fences also expire so saves in other processes are seen
+
+# Presence rollups (run `manage.py backfill_presence_summaries` periodically)
+PRESENCE_MAX_GAP_SECONDS = 900  # Longest gap between fixes still counted as time inside
+
+# Presence sessions (run `manage.py sessionize_presence` periodically)
+SESSION_CONFIRM_FIXES = 3  # Consecutive fixes needed before an enter/exit is accepted
+SESSION_MAX_ACCURACY_METERS = 100  # Less accurate fixes are ignored
+SESSION_MAX_GAP_SECONDS = 1800  # Silence that closes the open session
+SESSION_LAG_SECONDS = 300  # Leave the newest fixes for the next run so late uploads are in order
+
+# Track simplification
+TRACK_TOLERANCE_PIXELS = 1.0  # Drop detail smaller than this many screen pixels at the requested zoom
+
+# Organization map tiles
+TILE_MIN_ZOOM = 0
+TILE_MAX_ZOOM = 18
+TILE_GRID_SIZE = 16  # Clusters per tile side
+TILE_WINDOW_SECONDS = 3600  # Only fixes this recent are shown
+TILE_CACHE_SECONDS = 30  # Cached tiles expire so old fixes age out
+
+# Live location events (server-sent events)
+EVENT_BROKER = 'base.events.LocalBroker'  # Swap for a shared broker when running several processes
+EVENT_BROKER_OPTIONS = {'max_queue': 100}  # Per-listener buffer; the oldest events are dropped beyond it
+EVENT_HEARTBEAT_SECONDS = 15
+EVENT_STREAM_MAX_SECONDS = 300  # Streams then close and EventSource reconnects; keeps WSGI workers free
+
 
 # Database
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases